@@ -2,16 +2,17 @@
 # TableTennisCoaching.com:
 # Crawl from the "Improving" section down to (but not including) "Playing in Tournaments",
 # fetch internal article pages, and write ChatGPT-ready blocks.
+# An interrupted run resumes where it stopped (crawl_engine.open_frontier).
 
-import time
 import re
-import sys
+import argparse
 from datetime import date
 from urllib.parse import urljoin, urlparse
 
-import requests
 from bs4 import BeautifulSoup, Tag, NavigableString
 
+import crawl_engine
+
 # ========= CONFIG =========
 INDEX_URL   = "http://www.tabletenniscoaching.com/articles"  # no fragment; we handle sections ourselves
 START_HEADER = "Improving"
@@ -25,21 +26,21 @@ TITLE_CSS = "h1.node__title"
 BODY_CONTAINER_CSS = "div.node__content div.field--name-body div.field__items div.field__item"
 
 # Politeness / Output
-PAUSE_SECONDS = 1.0
+PAUSE_SECONDS = 1.0         # min gap between requests to the same host (token bucket)
 TIMEOUT = 15
 MAX_LINKS = None            # set to an int for test runs; None = all
 OUTPUT_PATH = "ttc_batch_for_gpt.txt"
 SKIPPED_EXTERNALS_PATH = "ttc_skipped_external_links.txt"
 
+# Keep <header>; on this site, section titles live nearby.
+JUNK_CSS = "nav, footer, script, style, form, aside"
+
+# Article pages only need the title and body subtrees parsed
+ARTICLE_ONLY = crawl_engine.SubtreeStrainer(TITLE_CSS, BODY_CONTAINER_CSS)
+
 # Optional debug
 DEBUG = False
 
-UA = {
-    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-                  "AppleWebKit/537.36 (KHTML, like Gecko) "
-                  "Chrome/120.0.0.0 Safari/537.36"
-}
-
 BLOCKED_DOMAINS = {
     "youtube.com", "www.youtube.com", "youtu.be",
     "twitter.com", "x.com",
@@ -50,16 +51,6 @@ BLOCKED_DOMAINS = {
 # =========================
 
 
-def get_soup(url: str) -> BeautifulSoup:
-    r = requests.get(url, headers=UA, timeout=TIMEOUT, allow_redirects=True)
-    r.raise_for_status()
-    s = BeautifulSoup(r.text, "html.parser")
-    # Keep <header>; on this site, section titles live nearby.
-    for junk in s.select("nav, footer, script, style, form, aside"):
-        junk.decompose()
-    return s
-
-
 def is_blocked(url: str) -> bool:
     host = (urlparse(url).hostname or "").lower()
     return any(b in host for b in BLOCKED_DOMAINS)
@@ -105,7 +96,14 @@ def find_section_marker(soup: BeautifulSoup, label: str):
 
 
 def collect_links_between_headers(index_url: str, start_header: str, stop_header: str):
-    soup = get_soup(index_url)
+    html = crawl_engine.fetch_text(index_url, timeout=TIMEOUT)
+    return parse_index(html, index_url, start_header, stop_header)
+
+
+def parse_index(html: str, index_url: str, start_header: str, stop_header: str,
+                parser: str | None = None):
+    # Section markers are found by walking siblings, so the index is always parsed in full.
+    soup = crawl_engine.make_soup(html, JUNK_CSS, parser=parser)
 
     if DEBUG:
         with open("debug_index.html", "w", encoding="utf-8") as f:
@@ -156,8 +154,19 @@ def collect_links_between_headers(index_url: str, start_header: str, stop_header
 
 
 def extract_article(url: str):
-    s = get_soup(url)
+    return parse_article(crawl_engine.fetch_text(url, timeout=TIMEOUT), url)
+
+
+def parse_article(html: str, url: str, parser: str | None = None, strain: bool = True):
+    s = crawl_engine.make_soup(html, JUNK_CSS, ARTICLE_ONLY if strain else None, parser)
+    art = article_from_soup(s, url)
+    if strain and not art["text"]:
+        # The article/main fallback lives outside the strained subtrees
+        return parse_article(html, url, parser, strain=False)
+    return art
 
+
+def article_from_soup(s: BeautifulSoup, url: str):
     # Title
     t = s.select_one(TITLE_CSS)
     title = t.get_text(strip=True) if t else ""
@@ -174,56 +183,70 @@ def extract_article(url: str):
     return {"source_url": url, "title": title, "text": body_text}
 
 
-def main():
-    # 1) Gather links between sections
-    all_links = collect_links_between_headers(INDEX_URL, START_HEADER, STOP_HEADER)
+def main(concurrency: int = crawl_engine.DEFAULT_CONCURRENCY):
+    crawl_engine.set_host_rate(urlparse(INDEX_URL).hostname, 1 / PAUSE_SECONDS)
+    frontier = crawl_engine.open_frontier(OUTPUT_PATH)
 
-    # 2) Partition internal vs external
-    internal, external = [], []
-    for u in all_links:
-        (internal if is_allowed_internal(u) else external).append(u)
+    if not frontier.discovered:
+        # 1) Gather links between sections
+        all_links = collect_links_between_headers(INDEX_URL, START_HEADER, STOP_HEADER)
 
-    print(f"Discovered {len(all_links)} links between '{START_HEADER}' and before '{STOP_HEADER}'.")
-    print(f"- Internal (to fetch): {len(internal)}")
-    print(f"- External (skipped for now): {len(external)}")
+        # 2) Partition internal vs external
+        internal, external = [], []
+        for u in all_links:
+            (internal if is_allowed_internal(u) else external).append(u)
+        frontier.add(internal)
+        frontier.add(external, state="skipped_external")
+        frontier.mark_discovered()
 
-    today = date.today().isoformat()
-    written = 0
-
-    with open(OUTPUT_PATH, "w", encoding="utf-8") as out:
-        for i, url in enumerate(internal, 1):
-            try:
-                art = extract_article(url)
-                body = (art["text"] or "").strip()
-                if not body:
-                    print(f"{i:03d}/{len(internal)}  SKIP (no body)  {url}")
-                    time.sleep(PAUSE_SECONDS)
-                    continue
-
-                out.write("===ARTICLE===\n")
-                out.write(f"source_url: {art['source_url']}\n")
-                out.write(f"title: {art['title'] or 'Unknown'}\n")
-                out.write(f"date_accessed: {today}\n")
-                out.write("TEXT:\n")
-                out.write(body + "\n\n")
-
-                print(f"{i:03d}/{len(internal)}  OK  {art['title'][:80]}")
-                written += 1
-            except Exception as e:
-                print(f"{i:03d}/{len(internal)}  ERROR  {url} -> {e}")
-            time.sleep(PAUSE_SECONDS)
+        print(f"Discovered {len(all_links)} links between '{START_HEADER}' and before '{STOP_HEADER}'.")
+        print(f"- Internal (to fetch): {len(internal)}")
+        print(f"- External (skipped for now): {len(external)}")
 
+    todo = frontier.todo()
+    today = date.today().isoformat()
+    written = changed = 0
+
+    with crawl_engine.open_store(OUTPUT_PATH) as store:
+        results = crawl_engine.crawl(todo, extract_article, concurrency)
+        for i, (url, art, err) in enumerate(results, 1):
+            if err is not None:
+                frontier.mark_failed(url, repr(err))
+                print(f"{i:03d}/{len(todo)}  ERROR  {url} -> {err}")
+                continue
+            body = (art["text"] or "").strip()
+            if not body:
+                frontier.mark_fetched(url)
+                print(f"{i:03d}/{len(todo)}  SKIP (no body)  {url}")
+                continue
+
+            with crawl_engine.timer("write"):
+                changed += crawl_engine.store_article(store, art["source_url"], art["title"], body, today)
+                store.flush()       # on disk before the frontier records it as done
+            frontier.mark_fetched(url)
+
+            print(f"{i:03d}/{len(todo)}  OK  {art['title'][:80]}")
+            written += 1
+
+    external = frontier.urls("skipped_external")
     if external:
         with open(SKIPPED_EXTERNALS_PATH, "w", encoding="utf-8") as f:
             f.write("\n".join(external) + "\n")
 
-    print(f"\nWrote {written} internal articles to {OUTPUT_PATH}")
+    with crawl_engine.timer("write"):
+        total = crawl_engine.export_dump(store, OUTPUT_PATH)
+    print(f"\nStored {written} internal articles ({changed} new or changed); "
+          f"wrote {total} to {OUTPUT_PATH}")
     if external:
         print(f"Logged {len(external)} external links to {SKIPPED_EXTERNALS_PATH}")
+    print(frontier.summary())
+    frontier.close()
 
 
 if __name__ == "__main__":
-    # Allow quick CLI toggle for debug: `python3 scrape_ttc_articles.py --debug`
-    if len(sys.argv) > 1 and sys.argv[1] == "--debug":
-        DEBUG = True
-    main()
+    # `python3 scrape_ttc_articles.py --debug --concurrency 8`
+    args = crawl_engine.add_cli_args(argparse.ArgumentParser()).parse_args()
+    crawl_engine.apply_cli_args(args)
+    DEBUG = args.debug
+    main(args.concurrency)
+    crawl_engine.print_stats()
@@ -2,31 +2,30 @@
 # TableTennisCoaching.com — Tip Of The Week archive
 # Iterate ?page=0..N, extract each post (title + full body) from the index pages,
 # and write ChatGPT-ready blocks with source_url set to the /node/#### link.
+# --incremental: only append tips newer than the last run (see STATE_PATH).
+# A full crawl that dies resumes at the first index page it had not finished
+# (crawl_engine.open_frontier; --fresh-crawl starts over).
 
-import time
-import sys
+import re
+import json
+import argparse
 from datetime import date
 from urllib.parse import urljoin, urlparse
 
-import requests
-from bs4 import BeautifulSoup, Tag
+from bs4 import Tag
+
+import crawl_engine
 
 # ========= CONFIG =========
 BASE_INDEX = "http://www.tabletenniscoaching.com/TipOfTheWeek?page={n}"
 
 # Politeness / HTTP
-PAUSE_SECONDS = 0.8
+PAUSE_SECONDS = 0.8         # min gap between requests to the same host (token bucket)
 TIMEOUT = 20
-UA = {
-    "User-Agent": (
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/120.0.0.0 Safari/537.36"
-    )
-}
 
 # Output
 OUTPUT_PATH = "ttc_tip_of_the_week_for_gpt.txt"
+STATE_PATH = "ttc_tip_of_the_week_state.json"   # high-water-mark /node/#### for --incremental
 
 # Limits (for quick tests)
 MAX_PAGES = None   # e.g., 3 for smoke tests; None = crawl until empty page
@@ -34,6 +33,12 @@ DEBUG = False
 
 ALLOWED = {"tabletenniscoaching.com", "www.tabletenniscoaching.com"}
 
+# Trim obvious chrome
+JUNK_CSS = "nav, footer, script, style, form, aside"
+
+# Every post (title + full body) sits inside the view-content block
+POSTS_ONLY = crawl_engine.SubtreeStrainer("div.view-content")
+
 
 # ========= HELPERS =========
 def is_allowed(url: str) -> bool:
@@ -41,14 +46,24 @@ def is_allowed(url: str) -> bool:
     return host in ALLOWED or host == ""  # allow relative
 
 
-def get_soup(url: str) -> BeautifulSoup:
-    r = requests.get(url, headers=UA, timeout=TIMEOUT, allow_redirects=True)
-    r.raise_for_status()
-    s = BeautifulSoup(r.text, "html.parser")
-    # Trim obvious chrome
-    for junk in s.select("nav, footer, script, style, form, aside"):
-        junk.decompose()
-    return s
+def node_id(url: str) -> int | None:
+    """Numeric ID of a /node/#### URL (IDs grow as new tips are posted)."""
+    m = re.search(r"/node/(\d+)", url)
+    return int(m.group(1)) if m else None
+
+
+def load_state() -> dict | None:
+    try:
+        with open(STATE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_state(high_water_node: int, extra_urls: set):
+    with open(STATE_PATH, "w", encoding="utf-8") as f:
+        json.dump({"high_water_node": high_water_node,
+                   "extra_urls": sorted(extra_urls)}, f, indent=2)
 
 
 def textify(el: Tag) -> str:
@@ -62,7 +77,11 @@ def collect_posts_from_index(page_n: int):
     Uses only the index page, which contains full article text.
     """
     url = BASE_INDEX.format(n=page_n)
-    soup = get_soup(url)
+    return parse_index_page(crawl_engine.fetch_text(url, timeout=TIMEOUT), url)
+
+
+def parse_index_page(html: str, url: str, parser: str | None = None, strain: bool = True):
+    soup = crawl_engine.make_soup(html, JUNK_CSS, POSTS_ONLY if strain else None, parser)
 
     rows = soup.select("div.view-content div.views-row")
     posts = []
@@ -74,7 +93,7 @@ def collect_posts_from_index(page_n: int):
             a = row.select_one("div.views-field.views-field-title h2.field-content a[href]")
         if not a:
             if DEBUG:
-                print(f"[DEBUG] No title link on page {page_n}")
+                print(f"[DEBUG] No title link on {url}")
             continue
 
         node_href = a["href"].strip()
@@ -109,64 +128,147 @@ def collect_posts_from_index(page_n: int):
 
 
 # ========= MAIN =========
-def main():
-    today = date.today().isoformat()
-    seen_urls = set()
-    written = 0
-    page_n = 0
+def main(concurrency: int = crawl_engine.DEFAULT_CONCURRENCY, incremental: bool = False):
+    crawl_engine.set_host_rate(urlparse(BASE_INDEX).hostname, 1 / PAUSE_SECONDS)
 
-    with open(OUTPUT_PATH, "w", encoding="utf-8") as out:
-        while True:
-            if isinstance(MAX_PAGES, int) and page_n >= MAX_PAGES:
-                break
+    state = load_state() if incremental else None
+    if incremental and state is None:
+        print(f"[INFO] No {STATE_PATH} yet; doing a full crawl first.")
+    # Known = at or below the high-water mark; aliased (non /node/) URLs are tracked by name.
+    high_water = state["high_water_node"] if state else 0
+    extra_urls = set(state.get("extra_urls", [])) if state else set()
 
-            index_url = BASE_INDEX.format(n=page_n)
-            try:
-                posts = collect_posts_from_index(page_n)
-            except Exception as e:
-                print(f"[ERROR] index page {page_n} ({index_url}) -> {e}")
-                break
+    def is_known(url: str) -> bool:
+        nid = node_id(url)
+        return (nid <= high_water) if nid is not None else (url in extra_urls)
 
-            if not posts:
-                # Clean stop: no posts found on this page number
-                if DEBUG:
-                    print(f"[DEBUG] No posts on page {page_n}; stopping.")
+    new_high_water = high_water
+    today = date.today().isoformat()
+    seen_urls = set()
+    written = changed = 0
+    page_n = 0
+    done = False
+    complete = False        # reached known nodes or the end of the archive
+
+    # Full crawls record each finished index page; reaching the empty page at the end
+    # of the archive marks the crawl complete, so the next full crawl starts over.
+    frontier = None if state else crawl_engine.open_frontier(OUTPUT_PATH)
+    if frontier:
+        fetched = set(frontier.urls("fetched"))
+        while BASE_INDEX.format(n=page_n) in fetched:
+            page_n += 1
+        if page_n:
+            print(f"Resuming the previous crawl at index page {page_n}. {frontier.summary()}")
+    # A weekly refresh usually only needs page 0, so don't fetch ahead in incremental mode.
+    width = 1 if state else max(1, concurrency)
+
+    with crawl_engine.open_store(OUTPUT_PATH) as store:
+        while not done:
+            # Fetch the next `width` index pages at once; the archive ends at the
+            # first empty page, so anything fetched past it is simply discarded.
+            window = [n for n in range(page_n, page_n + width)
+                      if not (isinstance(MAX_PAGES, int) and n >= MAX_PAGES)]
+            if not window:
+                if frontier:
+                    frontier.mark_discovered()      # MAX_PAGES reached
                 break
 
-            for i, p in enumerate(posts, 1):
-                if p["node_url"] in seen_urls:
+            for n, posts, err in crawl_engine.crawl(window, collect_posts_from_index, concurrency):
+                page_url = BASE_INDEX.format(n=n)
+                if err is not None:
+                    print(f"[ERROR] index page {n} ({page_url}) -> {err}")
+                    if frontier:
+                        frontier.add([page_url])
+                        frontier.mark_failed(page_url, repr(err))
+                    done = True
+                    break
+
+                if not posts:
+                    # Clean stop: no posts found on this page number
                     if DEBUG:
-                        print(f"[DEBUG] Duplicate URL (skipping): {p['node_url']}")
-                    continue
-                seen_urls.add(p["node_url"])
-
-                try:
-                    body = (p["body_text"] or "").strip()
-                    if not body:
-                        print(f"{page_n:03d}:{i:02d}  SKIP (no body)  {p['node_url']}")
+                        print(f"[DEBUG] No posts on page {n}; stopping.")
+                    if frontier:
+                        frontier.mark_discovered()
+                    done = complete = True
+                    break
+
+                if state and all(is_known(p["node_url"]) for p in posts):
+                    # Everything from here on was written by an earlier run
+                    if DEBUG:
+                        print(f"[DEBUG] Page {n} has only known nodes; stopping.")
+                    done = complete = True
+                    break
+
+                for i, p in enumerate(posts, 1):
+                    if p["node_url"] in seen_urls:
+                        if DEBUG:
+                            print(f"[DEBUG] Duplicate URL (skipping): {p['node_url']}")
+                        continue
+                    seen_urls.add(p["node_url"])
+                    if state and is_known(p["node_url"]):
                         continue
 
-                    out.write("===ARTICLE===\n")
-                    out.write(f"source_url: {p['node_url']}\n")
-                    out.write(f"title: {p['title'] or 'Unknown'}\n")
-                    out.write(f"date_accessed: {today}\n")
-                    out.write("TEXT:\n")
-                    out.write(body + "\n\n")
-
-                    print(f"{page_n:03d}:{i:02d}  OK  {p['title'][:80]}")
-                    written += 1
-                except Exception as e:
-                    print(f"{page_n:03d}:{i:02d}  ERROR  {p['node_url']} -> {e}")
-                time.sleep(PAUSE_SECONDS)
-
-            page_n += 1
-            time.sleep(PAUSE_SECONDS)
-
-    print(f"\nWrote {written} articles to {OUTPUT_PATH}")
+                    try:
+                        body = (p["body_text"] or "").strip()
+                        if not body:
+                            print(f"{n:03d}:{i:02d}  SKIP (no body)  {p['node_url']}")
+                            continue
+
+                        with crawl_engine.timer("write"):
+                            changed += crawl_engine.store_article(store, p["node_url"], p["title"], body, today)
+
+                        print(f"{n:03d}:{i:02d}  OK  {p['title'][:80]}")
+                        written += 1
+
+                        nid = node_id(p["node_url"])
+                        if nid is None:
+                            extra_urls.add(p["node_url"])
+                        else:
+                            new_high_water = max(new_high_water, nid)
+                    except Exception as e:
+                        print(f"{n:03d}:{i:02d}  ERROR  {p['node_url']} -> {e}")
+
+                if frontier:
+                    with crawl_engine.timer("write"):
+                        store.flush()
+                    frontier.add([page_url])
+                    frontier.mark_fetched(page_url)
+
+            page_n = window[-1] + 1
+
+        if frontier and complete:
+            # pages done by an earlier, interrupted run count too: take the mark from
+            # everything the store holds
+            for url in store.ids():
+                nid = node_id(url)
+                if nid is None:
+                    extra_urls.add(url)
+                else:
+                    new_high_water = max(new_high_water, nid)
+
+    if complete:
+        # A run that died part-way (or stopped at MAX_PAGES) must not set a high-water
+        # mark above the pages it never reached: the next incremental run would skip them.
+        save_state(new_high_water, extra_urls)
+    else:
+        print(f"[INFO] Stopped before reaching known tips; {STATE_PATH} left unchanged.")
+    with crawl_engine.timer("write"):
+        total = crawl_engine.export_dump(store, OUTPUT_PATH)
+    print(f"\nStored {written} {'new ' if state else ''}articles ({changed} new or changed); "
+          f"wrote {total} to {OUTPUT_PATH} (high-water node {new_high_water})")
+    if frontier:
+        print(frontier.summary())
+        frontier.close()
 
 
 if __name__ == "__main__":
-    # Optional: `python3 Scrape_TipofTheDay.py --debug`
-    if len(sys.argv) > 1 and sys.argv[1] == "--debug":
-        DEBUG = True
-    main()
+    # Optional: `python3 Scrape_TipofTheDay.py --debug --concurrency 4`
+    #           `python3 Scrape_TipofTheDay.py --incremental`   (weekly refresh)
+    parser = crawl_engine.add_cli_args(argparse.ArgumentParser())
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"append only tips newer than the high-water mark in {STATE_PATH}")
+    args = parser.parse_args()
+    crawl_engine.apply_cli_args(args)
+    DEBUG = args.debug
+    main(args.concurrency, incremental=args.incremental)
+    crawl_engine.print_stats()
@@ -0,0 +1,109 @@
+# bench_parsers.py
+# Micro-benchmark of the HTML parser backends on pages saved in the HTTP cache.
+# For every backend (with and without SoupStrainer-limited parsing) it reports pages/sec
+# and checks that the extracted records are identical to the html.parser full-tree baseline.
+#
+#   python3 bench_parsers.py                      # uses .http_cache from previous crawls
+#   python3 bench_parsers.py --cache-dir X --repeat 5
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup, FeatureNotFound
+
+import crawl_engine
+import pingskills_scrape_many as pingskills
+import TableTennisCoaching_articles_scraper as ttc_articles
+import TableTennisCoaching_tip_of_the_day_scraper as ttc_tips
+
+
+def extractor_for(url: str):
+    """Pick the scraper logic that would have consumed this page, or None."""
+    u = urlparse(url)
+    host, path = (u.hostname or "").lower(), u.path.rstrip("/")
+    if host.endswith("pingskills.com"):
+        if path == "/blog":
+            return lambda html, p, strain: pingskills.parse_links(
+                html, url, pingskills.POST_LINKS_CSS, parser=p, strain=strain)
+        if path.startswith("/blog/"):
+            return lambda html, p, strain: pingskills.parse_article(html, url, parser=p, strain=strain)
+    if host.endswith("tabletenniscoaching.com"):
+        if path.lower() == "/tipoftheweek":
+            return lambda html, p, strain: ttc_tips.parse_index_page(html, url, parser=p, strain=strain)
+        if path == "/articles":
+            # always a full parse; still useful to compare backends
+            return lambda html, p, strain: ttc_articles.parse_index(
+                html, url, ttc_articles.START_HEADER, ttc_articles.STOP_HEADER, parser=p)
+        return lambda html, p, strain: ttc_articles.parse_article(html, url, parser=p, strain=strain)
+    return None
+
+
+def load_pages(cache_dir: Path):
+    pages = []
+    for meta_path in sorted(cache_dir.glob("*/*.json")):
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            body = meta_path.with_suffix(".body").read_bytes()
+        except (OSError, ValueError):
+            continue
+        fn = extractor_for(meta["url"])
+        if fn:
+            pages.append((meta["url"], body.decode(meta.get("encoding") or "utf-8", errors="replace"), fn))
+    return pages
+
+
+def available(parser: str) -> bool:
+    try:
+        BeautifulSoup("<p></p>", parser)
+        return True
+    except FeatureNotFound:
+        return False
+
+
+def run(pages, parser: str, strain: bool, repeat: int):
+    results = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [fn(html, parser, strain) for _, html, fn in pages]
+    elapsed = time.perf_counter() - start
+    return results, (len(pages) * repeat) / elapsed if elapsed else float("inf")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cache-dir", default=crawl_engine.CACHE_DIR)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    pages = load_pages(Path(args.cache_dir))
+    if not pages:
+        sys.exit(f"No saved pages under {args.cache_dir}; run a scraper first to fill the cache.")
+    print(f"{len(pages)} saved pages, {args.repeat} passes each\n")
+
+    baseline, _ = run(pages, "html.parser", strain=False, repeat=1)
+
+    print(f"{'backend':<14}{'strained':<10}{'pages/sec':>10}  identical")
+    mismatched = 0
+    for parser in crawl_engine.PARSERS:
+        if not available(parser):
+            print(f"{parser:<14}{'-':<10}{'-':>10}  (not installed)")
+            continue
+        # html5lib ignores parse_only, so only time it on the full tree
+        for strain in ((False,) if parser == "html5lib" else (False, True)):
+            results, rate = run(pages, parser, strain, args.repeat)
+            diffs = [url for (url, _, _), a, b in zip(pages, results, baseline) if a != b]
+            mismatched += len(diffs)
+            verdict = "yes" if not diffs else f"NO ({len(diffs)} pages)"
+            print(f"{parser:<14}{str(strain):<10}{rate:>10.1f}  {verdict}")
+            for url in diffs[:5]:
+                print(f"    differs: {url}")
+
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
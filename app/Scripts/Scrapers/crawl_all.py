@@ -0,0 +1,54 @@
+# crawl_all.py
+# Run the PingSkills, TTC Articles and TTC Tip-of-the-Week scrapers at the same time.
+# Each site gets its own thread; the shared crawl_engine keeps one pooled session and
+# one politeness bucket per host, so the two TTC crawls still share a single rate limit.
+
+import argparse
+import threading
+
+import crawl_engine
+import pingskills_scrape_many
+import TableTennisCoaching_articles_scraper
+import TableTennisCoaching_tip_of_the_day_scraper
+
+SCRAPERS = {
+    "pingskills": pingskills_scrape_many,
+    "ttc_articles": TableTennisCoaching_articles_scraper,
+    "ttc_tips": TableTennisCoaching_tip_of_the_day_scraper,
+}
+
+
+def main():
+    parser = crawl_engine.add_cli_args(argparse.ArgumentParser())
+    parser.add_argument("--only", nargs="+", choices=sorted(SCRAPERS),
+                        help="subset of sites to crawl (default: all)")
+    args = parser.parse_args()
+
+    crawl_engine.apply_cli_args(args)
+
+    names = args.only or list(SCRAPERS)
+    errors = {}
+
+    def run(name):
+        module = SCRAPERS[name]
+        if hasattr(module, "DEBUG"):
+            module.DEBUG = args.debug
+        try:
+            module.main(args.concurrency)
+        except Exception as e:
+            errors[name] = e
+            print(f"[{name}] FAILED -> {e}")
+
+    threads = [threading.Thread(target=run, args=(n,), name=n) for n in names]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    crawl_engine.close_all()
+    crawl_engine.print_stats()
+    print(f"\nFinished {len(names) - len(errors)}/{len(names)} site crawls.")
+
+
+if __name__ == "__main__":
+    main()
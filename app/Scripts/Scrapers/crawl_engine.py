@@ -0,0 +1,397 @@
+# crawl_engine.py
+# Shared fetch layer for the scrapers in this folder.
+# - one pooled keep-alive requests.Session per host
+# - a token-bucket politeness limit per host (replaces the old global time.sleep)
+# - bounded concurrency through a thread pool, results returned in input order
+# - an optional on-disk HTTP cache with ETag / Last-Modified revalidation (http_cache.py)
+# - a selectable BeautifulSoup tree builder (html.parser / lxml / html5lib) and
+#   SoupStrainer-limited parsing of just the subtrees an extractor reads
+# - stage timings (throttle / fetch / parse / page / write) and byte counters in ../metrics.py,
+#   printed as a table by print_stats(); --trace writes one JSON line per page
+# - a WARC-style archive of every downloaded page (page_archive.py), so reextract.py
+#   can rebuild the outputs after a selector fix without touching the network
+# - scraped articles kept in an append-only store keyed by source_url (../shard_store.py);
+#   the *_for_gpt.txt dump is rebuilt from it with one atomic replace at the end of a run
+# - a persistent crawl frontier per output (frontier.py): a run that died resumes with
+#   the URLs it had not fetched yet, and failed URLs are retried on later runs
+
+import os
+import re
+import sys
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer, FeatureNotFound
+
+from http_cache import HttpCache, CacheMiss
+from page_archive import PageArchive, ARCHIVE_DIR
+from frontier import Frontier
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import metrics
+from metrics import timer     # scrapers time their own stages with crawl_engine.timer("write")
+from shard_store import ShardStore
+
+# ========= CONFIG =========
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 20
+POOL_SIZE = 8               # keep-alive connections kept open per host
+CACHE_DIR = ".http_cache"   # shared by all scrapers; delete it to force a cold crawl
+
+UA = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+                  "AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/120.0.0.0 Safari/537.36"
+}
+
+JUNK_CSS = "nav, footer, script, style, form, aside"
+
+# html.parser is pure Python; lxml is several times faster. Default stays html.parser so
+# output never changes silently -- run bench_parsers.py on cached pages before switching.
+PARSER = "html.parser"
+PARSERS = ("html.parser", "lxml", "html5lib")
+# =========================
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` requests/second, bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_sessions: dict[str, requests.Session] = {}
+_buckets: dict[str, TokenBucket] = {}
+_host_rates: dict[str, float] = {}
+_lock = threading.Lock()
+_cache: HttpCache | None = HttpCache(CACHE_DIR)
+_archive: PageArchive | None = PageArchive(ARCHIVE_DIR)
+_fresh_crawl = False
+
+
+def configure_cache(enabled: bool = True, root: str = CACHE_DIR,
+                    ttl: float | None = None, offline: bool = False):
+    global _cache
+    _cache = HttpCache(root, ttl=ttl, offline=offline) if enabled else None
+
+
+def configure_archive(enabled: bool = True, root: str = ARCHIVE_DIR):
+    global _archive
+    if _archive is not None:
+        _archive.close()
+    _archive = PageArchive(root) if enabled else None
+
+
+def host_of(url: str) -> str:
+    return (urlparse(url).hostname or "").lower()
+
+
+def set_host_rate(host: str, per_second: float, burst: int = 1):
+    """
+    Politeness limit for one host. Scrapers call this with 1 / PAUSE_SECONDS.
+    When two scrapers share a host (both TTC crawls) the slower rate wins.
+    """
+    host = host.lower()
+    with _lock:
+        if host in _host_rates:
+            per_second = min(per_second, _host_rates[host])
+        _host_rates[host] = per_second
+        _buckets[host] = TokenBucket(per_second, burst)
+
+
+def _bucket(host: str) -> TokenBucket:
+    with _lock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(_host_rates.get(host, 1.0))
+        return _buckets[host]
+
+
+def session_for(host: str) -> requests.Session:
+    """One keep-alive Session per host, shared by all worker threads."""
+    with _lock:
+        s = _sessions.get(host)
+        if s is None:
+            s = requests.Session()
+            s.headers.update(UA)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            _sessions[host] = s
+        return s
+
+
+def fetch(url: str, timeout: float = DEFAULT_TIMEOUT, headers: dict | None = None) -> requests.Response:
+    host = host_of(url)
+    with timer("throttle"):
+        _bucket(host).acquire()
+    with timer("fetch"):
+        r = session_for(host).get(url, timeout=timeout, allow_redirects=True, headers=headers)
+    metrics.inc("bytes_fetched_total", len(r.content), host=host)
+    if r.status_code != 304:
+        r.raise_for_status()
+        if _archive is not None:
+            with timer("archive"):
+                _archive.add_response(url, r)
+    return r
+
+
+def fetch_text(url: str, timeout: float = DEFAULT_TIMEOUT) -> str:
+    """
+    Page HTML as text, going through the HTTP cache when it is enabled:
+    fresh (TTL) or offline -> disk only; otherwise a conditional GET, and a 304 is
+    served from disk.
+    """
+    if _cache is None:
+        return fetch(url, timeout=timeout).text
+
+    cached = _cache.lookup(url)
+    if cached:
+        meta, body = cached
+        if _cache.is_fresh(meta):
+            _cache.count("fresh_hits", len(body))
+            metrics.inc("bytes_cached_total", len(body), host=host_of(url))
+            return _cache.decode(meta, body)
+    elif _cache.offline:
+        raise CacheMiss(f"offline mode and no cached copy of {url}")
+
+    r = fetch(url, timeout=timeout, headers=_cache.conditional_headers(meta) if cached else None)
+    if r.status_code == 304 and cached:
+        _cache.touch(url, meta, r)
+        _cache.count("revalidated", len(body))
+        metrics.inc("bytes_cached_total", len(body), host=host_of(url))
+        return _cache.decode(meta, body)
+
+    r.raise_for_status()
+    _cache.store(url, r)
+    _cache.count("misses", len(r.content))
+    return r.text
+
+
+class SubtreeStrainer(SoupStrainer):
+    """
+    parse_only filter that keeps whole subtrees rooted at simple `tag` / `tag.class`
+    selectors. Built from the scrapers' own CSS constants: only the first compound
+    of each comma-separated selector is used, e.g.
+    "div.node__content div.field--name-body" -> keep every <div class="node__content">.
+    """
+
+    _COMPOUND = re.compile(r"^\s*([a-zA-Z][\w-]*)?((?:\.[\w-]+)*)")
+
+    def __init__(self, *selectors: str):
+        self.rules = []
+        for css in selectors:
+            for part in css.split(","):
+                m = self._COMPOUND.match(part)
+                if not m or not (m.group(1) or m.group(2)):
+                    raise ValueError(f"unsupported strainer selector: {part!r}")
+                classes = frozenset(c for c in m.group(2).split(".") if c)
+                self.rules.append(((m.group(1) or "").lower() or None, classes))
+        # name rules make SoupStrainer drop stray top-level strings, like a tag filter should
+        super().__init__(name=[tag or True for tag, _ in self.rules])
+
+    def allow_tag_creation(self, nsprefix, name, attrs) -> bool:
+        raw = (attrs or {}).get("class") or ""
+        classes = set(raw.split()) if isinstance(raw, str) else set(raw)
+        return any((tag is None or tag == name) and wanted <= classes
+                   for tag, wanted in self.rules)
+
+
+def configure_parser(name: str):
+    """Select the tree builder; fall back to html.parser if the optional one isn't installed."""
+    global PARSER
+    try:
+        BeautifulSoup("<p></p>", name)
+    except FeatureNotFound:
+        print(f"[WARN] parser '{name}' is not installed; using html.parser")
+        name = "html.parser"
+    PARSER = name
+
+
+def make_soup(html: str, junk_css: str = JUNK_CSS, parse_only: SoupStrainer | None = None,
+              parser: str | None = None) -> BeautifulSoup:
+    with timer("parse"):
+        s = BeautifulSoup(html, parser or PARSER, parse_only=parse_only)
+        for junk in s.select(junk_css):
+            junk.decompose()
+    return s
+
+
+def get_soup(url: str, junk_css: str = JUNK_CSS, timeout: float = DEFAULT_TIMEOUT,
+             parse_only: SoupStrainer | None = None) -> BeautifulSoup:
+    return make_soup(fetch_text(url, timeout=timeout), junk_css, parse_only)
+
+
+def crawl(items, fn, concurrency: int = DEFAULT_CONCURRENCY):
+    """
+    Run fn(item) for every item with at most `concurrency` in flight.
+    Yields (item, result, error) in input order so output files stay stable.
+    Per-host politeness is enforced inside fetch(), not here.
+    """
+    def run(item):
+        try:
+            with metrics.trace(str(item)), timer("page"):
+                result = fn(item)
+            metrics.inc("items_total", status="ok")
+            return item, result, None
+        except Exception as e:
+            metrics.inc("items_total", status="error")
+            return item, None, e
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        yield from pool.map(run, items)
+
+
+def open_frontier(output_path: str) -> Frontier:
+    """
+    The crawl state behind a dump: foo_for_gpt.txt -> foo_for_gpt.frontier.db. An
+    unfinished crawl is resumed; a finished one (or --fresh-crawl) starts over.
+    """
+    frontier = Frontier(Path(output_path).with_suffix(".frontier.db"))
+    if _fresh_crawl or frontier.finished():
+        frontier.restart()
+    elif frontier.discovered:
+        print(f"Resuming the previous crawl. {frontier.summary()}")
+        if not frontier.todo():
+            print(f"Only URLs out of attempts are left: `python3 frontier.py retry {frontier.path}` "
+                  f"to try them again, or --fresh-crawl to start over.")
+    return frontier
+
+
+def open_store(output_path: str) -> ShardStore:
+    """The articles behind a dump: foo_for_gpt.txt -> foo_for_gpt.store/.
+
+    The first time, an existing dump is loaded into the new store so that nothing it
+    held (and none of its dates) is lost when the dump is next rewritten from the store.
+    An IMPORTED marker is written once that import is flushed; until then every open
+    imports again, skipping the articles the store already has.
+    """
+    root = Path(output_path).with_suffix(".store")
+    store = ShardStore(root)
+    marker = root / "IMPORTED"
+    if not marker.exists():
+        if os.path.exists(output_path):
+            for art in _read_dump(output_path):
+                if art["source_url"] not in store:
+                    store.append(art["source_url"], art)
+            store.flush()
+        root.mkdir(parents=True, exist_ok=True)
+        marker.write_text(f"{output_path}\n", encoding="utf-8")
+    return store
+
+
+def _read_dump(output_path: str):
+    with open(output_path, encoding="utf-8", errors="replace", newline="") as f:
+        blocks = f.read().split("===ARTICLE===")
+    for block in blocks:
+        head, sep, text = block.strip().partition("TEXT:")
+        if not sep:
+            continue
+        fields = dict(line.split(": ", 1) for line in head.splitlines() if ": " in line)
+        if "source_url" in fields:
+            yield {"source_url": fields["source_url"], "title": fields.get("title", ""),
+                   "date_accessed": fields.get("date_accessed", ""), "text": text.strip()}
+
+
+def store_article(store: ShardStore, source_url: str, title: str, text: str, day: str) -> bool:
+    """Append an article unless its title and text are unchanged (then it keeps its first date)."""
+    old = store.get(source_url)
+    if old and old["title"] == title and old["text"] == text:
+        return False
+    return store.append(source_url, {"source_url": source_url, "title": title,
+                                     "date_accessed": day, "text": text})
+
+
+def export_dump(store: ShardStore, output_path: str) -> int:
+    """
+    Rewrite the ===ARTICLE=== dump from the store: written aside, fsynced, then renamed.
+    Articles keep the position they were first stored at, even after an update.
+    """
+    tmp = Path(f"{output_path}.tmp")
+    count = 0
+    latest = dict(store.iter_latest())
+    with open(tmp, "w", encoding="utf-8") as out:
+        for art in (latest[id_] for id_ in store.ids()):
+            out.write("===ARTICLE===\n")
+            out.write(f"source_url: {art['source_url']}\n")
+            out.write(f"title: {art['title'] or 'Unknown'}\n")
+            out.write(f"date_accessed: {art['date_accessed']}\n")
+            out.write("TEXT:\n")
+            out.write(art["text"] + "\n\n")
+            count += 1
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, output_path)
+    return count
+
+
+def add_cli_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--debug", action="store_true", help="verbose debug output")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"max pages in flight (default {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--parser", choices=PARSERS, default=PARSER,
+                        help=f"BeautifulSoup tree builder (default {PARSER})")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the on-disk HTTP cache")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--cache-ttl", type=float, default=None,
+                        help="seconds a cached page is reused without revalidating (default: always revalidate)")
+    parser.add_argument("--offline", action="store_true",
+                        help="serve only from the HTTP cache; never hit the network")
+    parser.add_argument("--no-archive", action="store_true",
+                        help="do not keep a raw copy of downloaded pages")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--fresh-crawl", action="store_true",
+                        help="ignore an unfinished crawl's frontier and start again from the index")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="append one JSON line per page (stage times, error) to PATH")
+    return parser
+
+
+def apply_cli_args(args: argparse.Namespace):
+    global _fresh_crawl
+    _fresh_crawl = args.fresh_crawl
+    configure_parser(args.parser)
+    configure_cache(enabled=not args.no_cache, root=args.cache_dir,
+                    ttl=args.cache_ttl, offline=args.offline)
+    configure_archive(enabled=not args.no_archive, root=args.archive_dir)
+    metrics.configure_trace(args.trace)
+
+
+def print_stats():
+    if _cache is not None:
+        print(_cache.summary())
+    if _archive is not None and _archive.records:
+        print(f"Page archive: {_archive.records} page(s) added under {_archive.root}")
+    table = metrics.summary_table()
+    if table:
+        print(table)
+
+
+def close_all():
+    with _lock:
+        for s in _sessions.values():
+            s.close()
+        _sessions.clear()
+    if _archive is not None:
+        _archive.close()
@@ -0,0 +1,146 @@
+# frontier.py
+# Persistent crawl frontier, so a scraper that dies halfway resumes instead of starting
+# over. One SQLite file per output (ttc_articles_for_gpt.frontier.db) records every
+# discovered URL, in discovery order, with its state:
+#
+#   pending            discovered, not fetched yet
+#   fetched            fetched and stored (an empty page counts: refetching won't help)
+#   failed             last attempt raised; retried on later runs until MAX_ATTEMPTS
+#   skipped_external   outside the site, never fetched
+#
+# Discovery (the index page -> article links) is recorded too: a resumed run goes
+# straight to the URLs still to do. Once every URL is fetched (or external), the next
+# run starts a fresh crawl (the HTTP cache keeps that cheap); URLs that ran out of
+# attempts keep the crawl open until `retry` or --fresh-crawl.
+#
+#   python3 frontier.py stats ttc_articles_for_gpt.frontier.db
+#   python3 frontier.py retry ttc_articles_for_gpt.frontier.db    # give exhausted URLs another go
+
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+
+# ========= CONFIG =========
+MAX_ATTEMPTS = 5            # fetch attempts per URL, across runs
+STATES = ("pending", "fetched", "failed", "skipped_external")
+# =========================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    id INTEGER PRIMARY KEY,             -- discovery order
+    url TEXT NOT NULL UNIQUE,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS urls_state ON urls (state, id);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class Frontier:
+    """URL states for one crawl. Used from the thread that consumes crawl() results."""
+
+    def __init__(self, path, max_attempts: int = MAX_ATTEMPTS):
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")     # WAL: a crash loses no committed row
+        self.db.executescript(_SCHEMA)
+
+    # ---- discovery ----
+    @property
+    def discovered(self) -> bool:
+        return self.db.execute("SELECT 1 FROM meta WHERE key = 'discovered'").fetchone() is not None
+
+    def add(self, urls, state: str = "pending") -> int:
+        """Record URLs not seen before; returns how many were new."""
+        now = time.time()
+        with self.db:
+            before = self.db.total_changes
+            self.db.executemany("INSERT OR IGNORE INTO urls (url, state, updated_at) VALUES (?, ?, ?)",
+                                [(u, state, now) for u in urls])
+            return self.db.total_changes - before
+
+    def mark_discovered(self):
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('discovered', ?)", (str(time.time()),))
+
+    # ---- work ----
+    def todo(self) -> list[str]:
+        """Pending URLs, then failed ones with attempts left, each in discovery order."""
+        rows = self.db.execute(
+            "SELECT url FROM urls WHERE state = 'pending' OR (state = 'failed' AND attempts < ?) "
+            "ORDER BY state = 'failed', id", (self.max_attempts,))
+        return [u for (u,) in rows]
+
+    def mark_fetched(self, url: str):
+        self._set(url, "fetched", None)
+
+    def mark_failed(self, url: str, error: str):
+        self._set(url, "failed", error)
+
+    def _set(self, url: str, state: str, error: str | None):
+        with self.db:
+            self.db.execute("UPDATE urls SET state = ?, attempts = attempts + 1, last_error = ?, updated_at = ? "
+                            "WHERE url = ?", (state, error, time.time(), url))
+
+    def urls(self, state: str) -> list[str]:
+        return [u for (u,) in self.db.execute("SELECT url FROM urls WHERE state = ? ORDER BY id", (state,))]
+
+    def finished(self) -> bool:
+        """Discovered and nothing pending or failed -- exhausted URLs keep a crawl open."""
+        if not self.discovered:
+            return False
+        return self.db.execute("SELECT 1 FROM urls WHERE state IN ('pending', 'failed') LIMIT 1").fetchone() is None
+
+    def restart(self):
+        """Forget the previous crawl; the next run discovers and fetches everything again."""
+        with self.db:
+            self.db.execute("DELETE FROM urls")
+            self.db.execute("DELETE FROM meta")
+
+    def retry_exhausted(self) -> int:
+        with self.db:
+            return self.db.execute("UPDATE urls SET attempts = 0 WHERE state = 'failed'").rowcount
+
+    # ---- stats ----
+    def counts(self) -> dict:
+        counts = dict.fromkeys(STATES, 0)
+        counts.update(self.db.execute("SELECT state, COUNT(*) FROM urls GROUP BY state").fetchall())
+        counts["exhausted"] = self.db.execute("SELECT COUNT(*) FROM urls WHERE state = 'failed' AND attempts >= ?",
+                                              (self.max_attempts,)).fetchone()[0]
+        return counts
+
+    def summary(self) -> str:
+        c = self.counts()
+        return (f"Frontier: {c['fetched']} fetched, {c['pending']} pending, {c['failed']} failed "
+                f"({c['exhausted']} out of attempts), {c['skipped_external']} external")
+
+    def close(self):
+        self.db.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect a scraper's crawl frontier.")
+    ap.add_argument("command", choices=("stats", "retry"))
+    ap.add_argument("path", type=Path)
+    args = ap.parse_args()
+    if not args.path.exists():
+        raise SystemExit(f"{args.path} does not exist")
+
+    frontier = Frontier(args.path)
+    if args.command == "retry":
+        print(f"{frontier.retry_exhausted()} failed URL(s) will be retried on the next run")
+    print(frontier.summary())
+    for url, attempts, error in frontier.db.execute(
+            "SELECT url, attempts, last_error FROM urls WHERE state = 'failed' ORDER BY id LIMIT 10"):
+        print(f"    [{attempts}x] {url} -> {error}")
+    frontier.close()
+
+
+if __name__ == "__main__":
+    main()
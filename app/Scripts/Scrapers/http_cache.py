@@ -0,0 +1,127 @@
+# http_cache.py
+# Persistent response cache for crawl_engine.fetch_text().
+# Bodies are stored on disk next to their ETag / Last-Modified headers so later runs
+# can revalidate with If-None-Match / If-Modified-Since and get a cheap 304 back.
+#
+# Layout: <root>/<sha1[:2]>/<sha1>.body  (raw bytes)
+#         <root>/<sha1[:2]>/<sha1>.json  (url, etag, last_modified, encoding, fetched_at)
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+class CacheMiss(Exception):
+    """Raised in offline mode when a URL has never been fetched."""
+
+
+class HttpCache:
+    def __init__(self, root: str, ttl: float | None = None, offline: bool = False):
+        self.root = Path(root)
+        self.ttl = ttl              # seconds a stored page is served without revalidation
+        self.offline = offline      # never touch the network; serve whatever is on disk
+        self.lock = threading.Lock()
+        self.stats = {
+            "fresh_hits": 0,        # served from disk, no request at all (TTL / offline)
+            "revalidated": 0,       # conditional request answered with 304
+            "misses": 0,            # full download
+            "bytes_saved": 0,
+            "bytes_fetched": 0,
+        }
+
+    # ---- paths ----
+    def _base(self, url: str) -> Path:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return self.root / key[:2] / key
+
+    # ---- read ----
+    def lookup(self, url: str):
+        """Return (meta, body_bytes) or None."""
+        base = self._base(url)
+        try:
+            meta = json.loads(base.with_suffix(".json").read_text(encoding="utf-8"))
+            body = base.with_suffix(".body").read_bytes()
+        except (OSError, ValueError):
+            return None
+        return meta, body
+
+    def is_fresh(self, meta: dict) -> bool:
+        if self.offline:
+            return True
+        if self.ttl is None:
+            return False
+        return time.time() - meta.get("fetched_at", 0) < self.ttl
+
+    @staticmethod
+    def conditional_headers(meta: dict) -> dict:
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    @staticmethod
+    def decode(meta: dict, body: bytes) -> str:
+        return body.decode(meta.get("encoding") or "utf-8", errors="replace")
+
+    # ---- write ----
+    def _write_atomic(self, path: Path, data: bytes):
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def store(self, url: str, response) -> dict:
+        base = self._base(url)
+        base.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "url": url,
+            "final_url": response.url,
+            "status": response.status_code,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "encoding": response.encoding or response.apparent_encoding,
+            "fetched_at": time.time(),
+        }
+        self._write_atomic(base.with_suffix(".body"), response.content)
+        self._write_atomic(base.with_suffix(".json"), json.dumps(meta).encode("utf-8"))
+        return meta
+
+    def seed(self, url: str, body: bytes, encoding: str = "utf-8") -> dict:
+        """Store a page that did not come from the network (saved fixtures, archives)."""
+        base = self._base(url)
+        base.parent.mkdir(parents=True, exist_ok=True)
+        meta = {"url": url, "final_url": url, "status": 200, "etag": None,
+                "last_modified": None, "encoding": encoding, "fetched_at": time.time()}
+        self._write_atomic(base.with_suffix(".body"), body)
+        self._write_atomic(base.with_suffix(".json"), json.dumps(meta).encode("utf-8"))
+        return meta
+
+    def touch(self, url: str, meta: dict, response=None):
+        """A 304 came back: refresh fetched_at (and any new validators)."""
+        meta = dict(meta, fetched_at=time.time())
+        if response is not None:
+            meta["etag"] = response.headers.get("ETag") or meta.get("etag")
+            meta["last_modified"] = response.headers.get("Last-Modified") or meta.get("last_modified")
+        self._write_atomic(self._base(url).with_suffix(".json"), json.dumps(meta).encode("utf-8"))
+
+    # ---- stats ----
+    def count(self, kind: str, nbytes: int = 0):
+        with self.lock:
+            self.stats[kind] += 1
+            if kind == "misses":
+                self.stats["bytes_fetched"] += nbytes
+            else:
+                self.stats["bytes_saved"] += nbytes
+
+    def summary(self) -> str:
+        s = self.stats
+        total = s["fresh_hits"] + s["revalidated"] + s["misses"]
+        hits = s["fresh_hits"] + s["revalidated"]
+        rate = (100.0 * hits / total) if total else 0.0
+        return (f"HTTP cache: {hits}/{total} hits ({rate:.0f}%) "
+                f"[fresh={s['fresh_hits']}, 304={s['revalidated']}, miss={s['misses']}], "
+                f"saved {s['bytes_saved'] / 1024:.0f} KiB, downloaded {s['bytes_fetched'] / 1024:.0f} KiB")
@@ -0,0 +1,292 @@
+# page_archive.py
+# Raw copy of every page crawl_engine downloads, so a selector fix can be replayed over
+# the archive (reextract.py) instead of re-crawling politely.
+#
+# Files hold WARC/1.0 "response" records, one gzip member per record (the .warc.gz
+# convention): standard WARC tools can read them, and any record can be decompressed
+# on its own from its byte offset, which is how reextract.py hands pages to workers.
+#
+# Layout: <root>/pages-<UTC timestamp>-<pid>.warc.gz   (a new file every ROTATE_BYTES)
+#         <root>/pages-....warc.gz.idx.jsonl        url, status, fetched_at, offset, length
+#                                                   per record, so latest() reads no bodies
+#
+#   python3 page_archive.py stats
+#   python3 page_archive.py import-cache        # seed the archive from .http_cache
+
+import argparse
+import gzip
+import json
+import os
+import re
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from http import HTTPStatus
+from pathlib import Path
+
+# ========= CONFIG =========
+ARCHIVE_DIR = ".page_archive"
+ROTATE_BYTES = 256 * 1024 * 1024
+COMPRESS_LEVEL = 6
+READ_CHUNK = 1 << 20
+HEAD_BYTES = 16 * 1024      # decompressed prefix kept per record when scanning headers only
+# =========================
+
+_CHARSET = re.compile(r"charset=([\w.:-]+)", re.I)
+
+
+def _warc_date(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class PageArchive:
+    """Append-only, thread-safe writer. Files are opened lazily on the first page."""
+
+    def __init__(self, root: str = ARCHIVE_DIR, rotate_bytes: int = ROTATE_BYTES):
+        self.root = Path(root)
+        self.rotate_bytes = rotate_bytes
+        self.lock = threading.Lock()
+        self.file = None
+        self.index_file = None
+        self.path = None
+        self.records = 0
+
+    def _open(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")
+        self.path = self.root / f"pages-{stamp}-{os.getpid()}.warc.gz"
+        self.file = open(self.path, "ab")
+        self.index_file = open(_sidecar(self.path), "a", encoding="utf-8")
+
+    def write(self, url: str, status: int, body: bytes, content_type: str = "text/html",
+              fetched_at: float | None = None, final_url: str | None = None) -> tuple[Path, int]:
+        """Append one page; returns (file, offset) of its record."""
+        fetched_at = fetched_at or time.time()
+        try:
+            reason = HTTPStatus(status).phrase
+        except ValueError:
+            reason = ""
+        http = (f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body
+        headers = [
+            "WARC/1.0",
+            "WARC-Type: response",
+            f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>",
+            f"WARC-Date: {_warc_date(fetched_at)}",
+            f"WARC-Target-URI: {url}",
+            f"X-Fetched-At: {fetched_at:.3f}",
+            "Content-Type: application/http; msgtype=response",
+            f"Content-Length: {len(http)}",
+        ]
+        if final_url and final_url != url:
+            headers.append(f"X-Final-URI: {final_url}")
+        record = ("\r\n".join(headers) + "\r\n\r\n").encode("utf-8") + http + b"\r\n\r\n"
+        member = gzip.compress(record, compresslevel=COMPRESS_LEVEL)
+
+        with self.lock:
+            if self.file is None or self.file.tell() >= self.rotate_bytes:
+                self.close_file()
+                self._open()
+            offset = self.file.tell()
+            self.file.write(member)
+            self.file.flush()
+            # after the record: a crash in between only leaves the sidecar short
+            self.index_file.write(json.dumps({"url": url, "status": status, "fetched_at": round(fetched_at, 3),
+                                              "offset": offset, "length": len(member)}) + "\n")
+            self.index_file.flush()
+            self.records += 1
+            return self.path, offset
+
+    def add_response(self, url: str, response) -> tuple[Path, int]:
+        """Archive a requests.Response, keeping the charset it was decoded with."""
+        content_type = response.headers.get("Content-Type") or "text/html"
+        if not _CHARSET.search(content_type):
+            content_type += f"; charset={response.encoding or response.apparent_encoding or 'utf-8'}"
+        return self.write(url, response.status_code, response.content, content_type,
+                          final_url=response.url)
+
+    def close_file(self):
+        if self.file is not None:
+            self.file.close()
+            self.index_file.close()
+            self.file = self.index_file = None
+
+    def close(self):
+        with self.lock:
+            self.close_file()
+
+
+# ---- reading ----
+def archive_files(root: str = ARCHIVE_DIR) -> list[Path]:
+    return sorted(Path(root).glob("*.warc.gz"))
+
+
+def _sidecar(path: Path) -> Path:
+    return path.with_name(path.name + ".idx.jsonl")
+
+
+def parse_head(data: bytes) -> tuple[dict, list[str], bytes]:
+    """WARC headers, HTTP head lines and whatever follows them (the body, or part of it)."""
+    head, _, rest = data.partition(b"\r\n\r\n")
+    warc = dict(line.split(": ", 1) for line in head.decode("utf-8").split("\r\n")[1:] if ": " in line)
+    http_head, _, body = rest.partition(b"\r\n\r\n")
+    return warc, http_head.decode("latin-1").split("\r\n"), body
+
+
+def parse_record(data: bytes) -> dict:
+    warc, lines, _ = parse_head(data)
+    http = data.partition(b"\r\n\r\n")[2][:int(warc["Content-Length"])]
+    body = http.partition(b"\r\n\r\n")[2]
+    http_headers = dict(line.split(": ", 1) for line in lines[1:] if ": " in line)
+    return {
+        "url": warc["WARC-Target-URI"],
+        "final_url": warc.get("X-Final-URI", warc["WARC-Target-URI"]),
+        "status": int(lines[0].split()[1]),
+        "fetched_at": float(warc.get("X-Fetched-At", 0)),
+        "content_type": http_headers.get("Content-Type", ""),
+        "body": body,
+    }
+
+
+def decode(record: dict) -> str:
+    m = _CHARSET.search(record["content_type"])
+    try:
+        return record["body"].decode(m.group(1) if m else "utf-8", errors="replace")
+    except LookupError:
+        return record["body"].decode("utf-8", errors="replace")
+
+
+def _members(f, start: int = 0, keep: int | None = None):
+    """
+    Yield (offset, length, decompressed bytes) of each gzip member; a torn last one is
+    skipped. With keep, only about the first `keep` decompressed bytes are returned.
+    """
+    f.seek(start)
+    member_start = pos = start      # pos: file offset of the next byte fed to zlib
+    d, out, chunk = zlib.decompressobj(wbits=31), [], b""
+    while True:
+        if not chunk:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                return
+        data = d.decompress(chunk)
+        if keep is None or sum(map(len, out)) < keep:
+            out.append(data)
+        if d.eof:
+            rest = d.unused_data
+            end = pos + len(chunk) - len(rest)
+            yield member_start, end - member_start, b"".join(out)
+            member_start = pos = end
+            d, out, chunk = zlib.decompressobj(wbits=31), [], rest
+        else:
+            pos += len(chunk)
+            chunk = b""
+
+
+def iter_records(paths):
+    """Every record of every file, with its "path", "offset" and compressed "length"."""
+    for path in paths:
+        with open(path, "rb") as f:
+            for offset, length, data in _members(f):
+                record = parse_record(data)
+                record.update(path=str(path), offset=offset, length=length)
+                yield record
+
+
+def read_record(path: str, offset: int, length: int) -> dict:
+    """One record, reading only its own bytes (what the reextract workers do)."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = zlib.decompress(f.read(length), wbits=31)
+    record = parse_record(data)
+    record.update(path=str(path), offset=offset, length=length)
+    return record
+
+
+def scan_heads(path: Path, start: int = 0):
+    """{"url", "status", "fetched_at", "offset", "length"} per record from `start`, bodies unparsed."""
+    with open(path, "rb") as f:
+        for offset, length, data in _members(f, start, keep=HEAD_BYTES):
+            warc, lines, _ = parse_head(data)
+            yield {"url": warc["WARC-Target-URI"], "status": int(lines[0].split()[1]),
+                   "fetched_at": float(warc.get("X-Fetched-At", 0)), "offset": offset, "length": length}
+
+
+def file_heads(path: Path) -> list[dict]:
+    """A file's record heads from its sidecar; records past the sidecar's end are scanned."""
+    heads, end = [], 0
+    try:
+        with open(_sidecar(path), encoding="utf-8") as f:
+            for line in f:
+                try:
+                    head = json.loads(line)
+                except ValueError:
+                    break           # torn last line
+                heads.append(head)
+                end = head["offset"] + head["length"]
+    except OSError:
+        pass
+    if end < path.stat().st_size:   # no sidecar (older archive) or a crash before its line
+        heads.extend(scan_heads(path, end))
+    return heads
+
+
+def latest(root: str = ARCHIVE_DIR) -> dict[str, dict]:
+    """url -> {"path", "offset", "length", "fetched_at", "status"} of its newest successful copy."""
+    index = {}
+    for path in archive_files(root):
+        for head in file_heads(path):
+            if head["status"] >= 400:
+                continue
+            seen = index.get(head["url"])
+            if seen is None or head["fetched_at"] >= seen["fetched_at"]:
+                index[head["url"]] = {"path": str(path), "offset": head["offset"], "length": head["length"],
+                                      "fetched_at": head["fetched_at"], "status": head["status"]}
+    return index
+
+
+def import_cache(cache_dir: str, root: str = ARCHIVE_DIR) -> int:
+    """Archive every page of an http_cache directory (its fetched_at is kept)."""
+    archive, count = PageArchive(root), 0
+    for meta_path in sorted(Path(cache_dir).glob("*/*.json")):
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            body = meta_path.with_suffix(".body").read_bytes()
+        except (OSError, ValueError):
+            continue
+        content_type = f"text/html; charset={meta.get('encoding') or 'utf-8'}"
+        archive.write(meta["url"], meta.get("status") or 200, body, content_type,
+                      fetched_at=meta.get("fetched_at"), final_url=meta.get("final_url"))
+        count += 1
+    archive.close()
+    return count
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect or seed the raw page archive.")
+    ap.add_argument("command", choices=("stats", "import-cache"))
+    ap.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    ap.add_argument("--cache-dir", default=".http_cache", help="for import-cache")
+    args = ap.parse_args()
+
+    if args.command == "import-cache":
+        count = import_cache(args.cache_dir, args.archive_dir)
+        print(f"Archived {count} cached pages into {args.archive_dir}")
+        return
+
+    files = archive_files(args.archive_dir)
+    records = list(iter_records(files))
+    urls = {r["url"] for r in records}
+    size = sum(p.stat().st_size for p in files)
+    raw = sum(len(r["body"]) for r in records)
+    print(f"{len(files)} file(s), {len(records)} record(s), {len(urls)} distinct URL(s), "
+          f"{size / 1024:.0f} KiB on disk for {raw / 1024:.0f} KiB of pages")
+    if records:
+        first, last = min(r["fetched_at"] for r in records), max(r["fetched_at"] for r in records)
+        print(f"fetched between {_warc_date(first)} and {_warc_date(last)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
 # scrape_many.py
 # PingSkills: find blog post links -> fetch page -> write ChatGPT-ready blocks.
 
-import time, requests
+import argparse
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 from datetime import date
 
+import crawl_engine
+
 # === SITE SETTINGS ===
 INDEX_URL      = "https://www.pingskills.com/blog"
 POST_LINKS_CSS = "div.regular-blogs a[href^='/blog/']"  # anchors inside the blog grid
@@ -16,8 +18,15 @@ TITLE_CSS = "h1.text-center, h1"
 # Key change: target the content block(s) under the title, not the nav container
 BODY_CSS  = "div.container .mb-3, article, main"
 
+# 1) Remove boilerplate so we don't accidentally read nav/footer text
+JUNK_CSS = "nav, header, footer, script, style, form, aside"
+
+# Parse only the subtrees the extractors read
+LINKS_ONLY = crawl_engine.SubtreeStrainer(POST_LINKS_CSS)
+ARTICLE_ONLY = crawl_engine.SubtreeStrainer("div.container", "article", "main")
+
 # Politeness + limits
-PAUSE_SECONDS = 1.2
+PAUSE_SECONDS = 1.2               # min gap between requests to the same host (token bucket)
 MAX_LINKS = None                  # set None when you're happy with results
 OUTPUT_PATH = "batch_for_gpt.txt"
 
@@ -28,15 +37,6 @@ BLOCKED_DOMAINS = {
     "instagram.com", "www.instagram.com"
 }
 
-def get_soup(url: str) -> BeautifulSoup:
-    r = requests.get(url, headers={"User-Agent": "Mozilla/5.0"})
-    r.raise_for_status()
-    s = BeautifulSoup(r.text, "html.parser")
-    # 1) Remove boilerplate so we don't accidentally read nav/footer text
-    for junk in s.select("nav, header, footer, script, style, form, aside"):
-        junk.decompose()
-    return s
-
 def is_blocked(url: str) -> bool:
     host = urlparse(url).hostname or ""
     if host in BLOCKED_DOMAINS: return True
@@ -48,8 +48,11 @@ def is_allowed_domain(url: str, allowed_domain: str) -> bool:
     return host == allowed_domain
 
 def get_links(index_url: str, selector: str):
+    return parse_links(crawl_engine.fetch_text(index_url), index_url, selector)
+
+def parse_links(html: str, index_url: str, selector: str, parser: str | None = None, strain: bool = True):
     allowed_domain = urlparse(index_url).hostname
-    soup = get_soup(index_url)
+    soup = crawl_engine.make_soup(html, JUNK_CSS, LINKS_ONLY if strain else None, parser)
     raw = [a.get("href") for a in soup.select(selector) if a.get("href")]
 
     links, seen = [], set()
@@ -73,8 +76,17 @@ def get_links(index_url: str, selector: str):
     return links
 
 def extract_article(url: str):
-    s = get_soup(url)
+    return parse_article(crawl_engine.fetch_text(url), url)
+
+def parse_article(html: str, url: str, parser: str | None = None, strain: bool = True):
+    s = crawl_engine.make_soup(html, JUNK_CSS, ARTICLE_ONLY if strain else None, parser)
+    art = article_from_soup(s, url)
+    if strain and not (art["title"] and art["text"]):
+        # Title or body sits outside the usual containers; redo with the full tree
+        return parse_article(html, url, parser, strain=False)
+    return art
 
+def article_from_soup(s: BeautifulSoup, url: str):
     # Title
     t = s.select_one(TITLE_CSS)
     title = t.get_text(strip=True) if t else ""
@@ -96,37 +108,50 @@ def extract_article(url: str):
 
     return {"source_url": url, "title": title, "text": body_text}
 
-def main():
-    links = get_links(INDEX_URL, POST_LINKS_CSS)
-    print(f"Found {len(links)} candidate links. Writing {OUTPUT_PATH} ...")
+def main(concurrency: int = crawl_engine.DEFAULT_CONCURRENCY):
+    crawl_engine.set_host_rate(urlparse(INDEX_URL).hostname, 1 / PAUSE_SECONDS)
+    frontier = crawl_engine.open_frontier(OUTPUT_PATH)
+
+    if not frontier.discovered:
+        links = get_links(INDEX_URL, POST_LINKS_CSS)
+        frontier.add(links)
+        frontier.mark_discovered()
+        print(f"Found {len(links)} candidate links.")
+
+    todo = frontier.todo()
+    print(f"{len(todo)} to fetch. Writing {OUTPUT_PATH} ...")
 
     today = date.today().isoformat()
-    count_written = 0
-
-    with open(OUTPUT_PATH, "w", encoding="utf-8") as out:
-        for i, url in enumerate(links, 1):
-            try:
-                art = extract_article(url)
-                body = art["text"].strip()
-                if not body:
-                    print(f"{i:03d}/{len(links)}  SKIP (no body)  {url}")
-                    time.sleep(PAUSE_SECONDS)
-                    continue
-
-                out.write("===ARTICLE===\n")
-                out.write(f"source_url: {art['source_url']}\n")
-                out.write(f"title: {art['title'] or 'Unknown'}\n")
-                out.write(f"date_accessed: {today}\n")
-                out.write("TEXT:\n")
-                out.write(f"{body}\n\n")
-
-                print(f"{i:03d}/{len(links)}  OK  {art['title'][:70]}")
-                count_written += 1
-            except Exception as e:
-                print(f"{i:03d}/{len(links)}  ERROR  {url}  -> {e}")
-            time.sleep(PAUSE_SECONDS)
-
-    print(f"\nWrote {count_written} articles to {OUTPUT_PATH}")
+    count_written = count_changed = 0
+
+    with crawl_engine.open_store(OUTPUT_PATH) as store:
+        for i, (url, art, err) in enumerate(crawl_engine.crawl(todo, extract_article, concurrency), 1):
+            if err is not None:
+                frontier.mark_failed(url, repr(err))
+                print(f"{i:03d}/{len(todo)}  ERROR  {url}  -> {err}")
+                continue
+            body = art["text"].strip()
+            if not body:
+                frontier.mark_fetched(url)
+                print(f"{i:03d}/{len(todo)}  SKIP (no body)  {url}")
+                continue
+
+            with crawl_engine.timer("write"):
+                count_changed += crawl_engine.store_article(store, art["source_url"], art["title"], body, today)
+                store.flush()       # on disk before the frontier records it as done
+            frontier.mark_fetched(url)
+
+            print(f"{i:03d}/{len(todo)}  OK  {art['title'][:70]}")
+            count_written += 1
+
+    with crawl_engine.timer("write"):
+        total = crawl_engine.export_dump(store, OUTPUT_PATH)
+    print(f"\nStored {count_written} articles ({count_changed} new or changed); wrote {total} to {OUTPUT_PATH}")
+    print(frontier.summary())
+    frontier.close()
 
 if __name__ == "__main__":
-    main()
+    args = crawl_engine.add_cli_args(argparse.ArgumentParser()).parse_args()
+    crawl_engine.apply_cli_args(args)
+    main(args.concurrency)
+    crawl_engine.print_stats()
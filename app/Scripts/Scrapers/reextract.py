@@ -0,0 +1,174 @@
+# reextract.py
+# Rebuild the scrapers' output files from the page archive (page_archive.py), with no
+# network traffic: after a selector fix (BODY_CONTAINER_CSS, the PingSkills div.mb-3
+# fallback...) the whole corpus is regenerated on local cores instead of re-crawled.
+#
+# For each site the newest archived copy of every page is used:
+#   1. discovery runs in this process, exactly as in the scraper (index page ->
+#      article links; Tip of the Week: the archived ?page=N pages in order)
+#   2. the pages are parsed across a process pool with the scrapers' own parse_*
+#      functions -- the logic extract_article / collect_posts_from_index apply to
+#      what they fetch
+#   3. blocks are written in discovery order, in the scrapers' ===ARTICLE=== format,
+#      with date_accessed set to the day the page was archived
+#
+#   python3 reextract.py                                  # all sites into reextracted/
+#   python3 reextract.py --site pingskills --workers 8 --out-dir .
+
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import crawl_engine
+import page_archive
+import pingskills_scrape_many as pingskills
+import TableTennisCoaching_articles_scraper as ttc_articles
+import TableTennisCoaching_tip_of_the_day_scraper as ttc_tips
+
+# ========= CONFIG =========
+OUT_DIR = "reextracted"
+CHUNKSIZE = 4               # pages handed to a worker at a time
+# =========================
+
+
+def ttc_articles_discover(index: dict) -> list[str]:
+    html = _html(index, ttc_articles.INDEX_URL)
+    links = ttc_articles.parse_index(html, ttc_articles.INDEX_URL,
+                                     ttc_articles.START_HEADER, ttc_articles.STOP_HEADER)
+    return [u for u in links if ttc_articles.is_allowed_internal(u)]
+
+
+def ttc_articles_extract(html: str, url: str) -> list[dict]:
+    return [ttc_articles.parse_article(html, url)]
+
+
+def pingskills_discover(index: dict) -> list[str]:
+    html = _html(index, pingskills.INDEX_URL)
+    return pingskills.parse_links(html, pingskills.INDEX_URL, pingskills.POST_LINKS_CSS)
+
+
+def pingskills_extract(html: str, url: str) -> list[dict]:
+    return [pingskills.parse_article(html, url)]
+
+
+_TIP_PAGE = re.compile("^" + re.escape(ttc_tips.BASE_INDEX).replace(r"\{n\}", r"(\d+)") + "$")
+
+
+def ttc_tips_discover(index: dict) -> list[str]:
+    pages = sorted((int(m.group(1)), url) for url in index if (m := _TIP_PAGE.match(url)))
+    return [url for _, url in pages]
+
+
+def ttc_tips_extract(html: str, url: str) -> list[dict]:
+    return [{"source_url": p["node_url"], "title": p["title"], "text": p["body_text"]}
+            for p in ttc_tips.parse_index_page(html, url)]
+
+
+SITES = {
+    "ttc_articles": (ttc_articles_discover, ttc_articles_extract, ttc_articles.OUTPUT_PATH),
+    "ttc_tips": (ttc_tips_discover, ttc_tips_extract, ttc_tips.OUTPUT_PATH),
+    "pingskills": (pingskills_discover, pingskills_extract, pingskills.OUTPUT_PATH),
+}
+
+
+def _html(index: dict, url: str) -> str:
+    entry = index.get(url)
+    if entry is None:
+        raise LookupError(f"{url} is not in the archive")
+    return page_archive.decode(page_archive.read_record(entry["path"], entry["offset"], entry["length"]))
+
+
+def _init_worker(parser: str):
+    crawl_engine.configure_parser(parser)
+
+
+def _extract(task: tuple) -> tuple[str, list[dict] | None, str | None]:
+    """Worker: (site, url, path, offset, length) -> (url, articles, error)."""
+    site, url, path, offset, length = task
+    try:
+        html = page_archive.decode(page_archive.read_record(path, offset, length))
+        return url, SITES[site][1](html, url), None
+    except Exception as e:
+        return url, None, repr(e)
+
+
+def write_block(out, art: dict, day: str):
+    out.write("===ARTICLE===\n")
+    out.write(f"source_url: {art['source_url']}\n")
+    out.write(f"title: {art['title'] or 'Unknown'}\n")
+    out.write(f"date_accessed: {day}\n")
+    out.write("TEXT:\n")
+    out.write((art["text"] or "").strip() + "\n\n")
+
+
+def reextract_site(site: str, index: dict, pool, out_dir: Path) -> dict:
+    discover, _, output = SITES[site]
+    try:
+        urls = discover(index)
+    except LookupError as e:
+        print(f"[{site}] skipped: {e}")
+        return {"site": site, "skipped": str(e)}
+
+    missing = [u for u in urls if u not in index]
+    tasks = [(site, u, index[u]["path"], index[u]["offset"], index[u]["length"])
+             for u in urls if u in index]
+    written, empty, errors, seen = 0, 0, 0, set()
+    out_path = out_dir / output
+    with open(out_path, "w", encoding="utf-8") as out:
+        for url, arts, err in pool.map(_extract, tasks, chunksize=CHUNKSIZE):
+            if err is not None:
+                print(f"[{site}] ERROR {url} -> {err}")
+                errors += 1
+                continue
+            day = datetime.fromtimestamp(index[url]["fetched_at"], timezone.utc).date().isoformat()
+            for art in arts:
+                if art["source_url"] in seen:
+                    continue
+                seen.add(art["source_url"])
+                if not (art["text"] or "").strip():
+                    empty += 1
+                    continue
+                write_block(out, art, day)
+                written += 1
+
+    print(f"[{site}] {len(tasks)} page(s) -> {written} article(s) in {out_path}"
+          f" ({empty} without body, {errors} error(s), {len(missing)} not archived)")
+    for url in missing[:5]:
+        print(f"    not archived: {url}")
+    return {"site": site, "pages": len(tasks), "written": written, "empty": empty,
+            "errors": errors, "missing": len(missing)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Regenerate scraper outputs from the page archive.")
+    ap.add_argument("--site", choices=sorted(SITES), action="append",
+                    help="only this site (repeatable; default: all)")
+    ap.add_argument("--archive-dir", default=page_archive.ARCHIVE_DIR)
+    ap.add_argument("--out-dir", default=OUT_DIR)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--parser", choices=crawl_engine.PARSERS, default=crawl_engine.PARSER)
+    args = ap.parse_args()
+
+    started = time.time()
+    index = page_archive.latest(args.archive_dir)
+    if not index:
+        raise SystemExit(f"No archived pages under {args.archive_dir}; crawl first "
+                         f"(or `python3 page_archive.py import-cache`).")
+    print(f"{len(index)} archived URL(s), indexed in {time.time() - started:.1f}s")
+
+    crawl_engine.configure_parser(args.parser)
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=_init_worker,
+                             initargs=(crawl_engine.PARSER,)) as pool:
+        for site in args.site or SITES:
+            reextract_site(site, index, pool, out_dir)
+    print(f"Done in {time.time() - started:.1f}s with {args.workers} worker(s), no network.")
+
+
+if __name__ == "__main__":
+    main()
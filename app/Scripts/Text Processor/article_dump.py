@@ -0,0 +1,114 @@
+import json
+import mmap
+import re
+from pathlib import Path
+
+# Reader for the scrapers' "===ARTICLE===" dump format:
+#
+#   ===ARTICLE===
+#   source_url: ...
+#   title: ...
+#   date_accessed: ...
+#   TEXT:
+#   <body>
+#
+# Line endings vary (the TTC dump uses bare \r); they are normalised to \n the same
+# way Path.read_text() does, so records match what load_articles() used to produce.
+
+MARKER = b"===ARTICLE==="
+INDEX_SUFFIX = ".idx.json"
+
+_NEWLINES = re.compile(r"\r\n?")
+_HEADER_KEYS = ("source_url", "title", "date_accessed")
+
+
+def parse_block(block: bytes, index: int, offset: int) -> dict:
+    """One dump block (starting at the marker) -> article record."""
+    body = _NEWLINES.sub("\n", block[len(MARKER):].decode("utf-8", errors="replace")).strip()
+    record = {"index": index, "offset": offset, "length": len(block),
+              "source_url": "", "title": "", "date_accessed": "", "text": ""}
+
+    lines = body.split("\n")
+    for i, line in enumerate(lines):
+        if line.strip() == "TEXT:":
+            record["text"] = "\n".join(lines[i + 1:]).strip()
+            break
+        key, sep, value = line.partition(":")
+        if sep and key.strip() in _HEADER_KEYS:
+            record[key.strip()] = value.strip()
+    # Exactly what batch_process has always sent to /process, so cache keys don't move
+    record["raw"] = "===ARTICLE===\n" + body
+    return record
+
+
+def iter_articles(path: Path, select=None):
+    """
+    Yield article records from a memory-mapped dump, one at a time.
+    `select(index) -> bool` skips blocks without decoding them (sharding).
+    Indices are 1-based, matching the article-0001 style IDs.
+    """
+    with open(path, "rb") as f:
+        if Path(path).stat().st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            index = 0
+            pos = mm.find(MARKER)
+            while pos != -1:
+                nxt = mm.find(MARKER, pos + len(MARKER))
+                end = nxt if nxt != -1 else len(mm)
+                if mm[pos + len(MARKER):end].strip():
+                    index += 1
+                    if select is None or select(index):
+                        yield parse_block(mm[pos:end], index, pos)
+                pos = nxt
+
+
+# ---- sidecar index: O(1) access by article number or URL ----
+
+def index_path(path: Path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def build_index(path: Path) -> dict:
+    path = Path(path)
+    stat = path.stat()
+    entries = [[r["offset"], r["length"], r["source_url"]] for r in iter_articles(path)]
+    idx = {"size": stat.st_size, "mtime": stat.st_mtime, "articles": entries}
+    index_path(path).write_text(json.dumps(idx), encoding="utf-8")
+    return idx
+
+
+def load_index(path: Path) -> dict:
+    """Sidecar index, rebuilt when the dump's size or mtime changed."""
+    path = Path(path)
+    stat = path.stat()
+    try:
+        idx = json.loads(index_path(path).read_text(encoding="utf-8"))
+        if idx["size"] == stat.st_size and idx["mtime"] == stat.st_mtime:
+            return idx
+    except (OSError, ValueError, KeyError):
+        pass
+    return build_index(path)
+
+
+def read_article(path: Path, number: int, idx: dict | None = None) -> dict | None:
+    """Article by 1-based number, read with a single seek; None if there is no such number."""
+    idx = idx or load_index(path)
+    if not 1 <= number <= len(idx["articles"]):
+        return None
+    offset, length, _ = idx["articles"][number - 1]
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return parse_block(f.read(length), number, offset)
+
+
+def find_by_url(path: Path, url: str, idx: dict | None = None) -> dict | None:
+    idx = idx or load_index(path)
+    if "_by_url" not in idx:
+        # first URL wins, like the scrapers' seen-sets
+        idx["_by_url"] = {}
+        for number, (_, _, source_url) in enumerate(idx["articles"], start=1):
+            idx["_by_url"].setdefault(source_url, number)
+    number = idx["_by_url"].get(url)
+    return read_article(path, number, idx) if number else None
@@ -1,36 +1,297 @@
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+import argparse
+import json
+import random
+import sys
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from article_dump import iter_articles, load_index, read_article, find_by_url
+from chunking import tokens_for_bytes
+from dedup import find_duplicates, iter_dumps
 
 API_URL = "http://127.0.0.1:8000/process"
+# --bulk : tout passe par POST /process_batch, BULK_SIZE articles par connexion
+BATCH_URL = "http://127.0.0.1:8000/process_batch"
+BULK_SIZE = 500
 # Adapte le nom si ton fichier s'appelle autrement
 INPUT_PATH = Path("..") / "data" / "Scraped output.txt"
+# Un article_id terminé par ligne ; relancer le script saute ces articles
+CHECKPOINT_PATH = Path("batch_checkpoint.txt")
 
+CONCURRENCY = 4          # requêtes en vol en même temps
+RETRIES = 4              # tentatives supplémentaires par article
+BACKOFF_SECONDS = 2.0    # 2s, 4s, 8s, 16s (+ jitter)
+TIMEOUT = (10, 900)      # (connexion, lecture) : une génération peut être longue
 
-def load_articles() -> list[str]:
-    raw = INPUT_PATH.read_text(encoding="utf-8", errors="replace")
 
-    # on coupe sur le séparateur, puis on remet "===ARTICLE===\n" devant chaque bloc
-    chunks = [c.strip() for c in raw.split("===ARTICLE===") if c.strip()]
-    articles = ["===ARTICLE===\n" + c for c in chunks]
-    return articles
+def load_articles(path: Path = INPUT_PATH) -> list[str]:
+    # chaque bloc commence par "===ARTICLE===\n", comme attendu par /process
+    return [record["raw"] for record in iter_articles(path)]
 
-def main():
-    articles = load_articles()
-    print(f"Found {len(articles)} article(s) in {INPUT_PATH}")
-
-    for idx, article in enumerate(articles, start=1):
-        article_id = f"article-{idx:04d}"
-        payload = {
-            "article_id": article_id,
-            "text": article,
-        }
-        resp = requests.post(API_URL, json=payload)
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """'i/n' -> (i, n), i commence à 0."""
+    try:
+        i, n = (int(x) for x in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("--shard attend i/n, par ex. 0/4")
+    if n < 1 or not 0 <= i < n:
+        raise argparse.ArgumentTypeError(f"shard invalide: {value}")
+    return i, n
+
+
+def load_checkpoint(path: Path) -> set[str]:
+    if not path.exists():
+        return set()
+    return {line.strip() for line in path.read_text(encoding="utf-8").splitlines() if line.strip()}
+
+
+def make_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def post_with_retry(session: requests.Session, api_url: str, payload: dict, retries: int) -> dict:
+    """POST avec backoff exponentiel sur erreurs réseau, 429 et 5xx."""
+    for attempt in range(retries + 1):
         try:
-            data = resp.json()
-        except Exception:
-            data = {"raw_response": resp.text}
+            resp = session.post(api_url, json=payload, timeout=TIMEOUT)
+            if resp.status_code != 429 and resp.status_code < 500:
+                try:
+                    data = resp.json()
+                except Exception:
+                    data = {"raw_response": resp.text}
+                data["http_status"] = resp.status_code
+                return data
+            error = f"HTTP {resp.status_code}"
+        except requests.RequestException as e:
+            error = repr(e)
+
+        if attempt < retries:
+            delay = BACKOFF_SECONDS * (2 ** attempt) * (1 + random.random() * 0.25)
+            print(f"\n[{payload['article_id']}] {error}; nouvel essai dans {delay:.1f}s")
+            time.sleep(delay)
+    raise RuntimeError(f"{payload['article_id']}: abandon après {retries + 1} essais ({error})")
+
+
+def post_bulk(session: requests.Session, batch_url: str, payloads: list[dict], retries: int):
+    """
+    Envoie un lot en NDJSON sur une seule connexion et renvoie les résultats au fil de
+    l'eau (ordre de fin). Après une erreur réseau, seuls les articles sans réponse sont
+    renvoyés, avec le même backoff que post_with_retry.
+    """
+    todo = payloads
+    for attempt in range(retries + 1):
+        answered = set()
+        body = (json.dumps(p, ensure_ascii=False).encode("utf-8") + b"\n" for p in todo)
+        try:
+            # llm_output reste côté serveur (GET /outputs/{id}) : les réponses restent
+            # petites et le serveur n'attend jamais qu'on les lise pour lire la suite
+            with session.post(batch_url, data=body, params={"include_output": "false"},
+                              headers={"Content-Type": "application/x-ndjson"},
+                              stream=True, timeout=TIMEOUT) as resp:
+                if resp.status_code == 429 or resp.status_code >= 500:
+                    error = f"HTTP {resp.status_code}"
+                elif resp.status_code != 200:
+                    raise RuntimeError(f"{batch_url}: HTTP {resp.status_code} {resp.text[:200]}")
+                else:
+                    error = "flux interrompu"
+                    for line in resp.iter_lines():
+                        if not line:
+                            continue
+                        try:
+                            item = json.loads(line)
+                        except ValueError:
+                            # ligne tronquée : traitée comme une coupure du flux
+                            error = f"ligne illisible : {line[:80]!r}"
+                            break
+                        if item.get("status") == "end":
+                            continue
+                        if item.get("article_id") is not None:
+                            answered.add(item["article_id"])
+                        yield item
+        except requests.RequestException as e:
+            error = repr(e)
+
+        todo = [p for p in todo if p["article_id"] not in answered]
+        if not todo:
+            return
+        if attempt < retries:
+            delay = BACKOFF_SECONDS * (2 ** attempt) * (1 + random.random() * 0.25)
+            print(f"\n[bulk] {error}; {len(todo)} article(s) renvoyé(s) dans {delay:.1f}s")
+            time.sleep(delay)
+    for p in todo:
+        yield {"article_id": p["article_id"], "status": "error",
+               "error": f"abandon après {retries + 1} essais ({error})"}
+
+
+def progress_line(done: int, total: int, started: float) -> str:
+    elapsed = time.time() - started
+    rate = done / elapsed if elapsed > 0 else 0.0
+    eta = (total - done) / rate if rate > 0 else 0.0
+    return (f"\r{done}/{total}  {rate * 60:.1f} art/min  "
+            f"écoulé {elapsed / 60:.1f} min  ETA {eta / 60:.1f} min ")
+
+
+def select_records(args, idx: dict):
+    """(nombre à traiter, itérateur) -- les articles sont lus un par un, jamais tout le dump."""
+    if args.article is not None or args.url:
+        # accès direct via l'index à côté du dump
+        if args.article is not None:
+            record, selector = read_article(args.input, args.article, idx), f"--article {args.article}"
+        else:
+            record, selector = find_by_url(args.input, args.url, idx), f"--url {args.url}"
+        if record is None:
+            sys.exit(f"Aucun article pour {selector}")
+        return 1, iter([record])
+
+    shard_i, shard_n = args.shard
+    done_ids = load_checkpoint(args.checkpoint)
+    print(f"Shard {shard_i}/{shard_n}, {len(done_ids)} already in {args.checkpoint}")
+
+    dropped = {}
+    if args.dedup:
+        # doublons et pages hors sujet : autant de générations LLM économisées
+        # --dedup-against : les autres sources (ex. Tip of the Week pour le dump Articles),
+        # leurs articles déjà présents ne sont pas refaits ici
+        found = find_duplicates(iter_dumps([args.input]), reference=iter_dumps(args.dedup_against))
+        dropped = {n for _, n in found}
+        print(f"Dedup: skipping {len(dropped)} near-duplicate / non-coaching article(s)")
+
+    # Les IDs dépendent de la position dans le dump, donc identiques sur toutes les machines
+    def wanted(n: int) -> bool:
+        return ((n - 1) % shard_n == shard_i and f"article-{n:04d}" not in done_ids
+                and n not in dropped)
+
+    if args.order == "file":
+        total = sum(1 for n in range(1, len(idx["articles"]) + 1) if wanted(n))
+        if args.limit is not None:
+            total = min(total, args.limit)
+        return total, islice(iter_articles(args.input, select=wanted), total)
+
+    def key(n: int) -> tuple:
+        # la taille de chaque bloc est dans l'index : on estime les tokens sans rien lire.
+        # sjf : les plus courts d'abord, la latence moyenne baisse et les longs passent à la fin ;
+        # bins : tranches de taille (puissances de 2), ordre du dump dans chaque tranche
+        tokens = tokens_for_bytes(idx["articles"][n - 1][1])
+        return (tokens if args.order == "sjf" else tokens.bit_length(), n)
+
+    numbers = sorted((n for n in range(1, len(idx["articles"]) + 1) if wanted(n)), key=key)
+    numbers = numbers[:args.limit] if args.limit is not None else numbers
+    return len(numbers), (read_article(args.input, n, idx) for n in numbers)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--api-url", default=API_URL)
+    parser.add_argument("--input", type=Path, default=INPUT_PATH)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--retries", type=int, default=RETRIES)
+    parser.add_argument("--limit", type=int, default=None, help="au plus N articles pour cette exécution")
+    parser.add_argument("--shard", type=parse_shard, default=(0, 1),
+                        help="i/n : ne traiter que les articles dont le numéro %% n == i")
+    parser.add_argument("--checkpoint", type=Path, default=CHECKPOINT_PATH)
+    parser.add_argument("--article", type=int, default=None, help="un seul article, par numéro (1 = premier)")
+    parser.add_argument("--url", default=None, help="un seul article, par source_url")
+    parser.add_argument("--dedup", action="store_true",
+                        help="ne pas envoyer les quasi-doublons (MinHash/LSH, voir dedup.py)")
+    parser.add_argument("--dedup-against", type=Path, nargs="+", default=[], metavar="DUMP",
+                        help="avec --dedup : autres dumps déjà traités, leurs articles ne sont pas renvoyés")
+    parser.add_argument("--order", choices=("file", "sjf", "bins"), default="sjf",
+                        help="ordre d'envoi : dump, plus courts d'abord, ou par tranches de taille")
+    parser.add_argument("--bulk", action="store_true",
+                        help="un flux NDJSON par lot vers /process_batch au lieu d'un POST par article")
+    parser.add_argument("--batch-url", default=BATCH_URL)
+    parser.add_argument("--bulk-size", type=int, default=BULK_SIZE, help="articles par connexion en --bulk")
+    args = parser.parse_args()
+
+    idx = load_index(args.input)
+    print(f"Found {len(idx['articles'])} article(s) in {args.input}")
+    total, records = select_records(args, idx)
+    print(f"{total} to process")
+
+    started = time.time()
+    if args.bulk:
+        # la concurrence est celle du serveur (BATCH_WORKERS), --concurrency ne sert pas
+        ok, failed = run_bulk(args, records, total, started)
+        print(f"\nDone: {ok} ok, {failed} failed. Re-run to retry the failures.")
+        return
+
+    session = make_session(args.concurrency)
+    ok = failed = 0
+    # au plus 2 x concurrency articles en mémoire / en attente à la fois
+    window = max(1, args.concurrency) * 2
+
+    with args.checkpoint.open("a", encoding="utf-8") as ckpt, \
+            ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        pending = {}
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < window:
+                record = next(records, None)
+                if record is None:
+                    exhausted = True
+                    break
+                payload = {"article_id": f"article-{record['index']:04d}", "text": record["raw"]}
+                fut = pool.submit(post_with_retry, session, args.api_url, payload, args.retries)
+                pending[fut] = (record["index"], payload)
+            if not pending:
+                break
+
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                n, payload = pending.pop(fut)
+                try:
+                    data = fut.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"\n[{n}] ERROR {e}")
+                    continue
+
+                # raw / partial : pas de checkpoint, l'article sera refait (comme en --bulk)
+                if data.get("http_status") == 200 and data.get("status") == "ok":
+                    ok += 1
+                    ckpt.write(payload["article_id"] + "\n")
+                    ckpt.flush()
+                else:
+                    failed += 1
+                    print(f"\n[{n}] status={data.get('http_status')}, api_status={data.get('status')}")
+                sys.stdout.write(progress_line(ok + failed, total, started))
+                sys.stdout.flush()
+
+    print(f"\nDone: {ok} ok, {failed} failed. Re-run to retry the failures.")
+
+
+def run_bulk(args, records, total: int, started: float) -> tuple[int, int]:
+    session = make_session(1)
+    ok = failed = 0
+    with args.checkpoint.open("a", encoding="utf-8") as ckpt:
+        while True:
+            chunk = [{"article_id": f"article-{r['index']:04d}", "text": r["raw"]}
+                     for r in islice(records, max(1, args.bulk_size))]
+            if not chunk:
+                break
+            for item in post_bulk(session, args.batch_url, chunk, args.retries):
+                if item["status"] == "ok":
+                    ok += 1
+                    ckpt.write(item["article_id"] + "\n")
+                    ckpt.flush()
+                else:
+                    failed += 1
+                    print(f"\n[{item.get('article_id', 'line %s' % item.get('line'))}] "
+                          f"status={item['status']} {item.get('error', '')}")
+                sys.stdout.write(progress_line(ok + failed, total, started))
+                sys.stdout.flush()
+    return ok, failed
 
-        print(f"[{idx}] status={resp.status_code}, api_status={data.get('status')}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,112 @@
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import uuid
+from itertools import islice
+from pathlib import Path
+
+from article_dump import iter_articles
+from cleaning import clean_article
+from llm_backends import OllamaHTTPBackend
+
+# Prefill cost per article with and without reuse of the instruction prefix.
+#
+#   cold    the instructions are re-evaluated every time (a unique line in front of them
+#           defeats any prompt cache -- what every call costs when nothing is reused)
+#   inline  one concatenated prompt, instructions first (the old request shape)
+#   system  instructions as the system prompt, article as the prompt (PROMPT_MODE=system)
+#
+# Uses the server's own prompt_eval_count / prompt_eval_duration. Without --url an
+# in-process stub_llm_server is started with a per-token prefill delay. Run from the
+# repo root, like main.py:
+#
+#   python "app/Scripts/Text Processor/bench_prefill.py" --articles 20
+#   python "app/Scripts/Text Processor/bench_prefill.py" --url http://127.0.0.1:11434 --json prefill.json
+
+# ========= CONFIG =========
+PROMPT_PATH = Path("app/prompts/article_to_json_prompt.txt")
+DUMP_PATH = Path("data/TableTennisCoaching.com/Scraped output.txt")
+STUB_PREFILL_DELAY = 0.0005     # s per prompt token; ~2000 tok/s, a small model on a laptop GPU
+NUM_PREDICT = 8                 # only the prefill is measured; keep generation short
+MODES = ("cold", "inline", "system")
+# =========================
+
+
+def request_for(mode: str, prefix: str, suffix: str, article: str) -> tuple[str | None, str]:
+    if mode == "cold":
+        return None, f"[run {uuid.uuid4()}]\n{prefix}{article}{suffix}"
+    if mode == "inline":
+        return None, f"{prefix}{article}{suffix}"
+    return prefix, article + suffix
+
+
+def run_mode(backend: OllamaHTTPBackend, mode: str, prefix: str, suffix: str, articles: list[str]) -> dict:
+    # one untimed request so every mode starts with the same (warm) server state
+    system, prompt = request_for(mode, prefix, suffix, articles[0])
+    backend.generate_raw(prompt, system, num_predict=NUM_PREDICT)
+
+    evaluated, prefill_ms, wall_ms = [], [], []
+    for article in articles:
+        system, prompt = request_for(mode, prefix, suffix, article)
+        started = time.perf_counter()
+        reply = backend.generate_raw(prompt, system, num_predict=NUM_PREDICT)
+        wall_ms.append((time.perf_counter() - started) * 1000)
+        evaluated.append(reply.get("prompt_eval_count", 0))
+        prefill_ms.append(reply.get("prompt_eval_duration", 0) / 1e6)
+    return {
+        "mode": mode, "requests": len(articles),
+        "prompt_tokens_evaluated_mean": round(statistics.mean(evaluated), 1),
+        "prefill_ms_mean": round(statistics.mean(prefill_ms), 2),
+        "prefill_ms_p50": round(statistics.median(prefill_ms), 2),
+        "wall_ms_mean": round(statistics.mean(wall_ms), 2),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure prefill time with and without prompt prefix reuse.")
+    ap.add_argument("--url", help="Ollama server to measure (default: in-process stub)")
+    ap.add_argument("--model", default="llama3")
+    ap.add_argument("--articles", type=int, default=20)
+    ap.add_argument("--input", type=Path, default=DUMP_PATH)
+    ap.add_argument("--prompt", type=Path, default=PROMPT_PATH)
+    ap.add_argument("--modes", default=",".join(MODES))
+    ap.add_argument("--json", type=Path, help="also write the results here")
+    args = ap.parse_args()
+
+    template = args.prompt.read_text(encoding="utf-8")
+    prefix, sep, suffix = template.partition("{{ARTICLE_TEXT}}")
+    if not sep:
+        sys.exit(f"{{{{ARTICLE_TEXT}}}} missing from {args.prompt}")
+    articles = [clean_article(r["raw"])[0] for r in islice(iter_articles(args.input), args.articles)]
+    if not articles:
+        sys.exit(f"no articles in {args.input}")
+
+    server = None
+    url = args.url
+    if url is None:
+        import stub_llm_server
+        server = stub_llm_server.serve(port=0, prefill_delay=STUB_PREFILL_DELAY, slots=1)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    backend = OllamaHTTPBackend(base_url=url, model=args.model)
+    results = [run_mode(backend, mode, prefix, suffix, articles) for mode in args.modes.split(",")]
+    if server:
+        server.shutdown()
+
+    print(f"{len(articles)} article(s), prefix ~{len(prefix) // 4} tokens, server {url}"
+          f"{' (stub)' if server else ''}")
+    print(f"{'mode':8} {'evaluated':>10} {'prefill ms':>11} {'p50':>8} {'wall ms':>9}")
+    for r in results:
+        print(f"{r['mode']:8} {r['prompt_tokens_evaluated_mean']:>10} {r['prefill_ms_mean']:>11} "
+              f"{r['prefill_ms_p50']:>8} {r['wall_ms_mean']:>9}")
+    if args.json:
+        args.json.write_text(json.dumps({"url": url, "stub": bool(server), "results": results}, indent=2),
+                             encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
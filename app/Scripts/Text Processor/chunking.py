@@ -0,0 +1,237 @@
+import argparse
+import copy
+import math
+import os
+import re
+import sys
+from pathlib import Path
+
+from article_dump import iter_articles
+
+# Length-aware handling of articles, from short tips to long essays:
+#
+#   1. tokens    a cheap estimate (bytes / CHARS_PER_TOKEN, the same ratio llm_backends
+#                uses for cut streams) -- enough to order work and to spot articles
+#                that would not fit in the model's context
+#   2. split     an article over the budget is cut on paragraph, then sentence
+#                boundaries into chunks of at most max_tokens; each chunk repeats the
+#                last overlap_tokens of the previous one (less if the next piece would
+#                not fit) and the article header, so it is a complete ===ARTICLE=== of its own
+#   3. merge     the per-chunk extractions are folded into one object: one
+#                problemes_solutions bucket, entries with the same "probleme" label
+#                merged field by field, lists de-duplicated, terms kept once; chunks
+#                the model answered with raw_output are counted in "chunks_failed"
+#
+#   python chunking.py stats "../data/Scraped output.txt"
+
+# ========= CONFIG =========
+CHARS_PER_TOKEN = float(os.environ.get("CHARS_PER_TOKEN", "4"))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", "200"))
+MIN_CHUNK_TOKENS = 512      # a budget below this means the context is misconfigured
+# =========================
+
+NSS = "Not specified by source."
+
+_PARAGRAPH = re.compile(r"\n\s*\n")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+_NORM = re.compile(r"[^a-z0-9]+")
+
+
+def estimate_tokens(text: str) -> int:
+    return tokens_for_bytes(len(text.encode("utf-8")))
+
+
+def tokens_for_bytes(size: int) -> int:
+    return math.ceil(size / CHARS_PER_TOKEN)
+
+
+def article_budget(num_ctx: int, template: str, num_predict: int) -> int:
+    """Tokens left for the article once the instructions and the answer are reserved."""
+    return max(MIN_CHUNK_TOKENS, num_ctx - estimate_tokens(template) - num_predict)
+
+
+# ---- split ----
+
+def _pieces(body: str, max_tokens: int) -> list[tuple[str, str]]:
+    """(joiner, text) units no larger than max_tokens: paragraphs, else sentences, else cuts."""
+    pieces = []
+    for paragraph in _PARAGRAPH.split(body):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            pieces.append(("\n\n", paragraph))
+            continue
+        joiner, max_bytes = "\n\n", int(max_tokens * CHARS_PER_TOKEN)
+        for sentence in _SENTENCE.split(paragraph):
+            for cut in _cut(sentence, max_bytes):       # one huge "sentence": hard cuts
+                pieces.append((joiner, cut))
+                joiner = ""
+            joiner = " "
+    return pieces
+
+
+def _cut(text: str, max_bytes: int) -> list[str]:
+    """text in slices of at most max_bytes UTF-8 bytes, never inside a character."""
+    data, cuts, start = text.encode("utf-8"), [], 0
+    while start < len(data):
+        end = min(start + max_bytes, len(data))
+        while end < len(data) and data[end] & 0xC0 == 0x80:     # continuation byte
+            end -= 1
+        cuts.append(data[start:end].decode("utf-8"))
+        start = end
+    return cuts
+
+
+def _nbytes(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def split_text(body: str, max_tokens: int, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> list[str]:
+    # sizes are counted in bytes, joiners included, so a chunk's estimate_tokens() is
+    # exactly what is checked against max_tokens
+    max_bytes = int(max_tokens * CHARS_PER_TOKEN)
+    overlap_bytes = int(min(overlap_tokens, max_tokens // 4) * CHARS_PER_TOKEN)
+    chunks, current, size = [], [], 0
+    for joiner, text in _pieces(body, max_tokens):
+        if current and size + _nbytes(joiner + text) > max_bytes:
+            chunks.append(current)
+            # carry the tail of this chunk over, so a cue cut at the boundary is seen
+            # whole -- only as much as still leaves room for the next piece
+            room = min(overlap_bytes, max_bytes - _nbytes("\n\n" + text))
+            tail, size = [], 0
+            for piece in reversed(current):
+                piece_bytes = _nbytes(piece[0] + piece[1])
+                if size + piece_bytes <= room:
+                    tail.insert(0, piece)
+                    size += piece_bytes
+                    continue
+                kept = []       # too big to carry whole: its last sentences then
+                for sentence in reversed(_SENTENCE.split(piece[1])):
+                    if size + _nbytes(" " + sentence) > room:
+                        break
+                    kept.insert(0, sentence)
+                    size += _nbytes(" " + sentence)
+                if kept:
+                    tail.insert(0, (piece[0], " ".join(kept)))
+                break
+            current = tail
+        current.append((joiner, text))
+        size += _nbytes(joiner + text)
+    if current:
+        chunks.append(current)
+    return ["".join(j + t if i else t for i, (j, t) in enumerate(chunk)) for chunk in chunks]
+
+
+def split_article(article_text: str, max_tokens: int, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> list[str]:
+    """[article_text] when it fits, else one complete ===ARTICLE=== (same header) per chunk."""
+    if estimate_tokens(article_text) <= max_tokens:
+        return [article_text]
+    header, sep, body = article_text.partition("\nTEXT:\n")
+    if not sep:
+        header, body = "", article_text
+    budget = max(MIN_CHUNK_TOKENS // 2, max_tokens - estimate_tokens(header + sep))
+    return [header + sep + chunk for chunk in split_text(body, budget, overlap_tokens)]
+
+
+# ---- merge ----
+
+def _norm(value) -> str:
+    if isinstance(value, dict):
+        value = value.get("nom") or value.get("terme") or value.get("probleme") or repr(sorted(value.items()))
+    return _NORM.sub(" ", str(value).lower()).strip()
+
+
+def _merge_list(into: list, items: list) -> list:
+    seen = {_norm(v) for v in into}
+    for v in items:
+        key = _norm(v)
+        if key not in seen:
+            seen.add(key)
+            into.append(copy.deepcopy(v))
+    if len(into) > 1:           # a placeholder next to real content is noise
+        into[:] = [v for v in into if v != NSS] or into[:1]
+    return into
+
+
+def _merge_fields(into: dict, other: dict):
+    for key, value in other.items():
+        mine = into.get(key)
+        if isinstance(mine, list) and isinstance(value, list):
+            _merge_list(mine, value)
+        elif isinstance(mine, dict) and isinstance(value, dict):
+            _merge_fields(mine, value)
+        elif mine in (None, "", NSS) and value not in (None, ""):
+            into[key] = copy.deepcopy(value)
+
+
+def merge_extractions(parts: list[dict]) -> dict:
+    """
+    Per-chunk outputs (in article order) -> one extraction. Raw and off-schema parts
+    are left out and counted in "chunks_failed", so a partial merge is not taken for a
+    complete one.
+    """
+    good = [p for p in parts if isinstance(p, dict) and "raw_output" not in p and not p.get("schema_invalid")]
+    if not good:
+        invalid = [p for p in parts if isinstance(p, dict) and p.get("schema_invalid")]
+        if invalid:
+            return invalid[0]
+        return {"raw_output": "\n".join(str(p.get("raw_output", "")) for p in parts)}
+
+    merged = {k: copy.deepcopy(v) for k, v in good[0].items()
+              if k not in ("terminologie_extrait", "problemes_solutions")}
+    merged["terminologie_extrait"] = []
+    entries: dict[str, dict] = {}
+    bucket = None
+    for part in good:
+        _merge_list(merged["terminologie_extrait"], part.get("terminologie_extrait") or [])
+        buckets = part.get("problemes_solutions")
+        if not isinstance(buckets, dict):
+            continue
+        for slug, items in buckets.items():
+            bucket = bucket or slug         # the prompt asks for one bucket per article
+            for item in items if isinstance(items, list) else [items]:
+                if not isinstance(item, dict):
+                    continue
+                key = _norm(item.get("probleme", ""))
+                if key in entries:
+                    _merge_fields(entries[key], item)
+                else:
+                    entries[key] = copy.deepcopy(item)
+    slug = bucket or (merged.get("meta") or {}).get("article_slug") or "unknown"
+    merged["problemes_solutions"] = {slug: list(entries.values())}
+    if len(good) < len(parts):
+        merged["chunks_failed"] = len(parts) - len(good)
+    return merged
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Token estimates and chunk counts for a dump.")
+    ap.add_argument("command", choices=("stats",))
+    ap.add_argument("input", type=Path)
+    ap.add_argument("--budget", type=int, default=None,
+                    help="article tokens per prompt (default: from LLM_NUM_CTX / LLM_NUM_PREDICT)")
+    args = ap.parse_args()
+
+    budget = args.budget
+    if budget is None:
+        from llm_backends import NUM_CTX, NUM_PREDICT
+        template = Path("app/prompts/article_to_json_prompt.txt")
+        budget = article_budget(NUM_CTX, template.read_text(encoding="utf-8") if template.exists() else "",
+                                NUM_PREDICT)
+    sizes, chunked, chunks = [], 0, 0
+    for record in iter_articles(args.input):
+        sizes.append(estimate_tokens(record["raw"]))
+        n = len(split_article(record["raw"], budget))
+        chunked += n > 1
+        chunks += n
+    if not sizes:
+        sys.exit(f"No articles in {args.input}")
+    sizes.sort()
+    p50, p90 = (sizes[min(len(sizes) - 1, int(q * len(sizes)))] for q in (0.5, 0.9))
+    print(f"{len(sizes)} article(s), ~{sum(sizes)} tokens; p50 {p50}, p90 {p90}, max {sizes[-1]}")
+    print(f"budget {budget} tokens/prompt: {chunked} article(s) split, {chunks} prompt(s) in total")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+from article_dump import iter_articles
+
+# Deterministic clean-up of scraped article text before it is put into a prompt.
+#
+#   1. encoding   U+FFFD left where a curly quote / dash / nbsp could not be decoded
+#                 (don�t, " � ", end.�Next) and UTF-8-read-as-cp1252 sequences (â€™)
+#   2. reflow     get_text("\n") puts every link / <em> on its own line:
+#                 "the subconscious\nhabit\nof adjusting." -> one line again; list
+#                 items and headings keep their line breaks
+#   3. rules      whole-line site boilerplate, then short promo sentences (book / video /
+#                 newsletter plugs) -- the prompt tells the model to ignore these anyway
+#   4. whitespace collapse runs of spaces and blank lines
+#
+# Only the TEXT: body is touched; the header lines go through unchanged.
+
+# ========= CONFIG =========
+# Author's own products, promoted inline throughout TableTennisCoaching.com. A promo
+# sentence is dropped only when short -- longer ones usually carry coaching advice.
+BOOK_TITLES = [
+    "Table Tennis Tactics for Thinkers", "Table Tennis Tales & Techniques",
+    "Table Tennis Tales and Techniques", "Instructional Table Tennis",
+    "Professional Table Tennis Coaching Manual",
+]
+PROMO_MAX_WORDS = 8
+PROMO_SENTENCE = [
+    r"\bmy (?:new |latest )?(?:e-?)?(?:book|video|dvd|podcast|course|newsletter|blog|channel)s?\b",
+    r"\b(?:subscribe|newsletter|patreon|discount code|coupon|promo code|affiliate link)\b",
+    r"^\(?\s*here'?s (?:the |a )?(?:article|video|link|clip)\b",
+    r"\b(?:click here|buy (?:it|now|the book)|order (?:it|now)|available (?:on|at|from) amazon)\b",
+    r"\bfollow (?:me|us) on\b",
+    r"\b(?:book|hire|schedule) (?:a )?(?:private )?(?:lesson|coaching session)s? with (?:me|us)\b",
+    r"\bjoin (?:my|our) (?:academy|program|membership|course|mailing list)\b",
+]
+BOILERPLATE_LINE = [
+    r"share this( article| post)?:?", r"tweet", r"print( this)?", r"read more\.*", r"comments?\s*\(?\d*\)?",
+    r"leave a (comment|reply)", r"skip to (main )?content", r"back to top", r"(posted|filed) (in|under):?.*",
+    r"tags?:.*", r"log ?in( or register)?( to post comments)?", r"previous( post)?|next( post)?",
+]
+# =========================
+
+_MOJIBAKE = {
+    "â€™": "'", "â€˜": "'", "â€œ": '"', "â€\x9d": '"', "â€": '"', "â€“": "-", "â€”": "-",
+    "â€¦": "...", "Â\xa0": " ", "Ã©": "é", "Ã¨": "è",
+}
+_MOJIBAKE_RE = re.compile("|".join(re.escape(k) for k in sorted(_MOJIBAKE, key=len, reverse=True)))
+_REPLACEMENT = [
+    (re.compile(r"(?<=\w)�(?=(?:s|t|ll|re|ve|d|m)\b)"), "'"),  # don�t, opponent�s
+    (re.compile(r"(?<=\w)�(?=\w)"), " "),              # walk�into (non-breaking space)
+    (re.compile(r"\s�\s"), " - "),                     # a � b (dash)
+    (re.compile(r"(?<=[.!?,;:)])�(?=\S)"), " "),       # end.�Next (non-breaking space)
+    (re.compile(r"(?<=\s)�(?=\w)|^�(?=\w)", re.M), '"'),  # opening quote
+    (re.compile(r"(?<=\w)�"), "'"),                    # players� (closing quote / possessive)
+    (re.compile(r"�"), ""),
+]
+# line ends mid-sentence (lower-case word, comma...) or the next line is a fragment
+_OPEN_END = re.compile(r"[a-z0-9,;(\-–—'\"]$")
+_CONT_START = re.compile(r"^[a-z0-9.,;:!?)\]'\"]")
+# list items keep their own line: "1. item", "2) item", "• item", and "- item" / "* item"
+# after "Drills:" or another item (elsewhere a lone "-" line is a dash mid-sentence)
+_NUMBERED = re.compile(r"^(?:\d{1,2}[.)]|•)\s")
+_BULLET = re.compile(r"^[-*–—]\s")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+(?=[A-Z\"'(])")
+_PROMO = re.compile("|".join(PROMO_SENTENCE), re.I)
+_BOOK = re.compile("|".join(re.escape(t) for t in BOOK_TITLES), re.I)
+_BOILERPLATE = re.compile(r"^(?:" + "|".join(BOILERPLATE_LINE) + r")$", re.I)
+_SPACES = re.compile(r"[ \t\xa0]+")
+_TOKEN = re.compile(r"\w+|[^\w\s]|\n")
+
+
+def approx_tokens(text: str) -> int:
+    """Words, punctuation marks and line breaks: close enough to BPE counts for English prose."""
+    return len(_TOKEN.findall(text))
+
+
+def fix_encoding(text: str) -> str:
+    text = _MOJIBAKE_RE.sub(lambda m: _MOJIBAKE[m.group(0)], text)
+    for pattern, repl in _REPLACEMENT:
+        text = pattern.sub(repl, text)
+    return text
+
+
+def is_heading(line: str, first_in_paragraph: bool) -> bool:
+    """Short Title Case line opening a paragraph ("Forehand Loop", "How to Serve Short")."""
+    words = line.split()
+    return (first_in_paragraph and len(words) <= 8 and words[-1][0].isupper() and line[-1] not in ".,;!?"
+            and all(w[0].isupper() or len(w) <= 3 for w in words))
+
+
+def is_list_item(line: str, prev: str) -> bool:
+    if _NUMBERED.match(line):
+        return True
+    return bool(_BULLET.match(line)) and (prev.endswith(":") or bool(_BULLET.match(prev) or _NUMBERED.match(prev)))
+
+
+def reflow(text: str) -> str:
+    out = []
+    for line in text.split("\n"):
+        line = _SPACES.sub(" ", line).strip()
+        if not line:
+            out.append("")
+            continue
+        prev = out[-1] if out else ""
+        after_heading = line[0].isupper() and prev and is_heading(prev, len(out) < 2 or not out[-2])
+        if not prev or after_heading or is_list_item(line, prev):
+            out.append(line)
+        elif _OPEN_END.search(prev) or _CONT_START.match(line):
+            glue = "" if line[0] in ".,;:!?)]" else " "
+            out[-1] = prev + glue + line
+        else:
+            out.append(line)
+    return "\n".join(out)
+
+
+def is_promo(sentence: str) -> bool:
+    if len(sentence.split()) > PROMO_MAX_WORDS:
+        return False
+    return bool(_PROMO.search(sentence) or _BOOK.search(sentence))
+
+
+def drop_promo(text: str) -> str:
+    kept = []
+    for line in text.split("\n"):
+        if _BOILERPLATE.match(line.strip()):
+            continue
+        sentences = [s for s in _SENTENCE.split(line) if not is_promo(s)]
+        if line and not sentences:
+            continue
+        kept.append(" ".join(sentences))
+    return "\n".join(kept)
+
+
+def collapse(text: str) -> str:
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return re.sub(r" +([.,;:!?])", r"\1", text).strip()
+
+
+def clean_text(text: str) -> str:
+    return collapse(drop_promo(reflow(fix_encoding(text))))
+
+
+def clean_article(raw: str) -> tuple[str, dict]:
+    """
+    "===ARTICLE===\n<header>\nTEXT:\n<body>" -> same block with a cleaned body, plus
+    {"tokens_before", "tokens_after", "tokens_saved"} for the body.
+    """
+    head, sep, body = raw.partition("\nTEXT:\n")
+    if not sep:                 # no TEXT: marker, treat it all as body
+        head, body = "", raw
+    cleaned = clean_text(body)
+    before, after = approx_tokens(body), approx_tokens(cleaned)
+    out = f"{head}{sep}{cleaned}" if sep else cleaned
+    return out, {"tokens_before": before, "tokens_after": after, "tokens_saved": before - after}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Clean an ===ARTICLE=== dump and report the tokens saved.")
+    ap.add_argument("input", type=Path)
+    ap.add_argument("--output", type=Path, help="write the cleaned dump here")
+    ap.add_argument("--verbose", action="store_true", help="one line per article")
+    args = ap.parse_args()
+
+    started = time.time()
+    total_before = total_after = count = 0
+    out = args.output.open("w", encoding="utf-8") if args.output else None
+    for record in iter_articles(args.input):
+        cleaned, report = clean_article(record["raw"])
+        count += 1
+        total_before += report["tokens_before"]
+        total_after += report["tokens_after"]
+        if args.verbose:
+            print(f"#{record['index']:04d} {report['tokens_before']:6d} -> {report['tokens_after']:6d} "
+                  f"(-{report['tokens_saved']})  {record['source_url']}")
+        if out:
+            out.write(cleaned + "\n\n")
+    if out:
+        out.close()
+
+    saved = total_before - total_after
+    print(f"{count} article(s): {total_before} -> {total_after} tokens "
+          f"(-{saved}, {saved / max(total_before, 1):.1%}) in {time.time() - started:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from shard_store import ShardStore
+from extraction_schema import repair_json
+
+# Compiles the scattered per-article JSON outputs into one dataset file.
+#
+#   processed/dataset/dataset.jsonl.gz   one gzip member per source file, JSONL inside
+#   processed/dataset/dataset.index.json source file -> (mtime, size, sha1, member offset)
+#                                        plus source_url / slug -> record locations
+#
+# Concatenated gzip members are still a normal .gz file, so training code can stream
+# it with gzip.open(); the index lets a single record be read by seeking to its member.
+# Rebuilds copy the compressed member of every unchanged source file byte-for-byte and
+# only re-parse files whose mtime/size (then sha1) changed. main.py's output store
+# (shard_store.py) becomes one extra member with the latest output per article_id;
+# it is re-read on every build (a store is cheap to scan).
+
+# ========= CONFIG =========
+SOURCES = [Path("processed/JSON outputs/Blogs"), Path("processed")]
+STORE_DIR = Path(os.environ.get("OUTPUT_STORE", "processed/store"))
+DATASET_DIR = Path("processed/dataset")
+DATASET_PATH = DATASET_DIR / "dataset.jsonl.gz"
+INDEX_PATH = DATASET_DIR / "dataset.index.json"
+EXTENSIONS = {".json", ".txt"}      # matched case-insensitively (.JSON exists too)
+# =========================
+
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.I)
+_NEXT_OBJECT = re.compile(r'\n(?=\{\s*"meta"\s*:)')      # where the next extraction starts
+_QUOTED_LINE = re.compile(r'^(\s*(?:"[^"\n]*"\s*:\s*)?")(.*)("\s*,?\s*)$', re.M)
+
+
+def escape_inner_quotes(text: str) -> str:
+    """Escape the bare quotes inside a one-line string value: "the cue "smother" it"."""
+    return _QUOTED_LINE.sub(lambda m: m[1] + re.sub(r'(?<!\\)"', r'\\"', m[2]) + m[3], text)
+
+
+def match_closers(text: str) -> str:
+    """Turn each closing bracket that does not match the open one into the one that does."""
+    out, stack, in_string, escaped = [], [], False, False
+    for ch in text:
+        if in_string:
+            in_string = escaped or ch != '"'
+            escaped = not escaped and ch == "\\"
+        elif ch == '"':
+            in_string = True
+        elif ch in "[{":
+            stack.append("]" if ch == "[" else "}")
+        elif ch in "]}" and stack:
+            ch = stack.pop()
+        out.append(ch)
+    return "".join(out)
+
+
+def load_json_values(text: str) -> tuple[list, str | None]:
+    """
+    Every top-level JSON value in a file: strips ``` fences, tolerates raw newlines
+    inside strings (strict=False) and several objects back to back. A value that is not
+    valid JSON is cut where the next extraction ({"meta": ...) starts and handed to
+    repair_json, then retried with its bare inner quotes escaped and its mismatched
+    closing brackets fixed; stray closing brackets and commas between values are
+    skipped. Returns the values recovered and the errors of the pieces that stayed
+    unreadable (or None).
+    """
+    text = _FENCE.sub("", text.strip())
+    decoder = json.JSONDecoder(strict=False)
+    values, errors, pos = [], [], 0
+    while True:
+        while pos < len(text) and (text[pos].isspace() or text[pos] in ",]}"):
+            pos += 1
+        if pos >= len(text):
+            return values, "; ".join(errors) or None
+        try:
+            value, pos = decoder.raw_decode(text, pos)
+        except ValueError as e:
+            cut = _NEXT_OBJECT.search(text, pos + 1)
+            end = cut.end() if cut else len(text)
+            piece = text[pos:end]
+            for attempt in (piece, escape_inner_quotes(piece), match_closers(escape_inner_quotes(piece))):
+                value, _ = repair_json(attempt)
+                if value is not None:
+                    break
+            else:
+                errors.append(str(e))
+            pos = end
+        if value is not None:
+            values.append(value)
+
+
+def normalize(value, rel: str) -> list[dict]:
+    """One parsed JSON value -> dataset records."""
+    if isinstance(value, list):
+        return [r for v in value for r in normalize(v, rel)]
+    if not isinstance(value, dict) or "raw_output" in value or value.get("schema_invalid"):
+        return []       # unparsed or off-schema model output carries nothing usable
+    meta = value.get("meta") if isinstance(value.get("meta"), dict) else {}
+    if meta:
+        kind = "extraction"
+    elif "text" in value and "source_url" in value:
+        kind = "raw_article"
+    else:
+        kind = "other"
+    return [{
+        "kind": kind,
+        "source_url": (meta.get("source_url") or value.get("source_url") or "").strip() or None,
+        "slug": (meta.get("article_slug") or "").strip() or None,
+        "source_file": rel,
+        "data": value,
+    }]
+
+
+def source_files() -> list[tuple[Path, str]]:
+    files = {}
+    for root in SOURCES:
+        if not root.exists():
+            continue
+        # processed/ itself only holds main.py's flat {article_id}.json outputs
+        pattern = "*" if root == Path("processed") else "**/*"
+        for p in root.glob(pattern):
+            if p.is_file() and p.suffix.lower() in EXTENSIONS:
+                files[p.as_posix()] = p
+    return [(p, rel) for rel, p in sorted(files.items())]
+
+
+def sha1_of(path: Path) -> str:
+    return hashlib.sha1(path.read_bytes()).hexdigest()
+
+
+def load_index(index_path: Path = INDEX_PATH) -> dict:
+    try:
+        return json.loads(index_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"files": {}, "by_url": {}, "by_slug": {}}
+
+
+def build(dataset_path: Path = DATASET_PATH, index_path: Path = INDEX_PATH, verbose: bool = True) -> dict:
+    started = time.time()
+    old = load_index(index_path)
+    old_data = dataset_path.open("rb") if dataset_path.exists() else None
+    dataset_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = dataset_path.with_suffix(".tmp")
+
+    new_files, by_url, by_slug = {}, {}, {}
+    counts = {"reused": 0, "parsed": 0, "records": 0, "errors": 0}
+    unreadable = []
+
+    def place(out, rel: str, entry: dict, member: bytes):
+        if entry["error"]:
+            counts["errors"] += 1
+            unreadable.append((rel, entry["records"], entry["error"]))
+        entry["offset"], entry["length"] = out.tell(), len(member)
+        out.write(member)
+        new_files[rel] = entry
+        counts["records"] += entry["records"]
+        for line_no, (url, slug) in enumerate(entry["keys"]):
+            loc = [entry["offset"], entry["length"], line_no]
+            if url:
+                by_url.setdefault(url, []).append(loc)
+            if slug:
+                by_slug.setdefault(slug, []).append(loc)
+
+    def compile_records(records: list[dict], **entry) -> tuple[dict, bytes]:
+        lines = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        member = gzip.compress(lines.encode("utf-8")) if records else b""
+        return dict(entry, records=len(records), keys=[[r["source_url"], r["slug"]] for r in records]), member
+
+    with tmp_path.open("wb") as out:
+        for path, rel in source_files():
+            st = path.stat()
+            prev = old["files"].get(rel)
+            member, entry = None, None
+
+            if prev and old_data and not prev["error"]:     # files with errors are retried
+                same = (prev["mtime"] == st.st_mtime and prev["size"] == st.st_size)
+                if same or prev["sha1"] == sha1_of(path):
+                    old_data.seek(prev["offset"])
+                    member = old_data.read(prev["length"])
+                    entry = dict(prev, mtime=st.st_mtime, size=st.st_size)
+                    counts["reused"] += 1
+
+            if member is None:
+                values, error = load_json_values(path.read_text(encoding="utf-8", errors="replace"))
+                records = [r for v in values for r in normalize(v, rel)]
+                entry, member = compile_records(records, mtime=st.st_mtime, size=st.st_size,
+                                                sha1=sha1_of(path), error=error)
+                counts["parsed"] += 1
+
+            place(out, rel, entry, member)
+
+        if STORE_DIR.exists():
+            store = ShardStore(STORE_DIR, readonly=True)
+            rel = STORE_DIR.as_posix()
+            records = [r for article_id, value in store.iter_latest()
+                       for r in normalize(value, f"{rel}#{article_id}")]
+            entry, member = compile_records(records, mtime=0, size=0, sha1="", error=None)
+            counts["parsed"] += 1
+            place(out, rel, entry, member)
+
+    if old_data:
+        old_data.close()
+    os.replace(tmp_path, dataset_path)
+    index = {"files": new_files, "by_url": by_url, "by_slug": by_slug}
+    tmp_index = index_path.with_suffix(".tmp")
+    tmp_index.write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_index, index_path)
+
+    if verbose:
+        print(f"{counts['records']} records from {len(new_files)} files "
+              f"({counts['parsed']} parsed, {counts['reused']} reused, {counts['errors']} with errors) "
+              f"-> {dataset_path} ({dataset_path.stat().st_size / 1024:.0f} KiB) in {time.time() - started:.2f}s")
+        # reused files keep their error in the index, so they are listed on every build
+        for rel, records, error in unreadable:
+            print(f"[WARN] unreadable parts in {rel} ({records} record(s) kept): {error}")
+    return index
+
+
+# ---- loader ----
+
+def iter_records(dataset_path: Path = DATASET_PATH, kind: str | None = "extraction"):
+    """Stream records from the compiled file without touching the per-file tree."""
+    with gzip.open(dataset_path, "rt", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if kind is None or record["kind"] == kind:
+                yield record
+
+
+def _read_at(dataset_path: Path, loc: list) -> dict:
+    offset, length, line_no = loc
+    with open(dataset_path, "rb") as f:
+        f.seek(offset)
+        lines = gzip.decompress(f.read(length)).decode("utf-8").split("\n")
+    return json.loads(lines[line_no])
+
+
+def get_by_url(url: str, dataset_path: Path = DATASET_PATH, index: dict | None = None) -> list[dict]:
+    index = index or load_index()
+    return [_read_at(dataset_path, loc) for loc in index["by_url"].get(url, [])]
+
+
+def get_by_slug(slug: str, dataset_path: Path = DATASET_PATH, index: dict | None = None) -> list[dict]:
+    index = index or load_index()
+    return [_read_at(dataset_path, loc) for loc in index["by_slug"].get(slug, [])]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compile processed JSON outputs into one indexed dataset file.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("build")
+    get = sub.add_parser("get")
+    get.add_argument("--url")
+    get.add_argument("--slug")
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        build()
+    else:
+        records = get_by_url(args.url) if args.url else get_by_slug(args.slug or "")
+        if not records:
+            sys.exit("no match")
+        print(json.dumps([r["data"] for r in records], ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import argparse
+import random
+import re
+import sys
+import time
+import zlib
+from pathlib import Path
+
+from article_dump import iter_articles
+
+try:
+    import numpy as np
+except ImportError:         # pure-Python path gives the same signatures, just slower
+    np = None
+
+# Near-duplicate detection for ===ARTICLE=== dumps, run before anything reaches the LLM.
+#
+# Each article becomes a set of word 5-gram shingles -> a 128-value MinHash signature.
+# Signatures are cut into 32 bands of 4 rows; articles sharing any band bucket are
+# candidates (LSH), and only candidates are compared, so the cost grows with the number
+# of articles rather than the number of pairs. A candidate counts as a duplicate when
+# its estimated Jaccard similarity reaches THRESHOLD. The first article of a cluster
+# (dump order, then the order the dumps are given) is kept.
+#
+# Several dumps are deduplicated together: the same TTC article comes through both the
+# Articles and the Tip of the Week crawls. Articles are keyed by (dump, index). A
+# reference dump (already processed) is only matched against, never dropped from.
+#
+#   python dedup.py ttc_articles_for_gpt.txt ttc_tip_of_the_week_for_gpt.txt --verbose
+
+# ========= CONFIG =========
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+BANDS = 32                  # rows per band = NUM_PERM // BANDS; LSH threshold ~ (1/BANDS) ** (1/rows)
+THRESHOLD = 0.8
+SEED = 1234
+
+# Site pages that are not coaching content at all (e.g. ExpertTableTennis "Start Here" -> /about/)
+NON_COACHING_URL = re.compile(r"/(about|contact|privacy|terms|shop|cart|checkout|start-here)(/|$)", re.I)
+# =========================
+
+_PRIME = (1 << 31) - 1      # keeps a * x < 2**63 so the NumPy path can't overflow
+_rng = random.Random(SEED)
+_A = [_rng.randrange(1, _PRIME) for _ in range(NUM_PERM)]
+_B = [_rng.randrange(0, _PRIME) for _ in range(NUM_PERM)]
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def shingles(text: str, k: int = SHINGLE_WORDS) -> set[int]:
+    words = _WORD.findall(text.lower())
+    if len(words) < k:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + k]).encode("utf-8")) for i in range(len(words) - k + 1)}
+
+
+def minhash(sh: set[int]) -> tuple[int, ...]:
+    if not sh:
+        return tuple([_PRIME] * NUM_PERM)
+    if np is not None:
+        x = np.fromiter(sh, dtype=np.int64, count=len(sh))
+        a = np.asarray(_A, dtype=np.int64)[:, None]
+        b = np.asarray(_B, dtype=np.int64)[:, None]
+        return tuple(((a * x + b) % _PRIME).min(axis=1).tolist())
+    return tuple(min((a * x + b) % _PRIME for x in sh) for a, b in zip(_A, _B))
+
+
+def similarity(sig_a, sig_b) -> float:
+    """Fraction of agreeing MinHash values ~ Jaccard similarity of the shingle sets."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+class LSHIndex:
+    def __init__(self, bands: int = BANDS):
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.buckets: list[dict] = [{} for _ in range(bands)]
+        self.signatures: dict[tuple, tuple] = {}
+
+    def _keys(self, sig):
+        for band in range(self.bands):
+            yield band, sig[band * self.rows:(band + 1) * self.rows]
+
+    def query(self, sig) -> set[tuple]:
+        found = set()
+        for band, key in self._keys(sig):
+            found.update(self.buckets[band].get(key, ()))
+        return found
+
+    def add(self, key: tuple, sig):
+        self.signatures[key] = sig
+        for band, bucket_key in self._keys(sig):
+            self.buckets[band].setdefault(bucket_key, []).append(key)
+
+
+def iter_dumps(paths):
+    """Articles of several dumps, in order, each record tagged with its "dump" path."""
+    for path in paths:
+        for r in iter_articles(path):
+            r["dump"] = str(path)
+            yield r
+
+
+def record_key(r: dict) -> tuple:
+    return r.get("dump"), r["index"]
+
+
+def find_duplicates(records, threshold: float = THRESHOLD, reference=()) -> dict[tuple, dict]:
+    """
+    records: iterable of article records (article_dump format, see iter_dumps).
+    reference: records already kept elsewhere; matched against, never dropped.
+    Returns {(dump, index): {"reason", "kept", "similarity", "source_url"}} for every
+    article to drop; "kept" is the (dump, index) of the article it duplicates.
+    """
+    lsh = LSHIndex()
+    for r in reference:
+        lsh.add(record_key(r), minhash(shingles(r["text"])))
+    dropped = {}
+    for r in records:
+        idx = record_key(r)
+        if NON_COACHING_URL.search(r["source_url"] or ""):
+            dropped[idx] = {"reason": "non_coaching", "kept": None, "similarity": None,
+                            "source_url": r["source_url"]}
+            continue
+        sig = minhash(shingles(r["text"]))
+        best, best_sim = None, 0.0
+        for other in lsh.query(sig):
+            sim = similarity(sig, lsh.signatures[other])
+            if sim > best_sim:
+                best, best_sim = other, sim
+        if best is not None and best_sim >= threshold:
+            dropped[idx] = {"reason": "near_duplicate", "kept": best, "similarity": round(best_sim, 3),
+                            "source_url": r["source_url"]}
+        else:
+            lsh.add(idx, sig)   # only cluster representatives are indexed
+    return dropped
+
+
+def write_dump(records, out_path: Path):
+    with out_path.open("w", encoding="utf-8") as out:
+        for r in records:
+            out.write(r["raw"] + "\n\n")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Drop near-duplicate / non-coaching articles from dumps.")
+    ap.add_argument("inputs", type=Path, nargs="+", help="one or more dumps, deduplicated together")
+    ap.add_argument("--reference", type=Path, nargs="+", default=[],
+                    help="dumps already processed: their articles are matched against, never dropped")
+    ap.add_argument("--output", type=Path, help="write the kept articles here (===ARTICLE=== format)")
+    ap.add_argument("--threshold", type=float, default=THRESHOLD)
+    ap.add_argument("--verbose", action="store_true", help="list every dropped article")
+    args = ap.parse_args()
+
+    started = time.time()
+    dropped = find_duplicates(iter_dumps(args.inputs), args.threshold, iter_dumps(args.reference))
+    elapsed = time.time() - started
+
+    if args.verbose:
+        for (dump, idx), d in sorted(dropped.items()):
+            kept = f" ~ {d['kept'][0]}#{d['kept'][1]:04d} ({d['similarity']})" if d["kept"] else ""
+            print(f"{dump}#{idx:04d} {d['reason']}{kept}  {d['source_url']}")
+
+    if args.output:
+        write_dump((r for r in iter_dumps(args.inputs) if record_key(r) not in dropped), args.output)
+
+    near = sum(1 for d in dropped.values() if d["reason"] == "near_duplicate")
+    print(f"{len(dropped)} article(s) dropped ({near} near-duplicates, {len(dropped) - near} non-coaching) "
+          f"in {elapsed:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+import requests
+
+from search_index import LEVELS, documents_from_extraction, doc_text, flatten, level_mask, record_article_id, tokenize
+
+# Dense ("semantic") lookup over the same problemes_solutions documents as search_index.py.
+#
+#   vectors.f32   one contiguous float32 matrix, rows x dim, L2-normalised, memory-mapped
+#   levels.u8     level bit mask per row (same bits as search_index); REPLACED marks
+#                 rows whose article_id was processed again
+#   docs.jsonl    the stored entry per row
+#   meta.json     rows, dim, embedder -- written last, so a crash mid-append is ignored
+#
+# A query is one matrix-vector product over the mapped rows (in ROW_BATCH chunks) and
+# an argpartition for the top k. New /process results are appended to the three files;
+# the rows an article_id had before are flagged REPLACED and never returned again.
+# Embedders are pluggable: "hashing" (default, offline, no model) or "ollama" (a local
+# embedding model through Ollama's /api/embeddings).
+
+# ========= CONFIG =========
+DENSE_DIR = Path(os.environ.get("DENSE_DIR", "processed/dense_index"))
+EMBEDDER = os.environ.get("EMBEDDER", "hashing")
+HASH_DIM = 1024
+EMBED_MODEL = os.environ.get("EMBED_MODEL", "nomic-embed-text")
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://127.0.0.1:11434")
+ROW_BATCH = 65536           # rows scored per matmul; bounds the temporary score array
+# =========================
+
+REPLACED = 0x80             # levels.u8 bit, above the LEVELS bits
+
+
+class HashingEmbedder:
+    """
+    Signed feature hashing of words and word bigrams, log-scaled and L2-normalised.
+    Not semantic in the model sense, but it matches paraphrases that share vocabulary
+    ("my loop goes into the net" -> looping entries) and needs nothing but NumPy.
+    """
+
+    def __init__(self, dim: int = HASH_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str):
+        words = tokenize(text)
+        yield from words
+        yield from (f"{a} {b}" for a, b in zip(words, words[1:]))
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                out[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return _normalise(np.sign(out) * np.log1p(np.abs(out)))
+
+
+class OllamaEmbedder:
+    """A local embedding model served by Ollama (one request per text)."""
+
+    def __init__(self, model: str = EMBED_MODEL, base_url: str = OLLAMA_URL):
+        self.model = model
+        self.url = base_url.rstrip("/") + "/api/embeddings"
+        self.session = requests.Session()
+        self.name = f"ollama-{model}"
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        rows = []
+        for text in texts:
+            resp = self.session.post(self.url, json={"model": self.model, "prompt": text}, timeout=120)
+            resp.raise_for_status()
+            rows.append(resp.json()["embedding"])
+        return _normalise(np.asarray(rows, dtype=np.float32).reshape(len(texts), -1))
+
+
+EMBEDDERS = {"hashing": HashingEmbedder, "ollama": OllamaEmbedder}
+
+
+def get_embedder(kind: str = EMBEDDER):
+    if kind not in EMBEDDERS:
+        raise ValueError(f"Unknown EMBEDDER={kind!r} (expected one of {', '.join(EMBEDDERS)})")
+    return EMBEDDERS[kind]()
+
+
+def _normalise(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (m / norms).astype(np.float32, copy=False)
+
+
+class DenseIndex:
+    def __init__(self, root: Path = DENSE_DIR, embedder=None):
+        self.root = Path(root)
+        self.embedder = embedder or get_embedder()
+        self.lock = threading.RLock()
+        self._load()
+
+    def _load(self, offsets: list[int] | None = None, article_rows: dict | None = None):
+        meta_path = self.root / "meta.json"
+        self.meta = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else None
+        if self.meta and self.meta["embedder"] != self.embedder.name:
+            raise RuntimeError(f"{self.root} was built with {self.meta['embedder']}, not "
+                               f"{self.embedder.name}; rebuild it with `python dense_index.py build`")
+        rows = self.meta["rows"] if self.meta else 0
+        self.dim = self.meta["dim"] if self.meta else None
+        if rows:
+            self.vectors = np.memmap(self.root / "vectors.f32", dtype=np.float32, mode="r",
+                                     shape=(rows, self.dim))
+            self.levels = np.memmap(self.root / "levels.u8", dtype=np.uint8, mode="r", shape=(rows,))
+        else:
+            self.vectors, self.levels = None, None
+        # byte offset of every stored entry and the live rows of each article_id (appends
+        # pass the updated ones instead of rescanning)
+        self.offsets = offsets if offsets is not None else []
+        self.article_rows = article_rows if article_rows is not None else {}
+        if rows and offsets is None:
+            with (self.root / "docs.jsonl").open("rb") as f:
+                pos = 0
+                for line in f:
+                    row = len(self.offsets)
+                    if row == rows:
+                        break
+                    self.offsets.append(pos)
+                    pos += len(line)
+                    article_id = json.loads(line).get("article_id")
+                    if article_id and not self.levels[row] & REPLACED:
+                        self.article_rows.setdefault(article_id, []).append(row)
+
+    @property
+    def rows(self) -> int:
+        return self.meta["rows"] if self.meta else 0
+
+    def append(self, docs: list[dict], article_id: str | None = None) -> int:
+        """
+        Embed and append documents; they are searchable when this returns. With an
+        article_id, the rows it had before are flagged REPLACED once the new ones are in.
+        """
+        if not docs:
+            if article_id:
+                with self.lock:
+                    self._replace(article_id, self.article_rows.pop(article_id, []))
+            return 0
+        vecs = self.embedder.embed([doc_text(d) for d in docs])
+        masks = np.asarray([level_mask(d) for d in docs], dtype=np.uint8)
+        with self.lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            rows, dim = self.rows, vecs.shape[1]
+            if self.dim not in (None, dim):
+                raise RuntimeError(f"embedder returned dim {dim}, index has {self.dim}")
+            lines = b"".join(json.dumps(d, ensure_ascii=False).encode("utf-8") + b"\n" for d in docs)
+            docs_bytes = self.meta["docs_bytes"] if self.meta else 0
+            # truncate first: drops anything a crashed append left past the committed sizes
+            for name, size, data in (("vectors.f32", rows * dim * 4, vecs.astype(np.float32).tobytes()),
+                                     ("levels.u8", rows, masks.tobytes()),
+                                     ("docs.jsonl", docs_bytes, lines)):
+                with (self.root / name).open("ab") as f:
+                    f.truncate(size)
+                    f.write(data)
+            meta = {"rows": rows + len(docs), "dim": dim, "docs_bytes": docs_bytes + len(lines),
+                    "embedder": self.embedder.name, "updated_at": time.time()}
+            tmp = self.root / "meta.json.tmp"
+            tmp.write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(tmp, self.root / "meta.json")
+            offsets, pos = list(self.offsets), docs_bytes
+            for line in lines.splitlines(keepends=True):
+                offsets.append(pos)
+                pos += len(line)
+            article_rows = dict(self.article_rows)
+            old = article_rows.pop(article_id, []) if article_id else []
+            for row, d in enumerate(docs, start=rows):
+                if d.get("article_id"):
+                    article_rows.setdefault(d["article_id"], []).append(row)
+            self._load(offsets, article_rows)
+            self._replace(article_id, old)
+        return len(docs)
+
+    def _replace(self, article_id: str, rows: list[int]):
+        """Flag rows REPLACED in levels.u8 (the read-only map sees the write)."""
+        if not rows:
+            return
+        with (self.root / "levels.u8").open("r+b") as f:
+            for row in rows:
+                f.seek(row)
+                f.write(bytes([self.levels[row] | REPLACED]))
+
+    def add_extraction(self, data: dict, article_id: str | None = None) -> int:
+        return self.append(documents_from_extraction(data, article_id), article_id)
+
+    def _readline(self, row: int) -> bytes:
+        with (self.root / "docs.jsonl").open("rb") as f:
+            f.seek(self.offsets[row])
+            return f.readline()
+
+    def _doc(self, row: int) -> dict:
+        return json.loads(self._readline(row))
+
+    def search_many(self, queries: list[str], level: str | None = None, k: int = 10) -> list[list[dict]]:
+        """Top-k cosine matches for several queries with one matrix product per row batch."""
+        with self.lock:
+            vectors, levels, rows = self.vectors, self.levels, self.rows
+        if not rows or not queries:
+            return [[] for _ in queries]
+        q = self.embedder.embed(queries)                      # (n_queries, dim)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        bit = (1 << LEVELS.index(level)) if level else None
+
+        for start in range(0, rows, ROW_BATCH):
+            block = np.asarray(vectors[start:start + ROW_BATCH])
+            scores = q @ block.T                              # (n_queries, batch)
+            masks = np.asarray(levels[start:start + ROW_BATCH])
+            scores[:, (masks & REPLACED) != 0] = -np.inf
+            if bit is not None:
+                scores[:, (masks & bit) == 0] = -np.inf
+            # over-fetch so duplicates of the same entry can be dropped below
+            take = min(k * 3, scores.shape[1])
+            part = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, part, 1)], axis=1)
+            best_rows = np.concatenate([best_rows, part + start], axis=1)
+
+        results = []
+        for qi in range(len(queries)):
+            order = np.argsort(-best_scores[qi])
+            hits, seen = [], set()
+            for j in order:
+                score = float(best_scores[qi, j])
+                if score == -np.inf or len(hits) == k:
+                    break
+                doc = self._doc(int(best_rows[qi, j]))
+                ident = (doc["source_url"], flatten(doc["probleme"]))
+                if ident in seen:
+                    continue
+                seen.add(ident)
+                if level:
+                    doc = dict(doc, solutions_progressives={level: doc["solutions_progressives"].get(level, [])})
+                hits.append({"score": round(score, 4), **doc})
+            results.append(hits)
+        return results
+
+    def search(self, query: str, level: str | None = None, k: int = 10) -> list[dict]:
+        return self.search_many([query], level, k)[0]
+
+    def stats(self) -> dict:
+        return {"rows": self.rows, "dim": self.dim, "embedder": self.embedder.name}
+
+
+def build_from_dataset(root: Path = DENSE_DIR, embedder=None, batch: int = 256) -> DenseIndex:
+    """Full rebuild from the compiled dataset (dataset.py) -- recompiles it first."""
+    import dataset
+    dataset.build(verbose=False)
+    for name in ("meta.json", "vectors.f32", "levels.u8", "docs.jsonl"):
+        (root / name).unlink(missing_ok=True)
+    index = DenseIndex(root, embedder)
+    docs = [d for record in dataset.iter_records()
+            for d in documents_from_extraction(record["data"], record_article_id(record))]
+    for start in range(0, len(docs), batch):
+        index.append(docs[start:start + batch])
+    return index
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Dense (embedding) index over extracted problems / solutions.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("build")
+    q = sub.add_parser("query")
+    q.add_argument("q")
+    q.add_argument("--level", choices=LEVELS)
+    q.add_argument("-k", type=int, default=5)
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        started = time.time()
+        index = build_from_dataset()
+        print(f"{index.stats()} in {time.time() - started:.2f}s")
+        return
+
+    index = DenseIndex()
+    started = time.time()
+    hits = index.search(args.q, args.level, args.k)
+    for h in hits:
+        print(f"{h['score']:6.3f}  {h['probleme']}  <{h['source_url']}>")
+    print(f"{len(hits)} result(s) in {(time.time() - started) * 1000:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
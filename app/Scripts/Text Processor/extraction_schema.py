@@ -0,0 +1,430 @@
+import json
+import re
+import threading
+from typing import Annotated
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, ValidationError, ValidationInfo
+
+from article_dump import parse_block
+
+# The JSON shape asked for in app/prompts/article_to_json_prompt.txt, as Pydantic
+# models, plus everything needed to avoid regenerating a whole article when the answer
+# is not quite right:
+#
+#   1. repair_json   cheap syntax fixes: fences / preamble, // and /* */ comments copied
+#                    from the prompt, trailing commas, unclosed strings and brackets
+#   2. coercions     in the models: "x" where ["x"] is expected, a drill given as a bare
+#                    string, null for a list... recorded as fixes, not errors
+#   3. re-ask        whatever still fails validation is sent back alone (meta, one
+#                    term, one problem entry) with the article and the expected shape;
+#                    the small answer is spliced into the object
+#
+# STATS counts each path taken so the rates show up at GET /validation.
+
+NSS = "Not specified by source."
+
+
+def _fix(info: ValidationInfo, what: str):
+    if info.context is not None:
+        info.context.setdefault("fixes", []).append(what)
+
+
+def _as_text(value, info: ValidationInfo):
+    if value is None:
+        _fix(info, "null_text")
+        return NSS
+    if isinstance(value, list):
+        _fix(info, "list_as_text")
+        return "; ".join(_flat(v) for v in value)
+    if isinstance(value, (int, float, dict)):
+        _fix(info, "scalar_as_text")
+        return _flat(value)
+    return value
+
+
+def _flat(value) -> str:
+    if isinstance(value, dict):
+        return "; ".join(f"{k}: {_flat(v)}" for k, v in value.items())
+    if isinstance(value, list):
+        return "; ".join(_flat(v) for v in value)
+    return str(value)
+
+
+def _as_text_list(value, info: ValidationInfo):
+    if value is None:
+        _fix(info, "null_list")
+        return []
+    if isinstance(value, str):
+        _fix(info, "text_as_list")
+        return [value] if value.strip() else []
+    if isinstance(value, list) and any(not isinstance(v, str) for v in value):
+        _fix(info, "nested_list_items")
+        return [_flat(v) for v in value]
+    return value
+
+
+def _as_list(value, info: ValidationInfo):
+    if value is None:
+        _fix(info, "null_list")
+        return []
+    if isinstance(value, dict):
+        _fix(info, "object_as_list")
+        return [value]
+    return value
+
+
+Text = Annotated[str, BeforeValidator(_as_text)]
+TextList = Annotated[list[str], BeforeValidator(_as_text_list)]
+
+
+class _Model(BaseModel):
+    # unknown keys are kept: the schema is a floor, not a filter
+    model_config = ConfigDict(extra="allow")
+
+
+class Meta(_Model):
+    article_title: Text
+    article_slug: Text
+    source_url: Text
+    date_accessed: Text = "unknown"
+
+
+class Terme(_Model):
+    terme: Text
+    definition: Text
+    contexte: Text = NSS
+    source_url: Text = ""
+
+
+def _as_drill(value, info: ValidationInfo):
+    if isinstance(value, str):
+        _fix(info, "drill_as_text")
+        return {"nom": value, "description": value}
+    return value
+
+
+class Exercice(_Model):
+    nom: Text
+    description: Text = NSS
+    difficulte: Text = NSS
+    duree: Text = NSS
+    materiel: Text = NSS
+
+
+class Solutions(_Model):
+    debutant: TextList = []
+    intermediaire: TextList = []
+    avance: TextList = []
+
+
+class Probleme(_Model):
+    probleme: Text
+    diagnostic: Text = NSS
+    causes_communes: TextList = []
+    solutions_progressives: Solutions = Field(default_factory=Solutions)
+    exercices_complementaires: Annotated[list[Annotated[Exercice, BeforeValidator(_as_drill)]],
+                                         BeforeValidator(_as_list)] = []
+    metriques_progression: TextList = [NSS]
+    erreurs_a_eviter: TextList = []
+    source_url: Text = ""
+
+
+class Extraction(_Model):
+    meta: Meta
+    terminologie_extrait: Annotated[list[Terme], BeforeValidator(_as_list)] = []
+    problemes_solutions: dict[str, Annotated[list[Probleme], BeforeValidator(_as_list)]] = Field(min_length=1)
+
+
+# ---- 1. syntax repair ----
+
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.I)
+_CLOSER = {"{": "}", "[": "]"}
+
+
+def _scrub(text: str) -> tuple[str, list[str]]:
+    """
+    One pass outside strings: drop comments and trailing commas, then close whatever
+    is still open (truncated output). Inside strings nothing is touched.
+    """
+    out, stack, fixes = [], [], []
+    i, n, in_string, escaped = 0, len(text), False, False
+    while i < n:
+        ch = text[i]
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            i += 1
+            continue
+        if text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end == -1 else end
+            fixes.append("comment")
+            continue
+        if text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            fixes.append("comment")
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]":
+            # trailing comma: ",   }" -> "   }"
+            j = len(out) - 1
+            while j >= 0 and out[j].isspace():
+                j -= 1
+            if j >= 0 and out[j] == ",":
+                del out[j]
+                fixes.append("trailing_comma")
+            if stack:
+                stack.pop()
+        out.append(ch)
+        i += 1
+
+    if in_string:
+        out.append('"')
+        fixes.append("unclosed_string")
+    if stack:
+        # a dangling comma or "key": before the cut would still break the parse
+        tail = "".join(out).rstrip()
+        tail = re.sub(r',\s*$|,?\s*"[^"]*"\s*:\s*$', "", tail)
+        out = [tail] + [_CLOSER[c] for c in reversed(stack)]
+        fixes.append("unclosed_brackets")
+    return "".join(out), fixes
+
+
+def repair_json(text: str) -> tuple[object | None, list[str]]:
+    """Parsed value (or None) and the list of repairs it needed ([] = valid as sent)."""
+    decoder = json.JSONDecoder(strict=False)    # raw newlines inside strings are common
+    try:
+        return json.loads(text), []
+    except ValueError:
+        pass
+    fixes = []
+    stripped = _FENCE.sub("", text.strip())
+    start = min((p for p in (stripped.find("{"), stripped.find("[")) if p != -1), default=-1)
+    if start == -1:
+        return None, fixes
+    if stripped != text.strip() or start:
+        fixes.append("preamble")
+    stripped = stripped[start:]
+    try:
+        value, _ = decoder.raw_decode(stripped)
+        return value, fixes + ["strict_or_trailing_text"]
+    except ValueError:
+        pass
+    scrubbed, more = _scrub(stripped)
+    try:
+        value, _ = decoder.raw_decode(scrubbed)
+        return value, fixes + more
+    except ValueError:
+        return None, fixes + more
+
+
+# ---- 2/3. validation and re-asks ----
+
+def slugify(title: str) -> str:
+    """SLUG POLICY from the prompt (accents are dropped by the ASCII filter)."""
+    return re.sub(r"_+", "_", re.sub(r"[^a-z0-9]", "_", title.lower())).strip("_")[:48] or "unknown"
+
+
+def article_header(article_text: str) -> dict:
+    if not article_text.startswith("===ARTICLE==="):
+        article_text = "===ARTICLE===\n" + article_text
+    record = parse_block(article_text.encode("utf-8"), 0, 0)
+    return {"source_url": record["source_url"] or "unknown", "title": record["title"] or "Unknown",
+            "date_accessed": record["date_accessed"] or "unknown"}
+
+
+def fill_meta(obj: dict, header: dict, fixes: list):
+    """Meta fields come straight from the article header; no need to ask the model."""
+    meta = obj.get("meta")
+    if not isinstance(meta, dict):
+        meta = obj["meta"] = {}
+        fixes.append("meta_from_header")
+    defaults = {"article_title": header["title"], "source_url": header["source_url"],
+                "date_accessed": header["date_accessed"]}
+    for key, value in defaults.items():
+        if not isinstance(meta.get(key), str) or not meta[key].strip():
+            meta[key] = value
+            fixes.append(f"meta.{key}_from_header")
+    if not isinstance(meta.get("article_slug"), str) or not meta["article_slug"].strip():
+        meta["article_slug"] = slugify(meta["article_title"])
+        fixes.append("meta.article_slug_from_title")
+
+
+def _unit(loc: tuple) -> tuple:
+    """Smallest piece worth re-asking for an error: one term, one problem entry, or a section."""
+    if loc[0] == "problemes_solutions" and len(loc) >= 3:
+        return loc[:3]
+    if loc[0] == "terminologie_extrait" and len(loc) >= 2:
+        return loc[:2]
+    return loc[:1]
+
+
+def failing_paths(err: ValidationError) -> dict[tuple, list[str]]:
+    """{unit path: error messages}, in the order the errors were reported."""
+    paths = {}
+    for e in err.errors():
+        paths.setdefault(_unit(e["loc"]), []).append(f"{'.'.join(str(x) for x in e['loc'])}: {e['msg']}")
+    return paths
+
+
+def get_path(obj, path):
+    for part in path:
+        try:
+            obj = obj[part]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return obj
+
+
+def set_path(obj, path, value):
+    for part in path[:-1]:
+        obj = obj[part]
+    if isinstance(obj, list) and path[-1] == len(obj):
+        obj.append(value)
+    else:
+        obj[path[-1]] = value
+
+
+def drop_path(obj, path):
+    parent = get_path(obj, path[:-1])
+    if isinstance(parent, list) and isinstance(path[-1], int) and path[-1] < len(parent):
+        parent.pop(path[-1])
+    elif isinstance(parent, dict):
+        parent.pop(path[-1], None)
+
+
+_SHAPES = {
+    "meta": Meta, "terminologie_extrait": Terme, "problemes_solutions": Probleme,
+}
+
+
+def shape_for(path: tuple) -> str:
+    """JSON schema of the value expected at `path`, to paste into the re-ask prompt."""
+    if path == ("problemes_solutions",):
+        return '{"<problem_slug_snake_case>": [' + json.dumps(Probleme.model_json_schema()) + "]}"
+    if path == ("terminologie_extrait",):
+        return "[" + json.dumps(Terme.model_json_schema()) + "]"
+    return json.dumps(_SHAPES[path[0]].model_json_schema())
+
+
+def reask_prompt(article_text: str, path: tuple, value, errors: list[str]) -> str:
+    dotted = ".".join(str(p) for p in path)
+    return (
+        "You extracted table-tennis coaching content from the article below into JSON, "
+        f"but the value at `{dotted}` is invalid.\n"
+        f"REASK_PATH: {dotted}\n"
+        f"Problems: {'; '.join(errors)}\n"
+        f"Your previous value: {json.dumps(value, ensure_ascii=False)}\n"
+        f"Expected JSON schema for this value: {shape_for(path)}\n"
+        "Values in English. Use [] or \"Not specified by source.\" when the article does not say.\n"
+        "Reply with ONLY that JSON value: no explanations, no markdown.\n\n"
+        f"ARTICLE:\n{article_text}\n"
+    )
+
+
+class ValidationStats:
+    KEYS = ("outputs", "valid_as_sent", "syntax_repaired", "coerced", "reasked", "reask_calls",
+            "reask_fixed", "rescued", "items_dropped", "invalid", "unparseable")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = dict.fromkeys(self.KEYS, 0)
+        self.fixes: dict[str, int] = {}
+
+    def record(self, fixes: list[str] = (), **counts):
+        with self.lock:
+            for key, n in counts.items():
+                self.counts[key] += n
+            for f in fixes:
+                self.fixes[f] = self.fixes.get(f, 0) + 1
+
+    def summary(self) -> dict:
+        with self.lock:
+            c = dict(self.counts)
+            fixes = dict(sorted(self.fixes.items(), key=lambda kv: -kv[1]))
+        n = c["outputs"]
+        return {**c,
+                "repair_rate": round(c["syntax_repaired"] / n, 4) if n else None,
+                "reask_rate": round(c["reasked"] / n, 4) if n else None,
+                "reask_success_rate": round(c["reask_fixed"] / c["reasked"], 4) if c["reasked"] else None,
+                # broken or off-schema outputs that still ended up valid without a full rerun
+                "full_reruns_avoided": c["rescued"],
+                "fixes": fixes}
+
+
+STATS = ValidationStats()
+REASK_LIMIT = 6     # re-asks per article; past that a full rerun is cheaper anyway
+
+
+def validate_output(response: str, article_text: str, reask=None, max_reasks: int = REASK_LIMIT) -> dict:
+    """
+    Model response -> extraction dict, repaired and validated. `reask(prompt) -> str`
+    asks the model for one value. Terms / problem entries still invalid after the
+    re-asks are dropped; if the object is still off-schema it is returned as parsed,
+    flagged "schema_invalid" with its "validation_errors", so it is neither cached nor
+    taken for a good answer. Output that cannot be parsed at all stays {"raw_output": ...}.
+    """
+    obj, syntax = repair_json(response)
+    if isinstance(obj, list) and len(obj) == 1:
+        obj, syntax = obj[0], syntax + ["single_item_list"]
+    if not isinstance(obj, dict):
+        STATS.record(syntax, outputs=1, unparseable=1)
+        return {"raw_output": response}
+
+    fixes = []
+    fill_meta(obj, article_header(article_text), fixes)
+    # re-ask paths index into lists, so single objects where a list belongs are wrapped first
+    if isinstance(obj.get("terminologie_extrait"), dict):
+        obj["terminologie_extrait"] = [obj["terminologie_extrait"]]
+        fixes.append("object_as_list")
+    if isinstance(obj.get("problemes_solutions"), dict):
+        for slug, entries in obj["problemes_solutions"].items():
+            if isinstance(entries, dict):
+                obj["problemes_solutions"][slug] = [entries]
+                fixes.append("object_as_list")
+    calls, failing = 0, {}
+    for attempt in range(2):        # validate; re-ask what failed; validate again
+        context = {"fixes": []}
+        try:
+            model = Extraction.model_validate(obj, context=context)
+        except ValidationError as e:
+            failing = failing_paths(e)
+            if attempt or reask is None:
+                break
+            for path, messages in list(failing.items())[:max_reasks]:
+                calls += 1
+                answer, _ = repair_json(reask(reask_prompt(article_text, path, get_path(obj, path), messages)))
+                if answer is not None:
+                    set_path(obj, path, answer)
+            continue
+        fixes += context["fixes"]
+        STATS.record(syntax + fixes, outputs=1, syntax_repaired=bool(syntax), coerced=bool(fixes),
+                     reasked=bool(calls), reask_calls=calls, reask_fixed=bool(calls), rescued=bool(syntax or calls),
+                     valid_as_sent=not (syntax or fixes or calls))
+        return model.model_dump()
+
+    # still invalid: drop the broken terms / problem entries, keep the rest
+    dropped = [p for p in failing if len(p) > 1]
+    for path in sorted(dropped, reverse=True):
+        drop_path(obj, path)
+    context = {"fixes": []}
+    try:
+        model = Extraction.model_validate(obj, context=context)
+    except ValidationError as e:
+        STATS.record(syntax + fixes, outputs=1, syntax_repaired=bool(syntax), reasked=bool(calls),
+                     reask_calls=calls, items_dropped=len(dropped), invalid=1)
+        errors = [m for messages in failing_paths(e).values() for m in messages]
+        return {**obj, "schema_invalid": True, "validation_errors": errors}
+    fixes += context["fixes"]
+    STATS.record(syntax + fixes, outputs=1, syntax_repaired=bool(syntax), coerced=bool(fixes),
+                 reasked=bool(calls), reask_calls=calls, items_dropped=len(dropped), rescued=1)
+    return model.model_dump()
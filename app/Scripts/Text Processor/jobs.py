@@ -0,0 +1,201 @@
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from pathlib import Path
+
+# ========= CONFIG =========
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))          # articles generated at once
+JOB_QUEUE_MAX = int(os.environ.get("JOB_QUEUE_MAX", "1000"))   # POST /jobs answers 429 beyond this
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))  # finished jobs kept this long
+JOB_JOURNAL = Path(os.environ.get("JOB_JOURNAL", "processed/jobs_journal.jsonl"))
+# stop() waits this long for running jobs to finish (empty: as long as they take)
+JOB_STOP_TIMEOUT = float(os.environ["JOB_STOP_TIMEOUT"]) if os.environ.get("JOB_STOP_TIMEOUT") else None
+# sjf: lowest priority first (main.py passes the article's token estimate), so a short
+# tip is not stuck behind a long essay; fifo: submission order
+JOB_ORDER = os.environ.get("JOB_ORDER", "sjf")
+# =========================
+
+
+class QueueFull(Exception):
+    """Backpressure: the queue already holds JOB_QUEUE_MAX pending jobs."""
+
+
+class JobQueue:
+    """
+    Bounded queue of article jobs drained by a pool of worker threads, in submission
+    order or (order="sjf") smallest priority first, ties in submission order.
+
+    Every state change is appended to a JSONL journal. On start() the journal is
+    replayed: finished jobs stay queryable, and jobs that were queued or running when
+    the server stopped are queued again (with their payload, which the journal keeps
+    until the job finishes). Finished jobs older than `retention` seconds are dropped
+    when the journal is compacted at start().
+    """
+
+    def __init__(self, handler, workers: int = JOB_WORKERS, max_queued: int = JOB_QUEUE_MAX,
+                 journal_path: Path = JOB_JOURNAL, order: str = JOB_ORDER, retention: float = JOB_RETENTION):
+        self.handler = handler          # handler(payload: dict) -> dict (summary stored on the job)
+        self.workers = workers
+        self.order = order
+        self.max_queued = max_queued
+        self.retention = retention
+        # entries are (priority, seq, job_id); seq keeps FIFO among equal priorities. The
+        # queue itself is unbounded: max_queued is enforced in submit(), so restarts and
+        # stop() never block on it
+        self.queue = queue.PriorityQueue()
+        self.seq = itertools.count()
+        self.journal_path = Path(journal_path)
+        self.jobs: dict[str, dict] = {}
+        self.payloads: dict[str, dict] = {}
+        self.lock = threading.Lock()
+        self.threads: list[threading.Thread] = []
+        self.journal = None
+
+    # ---- journal ----
+    def _log(self, event: dict):
+        with self.lock:
+            if self.journal is None:        # not started yet, or already stopped
+                return
+            self.journal.write(json.dumps(event, ensure_ascii=False) + "\n")
+            self.journal.flush()
+
+    def _replay(self) -> list[str]:
+        """Rebuild job states from the journal; return IDs that still need to run."""
+        if not self.journal_path.exists():
+            return []
+        with self.journal_path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    ev = json.loads(line)
+                except ValueError:
+                    continue        # torn last line after a crash
+                job_id = ev.pop("id")
+                payload = ev.pop("payload", None)
+                if payload is not None:
+                    self.payloads[job_id] = payload
+                self.jobs.setdefault(job_id, {"id": job_id}).update(ev)
+                if ev.get("status") in ("done", "failed"):
+                    self.payloads.pop(job_id, None)
+                elif ev.get("status") == "rejected":      # never accepted: forget it
+                    self.jobs.pop(job_id, None)
+                    self.payloads.pop(job_id, None)
+        pending = [j for j, job in self.jobs.items() if job["status"] in ("queued", "running")]
+        for job_id in pending:
+            self.jobs[job_id].update(status="queued", started_at=None)
+        return pending
+
+    def _compact(self):
+        """Rewrite the journal as one line per job, minus jobs finished over `retention` ago."""
+        cutoff = time.time() - self.retention
+        for job_id in [j for j, job in self.jobs.items()
+                       if job.get("status") in ("done", "failed") and (job.get("finished_at") or 0) < cutoff]:
+            del self.jobs[job_id]
+        tmp = self.journal_path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for job_id, job in self.jobs.items():
+                ev = dict(job)
+                if job_id in self.payloads:
+                    ev["payload"] = self.payloads[job_id]
+                f.write(json.dumps(ev, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.journal_path)
+
+    # ---- lifecycle ----
+    def start(self):
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        pending = self._replay()
+        self._compact()
+        self.journal = self.journal_path.open("a", encoding="utf-8")
+        for job_id in pending:
+            # may go over max_queued: nothing that was accepted is dropped
+            self.queue.put(self._entry(job_id, self.jobs[job_id].get("priority", 0)))
+        if pending:
+            print(f"[jobs] resumed {len(pending)} unfinished job(s) from {self.journal_path}")
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def _entry(self, job_id: str, priority: float) -> tuple:
+        return (priority if self.order == "sjf" else 0, next(self.seq), job_id)
+
+    def stop(self):
+        for _ in self.threads:
+            self.queue.put_nowait((float("-inf"), next(self.seq), None))      # ahead of any job
+        deadline = None if JOB_STOP_TIMEOUT is None else time.monotonic() + JOB_STOP_TIMEOUT
+        for t in self.threads:
+            t.join(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+        running = any(t.is_alive() for t in self.threads)
+        self.threads.clear()
+        # a job still running after the timeout logs its done/failed line when it ends
+        if self.journal and not running:
+            self.journal.close()
+            self.journal = None
+
+    # ---- API ----
+    def submit(self, payload: dict, priority: float = 0) -> dict:
+        job_id = str(uuid.uuid4())
+        job = {"id": job_id, "status": "queued", "article_id": payload.get("article_id"),
+               "priority": priority, "submitted_at": time.time(), "started_at": None, "finished_at": None}
+        with self.lock:
+            self.jobs[job_id] = job
+            self.payloads[job_id] = payload
+        # journal first: a worker may log "running" / "done" as soon as the job is queued
+        self._log({**job, "payload": payload})
+        with self.lock:
+            full = self.queue.qsize() >= self.max_queued
+            if full:
+                del self.jobs[job_id]
+                del self.payloads[job_id]
+            else:
+                self.queue.put_nowait(self._entry(job_id, priority))
+        if full:
+            self._log({"id": job_id, "status": "rejected"})
+            raise QueueFull(f"{self.max_queued} jobs already queued")
+        return dict(job)
+
+    def get(self, job_id: str) -> dict | None:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return self._view(job) if job else None
+
+    def stats(self) -> dict:
+        with self.lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"workers": self.workers, "order": self.order, "queue_depth": self.queue.qsize(), "jobs": counts}
+
+    @staticmethod
+    def _view(job: dict) -> dict:
+        view = dict(job)
+        now = time.time()
+        if job.get("started_at"):
+            view["queue_seconds"] = round(job["started_at"] - job["submitted_at"], 3)
+            view["run_seconds"] = round((job.get("finished_at") or now) - job["started_at"], 3)
+        else:
+            view["queue_seconds"] = round(now - job["submitted_at"], 3)
+        return view
+
+    # ---- workers ----
+    def _set(self, job_id: str, **changes):
+        with self.lock:
+            self.jobs[job_id].update(changes)
+        self._log({"id": job_id, **changes})
+
+    def _worker(self):
+        while True:
+            _, _, job_id = self.queue.get()
+            if job_id is None:
+                return
+            self._set(job_id, status="running", started_at=time.time())
+            try:
+                summary = self.handler(self.payloads[job_id])
+                self._set(job_id, status="done", finished_at=time.time(), result=summary)
+            except Exception as e:
+                self._set(job_id, status="failed", finished_at=time.time(), error=repr(e))
+            with self.lock:
+                self.payloads.pop(job_id, None)
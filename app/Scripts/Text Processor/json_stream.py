@@ -0,0 +1,98 @@
+import json
+
+# Incremental scanner for the model's JSON answer, fed token by token.
+#
+# It only tracks what is needed to know where things end -- nesting depth, whether we
+# are inside a string, backslash escapes -- so each character is looked at once. Text
+# before the first "{" (a ```json fence, "Here is the JSON:") is skipped; once the
+# top-level object closes, `done` is set and the caller stops generation: anything the
+# model would say afterwards is chatter we would throw away anyway.
+#
+# Each top-level member ("meta": {...}, ...) is parsed as soon as its closing comma or
+# brace arrives, so a streaming client gets meta long before problemes_solutions.
+
+
+class JSONObjectStream:
+    def __init__(self):
+        self.buf = []           # characters of the object so far (from its opening brace)
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.started = False
+        self.done = False
+        self.member_start = 1   # offset in buf where the current top-level member begins
+        self.skipped = 0        # characters dropped before the object started
+
+    def feed(self, chunk: str) -> tuple[list[tuple[str, object]], str]:
+        """
+        Consume a chunk. Returns (members completed in this chunk as (key, value) pairs,
+        the part of the chunk past the end of the object -- non-empty only once done).
+        """
+        members = []
+        for i, ch in enumerate(chunk):
+            if self.done:
+                return members, chunk[i:]
+            if not self.started:
+                if ch != "{":
+                    self.skipped += 1
+                    continue
+                self.started = True
+            self.buf.append(ch)
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self._member(members, len(self.buf) - 1)
+                    self.done = True
+            elif ch == "," and self.depth == 1:
+                self._member(members, len(self.buf) - 1)
+                self.member_start = len(self.buf)
+        return members, ""
+
+    def _member(self, members: list, end: int):
+        text = "".join(self.buf[self.member_start:end]).strip()
+        if not text:
+            return
+        try:
+            # strict=False: the model puts raw newlines inside strings
+            members.extend(json.loads("{" + text + "}", strict=False).items())
+        except ValueError:
+            pass                # malformed member; the final parse decides what to keep
+
+    @property
+    def text(self) -> str:
+        return "".join(self.buf)
+
+
+def collect(tokens) -> tuple[str, bool]:
+    """
+    Drain a token iterator up to the end of the first JSON object, then close it (which
+    stops generation). Returns (text, stopped_early). If no object ever closes the whole
+    output is returned unchanged, exactly like the non-streaming path.
+    """
+    scanner = JSONObjectStream()
+    raw = []
+    try:
+        for token in tokens:
+            raw.append(token)
+            scanner.feed(token)
+            if scanner.done:
+                return scanner.text, True
+    finally:
+        close = getattr(tokens, "close", None)
+        if close:
+            close()
+    return "".join(raw), False
@@ -0,0 +1,426 @@
+import codecs
+import json
+import os
+import statistics
+import subprocess
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ========= CONFIG =========
+# "http" talks to a long-running `ollama serve` (or stub_llm_server.py) over one pooled
+# connection; "pool" spreads articles over several (LLM_BACKENDS); "cli" is the original
+# one-process-per-article `ollama run` path.
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "http")
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://127.0.0.1:11434")
+LLM_MODEL = os.environ.get("LLM_MODEL", "llama3")
+KEEP_ALIVE = os.environ.get("LLM_KEEP_ALIVE", "30m")    # how long the server keeps the model loaded
+TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "600"))
+
+# Generation options sent with every request (Ollama names)
+NUM_PREDICT = int(os.environ.get("LLM_NUM_PREDICT", "4096"))
+# Context window asked for explicitly (Ollama's default is much smaller); main.py splits
+# articles that would not fit next to the instructions and NUM_PREDICT
+NUM_CTX = int(os.environ.get("LLM_NUM_CTX", "8192"))
+TEMPERATURE = float(os.environ.get("LLM_TEMPERATURE", "0"))
+JSON_FORMAT = os.environ.get("LLM_JSON_FORMAT", "1") == "1"  # constrain output to valid JSON
+
+# LLM_BACKEND=pool: one Ollama instance per URL, each article to the least busy one.
+# Throughput only scales if JOB_WORKERS / client concurrency >= number of instances.
+LLM_BACKENDS = [u.strip() for u in os.environ.get("LLM_BACKENDS", "").split(",") if u.strip()]
+HEALTH_INTERVAL = 10.0      # seconds between /api/tags probes
+EJECT_AFTER = 3             # consecutive failures before an instance is taken out
+EJECT_SECONDS = 30.0        # how long it stays out before it is probed again
+# =========================
+
+
+class BackendUnavailable(Exception):
+    """The model server could not be reached."""
+
+
+# Called as hook(prompt_tokens, output_tokens) after every HTTP generation; main.py
+# registers its /metrics counters here. Ollama only reports prompt_eval_count in its
+# final chunk, so for a stream cut before it the prompt is estimated (~4 chars/token,
+# the system prefix left out: the server has it cached) and output_tokens is the
+# number of chunks received.
+USAGE_HOOKS = []
+
+
+def _report_usage(prompt_tokens: int | None, output_tokens: int | None):
+    for hook in USAGE_HOOKS:
+        hook(prompt_tokens, output_tokens)
+
+
+class OllamaCLIBackend:
+    """Fallback: one `ollama run` process per prompt; no options, no keep-alive."""
+
+    name = "cli"
+
+    def __init__(self, model: str = LLM_MODEL):
+        self.model = model
+
+    def generate(self, prompt: str, system: str | None = None, **options) -> str:
+        # `ollama run` has no system field: the instructions just go in front again
+        prompt = system + prompt if system else prompt
+        result = subprocess.run(
+            ["ollama", "run", self.model],
+            input=prompt,
+            text=True,
+            capture_output=True
+        )
+        # Optional: log stderr if something goes wrong
+        if result.stderr:
+            print("=== OLLAMA STDERR ===")
+            print(result.stderr)
+            print("=====================")
+        return result.stdout
+
+    def stream(self, prompt: str, system: str | None = None, **options):
+        """Yield stdout as it is produced; closing the generator kills the process."""
+        prompt = system + prompt if system else prompt
+        proc = subprocess.Popen(["ollama", "run", self.model], stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        try:
+            proc.stdin.write(prompt.encode("utf-8"))
+            proc.stdin.close()
+            while chunk := proc.stdout.read1(256):
+                text = decoder.decode(chunk)
+                if text:
+                    yield text
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+
+
+class OllamaHTTPBackend:
+    """
+    Ollama's /api/generate over a pooled keep-alive Session. The model stays resident
+    for KEEP_ALIVE between calls, so only the first article pays the load time.
+    """
+
+    name = "http"
+
+    def __init__(self, base_url: str = OLLAMA_URL, model: str = LLM_MODEL,
+                 keep_alive: str = KEEP_ALIVE, timeout: float = TIMEOUT,
+                 options: dict | None = None, json_format: bool = JSON_FORMAT):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.json_format = json_format
+        self.options = {"num_predict": NUM_PREDICT, "num_ctx": NUM_CTX, "temperature": TEMPERATURE}
+        self.options.update(options or {})
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=32)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, path: str, body: dict) -> dict:
+        try:
+            r = self.session.post(f"{self.base_url}{path}", json=body, timeout=self.timeout)
+        except requests.ConnectionError as e:
+            raise BackendUnavailable(f"{self.base_url}: {e}") from e
+        r.raise_for_status()
+        return r.json()
+
+    def _body(self, prompt: str, stream: bool, options: dict, system: str | None = None) -> dict:
+        body = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": {**self.options, **options},
+        }
+        if system:
+            # Rendered ahead of the prompt; identical bytes on every call, so the server
+            # keeps its evaluated KV cache and only prefills the article
+            body["system"] = system
+        if self.json_format:
+            body["format"] = "json"
+        return body
+
+    def generate_raw(self, prompt: str, system: str | None = None, **options) -> dict:
+        """The whole /api/generate reply, timings and token counts included."""
+        reply = self._post("/api/generate", self._body(prompt, False, options, system))
+        _report_usage(reply.get("prompt_eval_count"), reply.get("eval_count"))
+        return reply
+
+    def generate(self, prompt: str, system: str | None = None, **options) -> str:
+        return self.generate_raw(prompt, system, **options).get("response", "")
+
+    def prime(self, system: str):
+        """Evaluate the shared prefix once, so the first article does not pay for it."""
+        self.generate_raw(".", system, num_predict=1)
+
+    def stream(self, prompt: str, system: str | None = None, **options):
+        """
+        Yield response tokens as Ollama produces them (NDJSON lines). Closing the
+        generator closes the connection, and Ollama stops generating for that request.
+        """
+        try:
+            r = self.session.post(f"{self.base_url}/api/generate", json=self._body(prompt, True, options, system),
+                                  timeout=self.timeout, stream=True)
+        except requests.ConnectionError as e:
+            raise BackendUnavailable(f"{self.base_url}: {e}") from e
+        received, final = 0, None
+        try:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("done"):
+                    final = chunk
+                if chunk.get("response"):
+                    received += 1
+                    yield chunk["response"]
+                if final:
+                    break
+        finally:
+            r.close()
+            if final:
+                _report_usage(final.get("prompt_eval_count"), final.get("eval_count", received))
+            elif received:
+                _report_usage(len(prompt) // 4, received)
+
+    def warm(self):
+        """Load the model without generating anything (empty prompt)."""
+        self._post("/api/generate", {"model": self.model, "prompt": "", "keep_alive": self.keep_alive})
+
+    def healthy(self) -> bool:
+        try:
+            return self.session.get(f"{self.base_url}/api/tags", timeout=5).ok
+        except requests.RequestException:
+            return False
+
+
+class FallbackBackend:
+    """Try the HTTP server first; drop to the subprocess path if it is not running."""
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name}+{fallback.name}"
+        self.model = primary.model
+
+    def generate(self, prompt: str, system: str | None = None, **options) -> str:
+        try:
+            return self.primary.generate(prompt, system, **options)
+        except BackendUnavailable as e:
+            print(f"[WARN] {e}; falling back to `ollama run`")
+            return self.fallback.generate(prompt, system, **options)
+
+    def prime(self, system: str):
+        self.primary.prime(system)
+
+    def stream(self, prompt: str, system: str | None = None, **options):
+        tokens = self.primary.stream(prompt, system, **options)
+        try:
+            first = next(tokens, None)      # the connection is only opened on first next()
+        except BackendUnavailable as e:
+            print(f"[WARN] {e}; falling back to `ollama run`")
+            tokens, first = self.fallback.stream(prompt, system, **options), None
+        try:
+            if first is not None:
+                yield first
+            yield from tokens
+        finally:
+            tokens.close()
+
+
+class _Member:
+    def __init__(self, backend):
+        self.backend = backend
+        self.inflight = 0
+        self.requests = 0
+        self.errors = 0
+        self.failures = 0           # consecutive
+        self.ejected_until = 0.0
+        self.latencies = deque(maxlen=200)
+        self.last_error = None
+
+    def available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+
+class BackendPool:
+    """
+    Several model servers behind one generate()/stream(). Each call goes to the
+    available instance with the fewest in-flight requests (then the lowest recent
+    latency). A failed call is retried on another instance -- generation has no side
+    effects, so that is always safe. EJECT_AFTER consecutive failures take an instance
+    out for EJECT_SECONDS; the health thread puts it back once /api/tags answers.
+    """
+
+    name = "pool"
+
+    def __init__(self, backends: list, health_interval: float = HEALTH_INTERVAL):
+        if not backends:
+            raise ValueError("BackendPool needs at least one backend")
+        self.members = [_Member(b) for b in backends]
+        self.model = backends[0].model
+        self.lock = threading.Lock()
+        self.health_interval = health_interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---- dispatch ----
+    def _acquire(self, tried: set) -> _Member | None:
+        now = time.time()
+        with self.lock:
+            candidates = [m for m in self.members if id(m) not in tried]
+            if not candidates:
+                return None
+            up = [m for m in candidates if m.available(now)]
+            # everything ejected: fail open on whichever comes back first
+            pool = up or sorted(candidates, key=lambda m: m.ejected_until)[:1]
+            member = min(pool, key=lambda m: (m.inflight, _mean(m.latencies)))
+            member.inflight += 1
+            member.requests += 1
+            return member
+
+    def _release(self, member: _Member, started: float, error: Exception | None, finished: bool = True):
+        """finished=False: the caller gave up on the call, which says nothing about the instance."""
+        with self.lock:
+            member.inflight -= 1
+            if error is None and not finished:
+                return
+            if error is None:
+                member.failures = 0
+                member.latencies.append(time.time() - started)
+                return
+            member.errors += 1
+            member.failures += 1
+            member.last_error = repr(error)
+            if member.failures >= EJECT_AFTER:
+                member.ejected_until = time.time() + EJECT_SECONDS
+
+    def _call(self, fn):
+        tried, last = set(), None
+        while (member := self._acquire(tried)) is not None:
+            tried.add(id(member))
+            started = time.time()
+            try:
+                result = fn(member.backend)
+            except (BackendUnavailable, requests.RequestException) as e:
+                self._release(member, started, e)
+                last = e
+                continue
+            self._release(member, started, None)
+            return result
+        raise BackendUnavailable(f"all {len(self.members)} backends failed; last error: {last!r}")
+
+    def generate(self, prompt: str, system: str | None = None, **options) -> str:
+        return self._call(lambda b: b.generate(prompt, system, **options))
+
+    def generate_raw(self, prompt: str, system: str | None = None, **options) -> dict:
+        return self._call(lambda b: b.generate_raw(prompt, system, **options))
+
+    def stream(self, prompt: str, system: str | None = None, **options):
+        """Retried on another instance only until the first token has been passed on."""
+        tried, last = set(), None
+        while (member := self._acquire(tried)) is not None:
+            tried.add(id(member))
+            started = time.time()
+            tokens = member.backend.stream(prompt, system, **options)
+            try:
+                first = next(tokens, None)
+            except (BackendUnavailable, requests.RequestException) as e:
+                self._release(member, started, e)
+                last = e
+                continue
+            error, finished = None, False
+            try:
+                if first is not None:
+                    yield first
+                yield from tokens
+                finished = True
+            except (BackendUnavailable, requests.RequestException) as e:
+                error = e
+                raise
+            finally:
+                # a client that disconnects (GeneratorExit) leaves the instance's record alone
+                tokens.close()
+                self._release(member, started, error, finished)
+            return
+        raise BackendUnavailable(f"all {len(self.members)} backends failed; last error: {last!r}")
+
+    def prime(self, system: str):
+        for m in self.members:
+            try:
+                m.backend.prime(system)
+            except (BackendUnavailable, requests.RequestException) as e:
+                print(f"[WARN] {m.backend.base_url}: could not prime prefix: {e!r}")
+
+    # ---- health ----
+    def check(self):
+        """Probe every instance once; healthy ones are (re)admitted, dead ones ejected."""
+        for m in self.members:
+            ok = m.backend.healthy()
+            with self.lock:
+                if ok:
+                    m.failures = 0
+                    m.ejected_until = 0.0
+                else:
+                    m.failures += 1
+                    m.last_error = "health check failed"
+                    if m.failures >= EJECT_AFTER or not m.available(time.time()):
+                        m.ejected_until = time.time() + EJECT_SECONDS
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            self.check()
+
+    def start(self):
+        self.check()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._health_loop, name="llm-health", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def stats(self) -> list[dict]:
+        now = time.time()
+        with self.lock:
+            out = []
+            for m in self.members:
+                lat = sorted(m.latencies)
+                out.append({
+                    "url": getattr(m.backend, "base_url", m.backend.name),
+                    "available": m.available(now),
+                    "ejected_for_seconds": round(max(0.0, m.ejected_until - now), 1),
+                    "inflight": m.inflight,
+                    "requests": m.requests,
+                    "errors": m.errors,
+                    "error_rate": round(m.errors / m.requests, 4) if m.requests else None,
+                    "latency_ms_mean": round(_mean(lat) * 1000, 1) if lat else None,
+                    "latency_ms_p50": round(lat[len(lat) // 2] * 1000, 1) if lat else None,
+                    "latency_ms_p95": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000, 1) if lat else None,
+                    "last_error": m.last_error,
+                })
+            return out
+
+
+def _mean(values) -> float:
+    return statistics.fmean(values) if values else 0.0
+
+
+def get_backend(kind: str = LLM_BACKEND):
+    if kind == "cli":
+        return OllamaCLIBackend()
+    if kind == "http":
+        return FallbackBackend(OllamaHTTPBackend(), OllamaCLIBackend())
+    if kind == "http-only":
+        return OllamaHTTPBackend()
+    if kind == "pool":
+        return BackendPool([OllamaHTTPBackend(base_url=url) for url in (LLM_BACKENDS or [OLLAMA_URL])])
+    raise ValueError(f"Unknown LLM_BACKEND: {kind!r} (expected http, http-only, pool or cli)")
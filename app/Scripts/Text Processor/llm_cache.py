@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+# ========= CONFIG =========
+LLM_CACHE_DIR = Path(os.environ.get("LLM_CACHE_DIR", "processed/.llm_cache"))
+LLM_CACHE_MEMORY_ITEMS = int(os.environ.get("LLM_CACHE_MEMORY_ITEMS", "512"))
+LLM_CACHE_MAX_MB = float(os.environ.get("LLM_CACHE_MAX_MB", "512"))   # disk tier eviction limit
+# =========================
+
+
+def cache_key(text: str, prompt_template: str, model: str, settings: dict | None = None) -> str:
+    """
+    Content address of one extraction: the article text, the prompt version, the model
+    and the settings that shape the answer (prompt mode, generation options, token
+    budget). Editing article_to_json_prompt.txt, switching models or changing one of
+    those settings invalidates everything.
+    """
+    prompt_version = hashlib.sha256(prompt_template.encode("utf-8")).hexdigest()
+    h = hashlib.sha256()
+    for part in (model, prompt_version, json.dumps(settings or {}, sort_keys=True), text):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier cache of parsed model outputs: an in-memory LRU in front of one JSON file
+    per key on disk. The disk tier is trimmed oldest-access-first once it grows past
+    max_mb. Only successfully parsed outputs should be stored.
+    """
+
+    def __init__(self, root: Path = LLM_CACHE_DIR, memory_items: int = LLM_CACHE_MEMORY_ITEMS,
+                 max_mb: float = LLM_CACHE_MAX_MB):
+        self.root = Path(root)
+        self.memory_items = memory_items
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.memory: OrderedDict[str, dict] = OrderedDict()
+        self.lock = threading.Lock()
+        self.evict_lock = threading.Lock()     # one eviction at a time; other writers skip it
+        self.disk_bytes = None      # computed lazily on first write
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _remember(self, key: str, value: dict):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def get(self, key: str) -> dict | None:
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return self.memory[key]
+        path = self._path(key)
+        try:
+            value = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)          # access time for LRU eviction on disk
+        except (OSError, ValueError):
+            with self.lock:
+                self.stats["misses"] += 1
+            return None
+        with self.lock:
+            self.stats["disk_hits"] += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key: str, value: dict):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        try:
+            replaced = path.stat().st_size      # overwriting a key: count only the difference
+        except OSError:
+            replaced = 0
+        os.replace(tmp, path)
+        with self.lock:
+            self._remember(key, value)
+            self.stats["stores"] += 1
+            if self.disk_bytes is None:
+                self.disk_bytes = sum(size for _, size, _ in self._scan())
+            else:
+                self.disk_bytes += len(data) - replaced
+            over = self.disk_bytes > self.max_bytes
+        if over:
+            self._evict()
+
+    def _scan(self) -> list[tuple[float, int, Path]]:
+        """(mtime, size, path) of every cached file; files removed meanwhile are skipped."""
+        files = []
+        for p in self.root.glob("*/*.json"):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+        return files
+
+    def _evict(self):
+        """Drop least recently used files until the disk tier is back under 90% of the limit."""
+        if not self.evict_lock.acquire(blocking=False):
+            return                  # another writer is already evicting
+        try:
+            files = sorted(self._scan(), key=lambda f: f[0])
+            total = sum(size for _, size, _ in files)
+            target = int(self.max_bytes * 0.9)
+            freed = evicted = 0
+            for _, size, p in files:
+                if total - freed <= target:
+                    break
+                try:
+                    p.unlink()
+                except FileNotFoundError:
+                    pass            # already gone: it no longer takes space either
+                else:
+                    evicted += 1
+                freed += size
+                with self.lock:
+                    self.memory.pop(p.stem, None)
+            with self.lock:
+                self.disk_bytes = max(0, self.disk_bytes - freed)
+                self.stats["evictions"] += evicted
+        finally:
+            self.evict_lock.release()
+
+    def summary(self) -> dict:
+        with self.lock:
+            s = dict(self.stats)
+            lookups = s["memory_hits"] + s["disk_hits"] + s["misses"]
+            s["hit_rate"] = round((s["memory_hits"] + s["disk_hits"]) / lookups, 3) if lookups else 0.0
+            s["memory_items"] = len(self.memory)
+            s["disk_bytes"] = self.disk_bytes
+        return s
@@ -1,30 +1,136 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
 from pathlib import Path
+import anyio
+import asyncio
+import contextvars
+import os
+import sys
 import json
+import threading
+import time
 import uuid
-import subprocess
+
+from llm_backends import JSON_FORMAT, NUM_CTX, NUM_PREDICT, TEMPERATURE, USAGE_HOOKS, get_backend
+from jobs import JOB_WORKERS, JobQueue, QueueFull
+from llm_cache import LLMCache, cache_key
+from search_index import SearchIndex, LEVELS
+from dense_index import DenseIndex
+from json_stream import JSONObjectStream, collect
+from extraction_schema import STATS as VALIDATION, validate_output
+from cleaning import clean_article
+from chunking import article_budget, estimate_tokens, merge_extractions, split_article
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import metrics      # shared with the scrapers: stage histograms, counters, trace log
+from shard_store import ShardStore
 
 PROMPT_PATH = Path("app/prompts/article_to_json_prompt.txt")
 PROMPT_TEMPLATE = PROMPT_PATH.read_text(encoding="utf-8")
 
-app = FastAPI()
+# The instructions (everything before the placeholder) are the same for every article.
+# PROMPT_MODE=system sends them as the system prompt, byte-identical on every call, so
+# the server reuses their evaluated KV cache and prefills only the article;
+# PROMPT_MODE=inline sends one concatenated prompt as before.
+PROMPT_MODE = os.environ.get("PROMPT_MODE", "system")
+PROMPT_PREFIX, _placeholder, PROMPT_SUFFIX = PROMPT_TEMPLATE.partition("{{ARTICLE_TEXT}}")
+if not _placeholder:
+    raise RuntimeError(f"Placeholder {{{{ARTICLE_TEXT}}}} missing from {PROMPT_PATH}; check the prompt file for typos.")
+
+# Chosen by LLM_BACKEND (http | http-only | pool | cli), see llm_backends.py
+LLM = get_backend()
+
+# Parsed outputs keyed on (article text, prompt template, model, CACHE_SETTINGS); LLM_CACHE=0 disables
+CACHE = LLMCache() if os.environ.get("LLM_CACHE", "1") == "1" else None
+
+# BM25 index over problemes_solutions (build with `python search_index.py build`);
+# every new /process result is added to it
+SEARCH = SearchIndex()
+# Embedding index over the same entries (build with `python dense_index.py build`)
+DENSE = DenseIndex()
+
+# Outputs are appended to compact JSONL shards keyed by article_id (shard_store.py),
+# read back with GET /outputs/{article_id}; dataset.py compiles them like the old files
+STORE = ShardStore(os.environ.get("OUTPUT_STORE", "processed/store"))
+
+# Encoding repair, reflow and promo removal before prompting (cleaning.py); CLEAN_TEXT=0 sends text as-is
+CLEAN_TEXT = os.environ.get("CLEAN_TEXT", "1") == "1"
+
+# Invalid fields are re-asked alone (extraction_schema.py); SCHEMA_REASK=0 only repairs
+SCHEMA_REASK = os.environ.get("SCHEMA_REASK", "1") == "1"
+REASK_NUM_PREDICT = 1024
+
+# Articles longer than what fits next to the instructions and NUM_PREDICT in LLM_NUM_CTX
+# are split into overlapping chunks (chunking.py), extracted CHUNK_WORKERS at a time and
+# merged; ARTICLE_TOKEN_BUDGET overrides the computed limit
+ARTICLE_BUDGET = int(os.environ.get("ARTICLE_TOKEN_BUDGET", "0")) or article_budget(NUM_CTX, PROMPT_TEMPLATE, NUM_PREDICT)
+CHUNK_WORKERS = int(os.environ.get("CHUNK_WORKERS", "2"))
+
+# Everything besides the text, template and model that changes what gets cached
+CACHE_SETTINGS = {"prompt_mode": PROMPT_MODE, "num_predict": NUM_PREDICT, "num_ctx": NUM_CTX,
+                  "temperature": TEMPERATURE, "json_format": JSON_FORMAT, "article_budget": ARTICLE_BUDGET,
+                  "schema_reask": SCHEMA_REASK}
+CHUNK_POOL = ThreadPoolExecutor(max_workers=max(1, CHUNK_WORKERS), thread_name_prefix="chunk")
+
+# POST /process_batch runs at most BATCH_WORKERS articles at once (default: as many as
+# the job queue), shared by all batch connections; each reads ahead BATCH_WINDOW lines
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", str(JOB_WORKERS)))
+BATCH_WINDOW = int(os.environ.get("BATCH_WINDOW", str(2 * BATCH_WORKERS)))
+BATCH_POOL = ThreadPoolExecutor(max_workers=max(1, BATCH_WORKERS), thread_name_prefix="batch")
+
+# Per-stage timings and token counts go to GET /metrics; METRICS_TRACE=path also appends
+# one JSON line per article (stage times, tokens) to find the slow ones
+metrics.configure_trace(os.environ.get("METRICS_TRACE") or None)
+
 
+def record_usage(prompt_tokens: int | None, output_tokens: int | None):
+    if prompt_tokens:
+        metrics.inc("llm_tokens_total", prompt_tokens, direction="in")
+    if output_tokens:
+        metrics.inc("llm_tokens_total", output_tokens, direction="out")
+    metrics.annotate(tokens_in=prompt_tokens or 0, tokens_out=output_tokens or 0)
 
-def call_ollama(prompt: str) -> str:
-    """Call Ollama llama3 and return raw stdout."""
-    result = subprocess.run(
-        ["ollama", "run", "llama3"],
-        input=prompt,
-        text=True,
-        capture_output=True
-    )
-    # Optional: log stderr if something goes wrong
-    if result.stderr:
-        print("=== OLLAMA STDERR ===")
-        print(result.stderr)
-        print("=====================")
-    return result.stdout
+
+USAGE_HOOKS.append(record_usage)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if PROMPT_MODE == "system" and hasattr(LLM, "prime"):
+        threading.Thread(target=prime_prefix, daemon=True).start()
+    if hasattr(LLM, "start"):
+        LLM.start()             # pool health checks
+    JOBS.start()
+    yield
+    JOBS.stop()
+    if hasattr(LLM, "stop"):
+        LLM.stop()
+    BATCH_POOL.shutdown(wait=True, cancel_futures=True)
+    CHUNK_POOL.shutdown(wait=True, cancel_futures=True)
+    STORE.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def prime_prefix():
+    try:
+        LLM.prime(PROMPT_PREFIX)
+    except Exception as e:          # the server may simply not be up yet
+        print(f"[WARN] could not prime the prompt prefix: {e!r}")
+
+
+def call_ollama(prompt: str, system: str | None = None) -> str:
+    """
+    Send the prompt to the configured model backend and return the raw text.
+    Streams under the hood and hangs up once the JSON object is closed, so the model
+    never spends tokens on chatter after it.
+    """
+    text, _ = collect(LLM.stream(prompt, system))
+    return text
 
 
 class ArticleInput(BaseModel):
@@ -37,17 +143,20 @@ def read_root():
     return {"message": "Hello Kristopher, FastAPI is running 🚀"}
 
 
-@app.post("/process")
-def process_article(payload: ArticleInput):
-    article_id = payload.article_id or str(uuid.uuid4())
+def prepare_text(text: str) -> str:
+    """Cleaned article text; the cache key is taken on this, so cleaning rule changes re-run."""
+    return clean_article(text)[0] if CLEAN_TEXT else text
 
+
+def build_prompt(text: str) -> tuple[str | None, str]:
+    """(system, prompt) for the model, split or not according to PROMPT_MODE."""
     # DEBUG: see what we really received
-    #print("=== DEBUG payload.text (first 300 chars) ===")
-    #print(repr(payload.text[:300]))
-    #print("=== END payload.text ===")
+    #print("=== DEBUG text (first 300 chars) ===")
+    #print(repr(text[:300]))
+    #print("=== END text ===")
 
     # Build final prompt
-    prompt_final = PROMPT_TEMPLATE.replace("{{ARTICLE_TEXT}}", payload.text)
+    prompt_final = PROMPT_TEMPLATE.replace("{{ARTICLE_TEXT}}", text)
 
     # Guard: placeholder must be gone
     if "{{ARTICLE_TEXT}}" in prompt_final:
@@ -60,21 +169,367 @@ def process_article(payload: ArticleInput):
     #print("=== DEBUG prompt_final (last 400 chars) ===")
     #print(prompt_final[-400:])
     #print("=== END prompt_final ===")
+    if PROMPT_MODE == "system":
+        return PROMPT_PREFIX, prompt_final[len(PROMPT_PREFIX):]
+    return None, prompt_final
 
-    ollama_response = call_ollama(prompt_final)
 
-    try:
-        parsed = json.loads(ollama_response)
-    except Exception:
-        parsed = {"raw_output": ollama_response}
+def reask_field(prompt: str) -> str:
+    """Small follow-up generation for one invalid field (see extraction_schema.reask_prompt)."""
+    return LLM.generate(prompt, num_predict=REASK_NUM_PREDICT)
+
+
+def parse_output(key: str | None, text: str, ollama_response: str) -> dict:
+    """Repair, validate and re-ask what is still wrong instead of keeping raw_output."""
+    parsed = validate_output(ollama_response, text, reask_field if SCHEMA_REASK else None)
+    if CACHE and output_status(parsed) == "ok":      # off-schema answers are redone next time
+        CACHE.put(key, parsed)
+    return parsed
+
+
+def extract_chunk(chunk: str) -> dict:
+    system, prompt = build_prompt(chunk)
+    with metrics.timer("llm"):
+        response = call_ollama(prompt, system)
+    with metrics.timer("parse"):
+        return validate_output(response, chunk, reask_field if SCHEMA_REASK else None)
+
+
+def submit_chunks(chunks: list[str]) -> list:
+    """Start every chunk on CHUNK_POOL, each in a copy of the caller's trace context."""
+    metrics.inc("chunks_total", len(chunks))
+    metrics.annotate(chunks=len(chunks))
+    return [CHUNK_POOL.submit(contextvars.copy_context().run, extract_chunk, c) for c in chunks]
+
+
+def merge_chunks(key: str | None, futures: list) -> dict:
+    parsed = merge_extractions([f.result() for f in futures])
+    if CACHE and output_status(parsed) == "ok":      # a partial merge is retried next time
+        CACHE.put(key, parsed)
+    return parsed
+
+
+def output_status(parsed: dict) -> str:
+    """ok, partial (some chunks unparsed, or the object is off-schema) or raw (nothing parsed)."""
+    if "raw_output" in parsed:
+        return "raw"
+    return "partial" if parsed.get("chunks_failed") or parsed.get("schema_invalid") else "ok"
+
+
+def save_output(article_id: str, parsed: dict, cached: bool = False):
+    """Store the output; index it too, unless it came from the cache (already indexed)."""
+    with metrics.timer("write"):
+        STORE.append(article_id, parsed)
+
+    if not cached and output_status(parsed) != "raw" and not parsed.get("schema_invalid"):
+        with metrics.timer("index"):
+            SEARCH.add_extraction(parsed, article_id)
+            DENSE.add_extraction(parsed, article_id)
+
+
+def run_pipeline(article_id: str, text: str) -> dict:
+    """
+    Prompt -> model -> JSON -> output store under article_id. Returns the parsed output.
+    Unchanged articles are answered from the LLM cache without calling the model; an
+    article over ARTICLE_BUDGET tokens is extracted chunk by chunk, in parallel, and merged.
+    """
+    with metrics.trace(article_id):
+        with metrics.timer("clean"):
+            text = prepare_text(text)
+        with metrics.timer("prompt"):
+            chunks = split_article(text, ARTICLE_BUDGET)
+            system, prompt = build_prompt(text)
+        metrics.annotate(tokens_est=estimate_tokens(text))
+        key = cache_key(text, PROMPT_TEMPLATE, LLM.model, CACHE_SETTINGS) if CACHE else None
+        parsed = CACHE.get(key) if CACHE else None
+        status = "cached"
+
+        if parsed is None and len(chunks) > 1:
+            parsed = merge_chunks(key, submit_chunks(chunks))
+            status = output_status(parsed)
+        elif parsed is None:
+            with metrics.timer("llm"):
+                response = call_ollama(prompt, system)
+            with metrics.timer("parse"):
+                parsed = parse_output(key, text, response)
+            status = output_status(parsed)
+
+        save_output(article_id, parsed, cached=status == "cached")
+        metrics.inc("items_total", status=status)
+        metrics.annotate(status=status)
+    return parsed
+
+
+def stream_pipeline(article_id: str, text: str):
+    """
+    run_pipeline, but yielding events while the model generates:
+      {"type": "token", "text"}         every chunk from the backend
+      {"type": "field", "key", "value"} each top-level member once it is complete
+      {"type": "chunk", "index", "of"}  instead of the two above, for an article over
+                                        ARTICLE_BUDGET: each chunk as it is extracted
+      {"type": "done", "status", "article_id", "llm_output", "stopped_early", "cached"}
+                                        status: ok | partial | raw, as in /process
+    Generation is cut as soon as the top-level object closes; if the client goes away
+    the generator is closed and so is the backend stream.
+    Stage timings are recorded, but no trace line: each chunk of a StreamingResponse is
+    pulled in a fresh thread context, so a per-article trace would not follow it.
+    """
+    with metrics.timer("clean"):
+        text = prepare_text(text)
+    with metrics.timer("prompt"):
+        chunks = split_article(text, ARTICLE_BUDGET)
+        system, prompt = build_prompt(text)
+    key = cache_key(text, PROMPT_TEMPLATE, LLM.model, CACHE_SETTINGS) if CACHE else None
+    parsed = CACHE.get(key) if CACHE else None
+    stopped_early = False
+
+    if parsed is None and len(chunks) > 1:
+        futures = submit_chunks(chunks)
+        for future in as_completed(futures):
+            yield {"type": "chunk", "index": futures.index(future), "of": len(futures)}
+        parsed = merge_chunks(key, futures)
+        cached = False
+    elif parsed is None:
+        scanner, raw = JSONObjectStream(), []
+        tokens = LLM.stream(prompt, system)
+        started = time.perf_counter()
+        try:
+            for token in tokens:
+                raw.append(token)
+                yield {"type": "token", "text": token}
+                members, _ = scanner.feed(token)
+                for name, value in members:
+                    yield {"type": "field", "key": name, "value": value}
+                if scanner.done:
+                    stopped_early = True
+                    break
+        finally:
+            tokens.close()
+            metrics.observe("stage_seconds", time.perf_counter() - started, stage="llm")
+        with metrics.timer("parse"):
+            parsed = parse_output(key, text, scanner.text if scanner.done else "".join(raw))
+        cached = False
+    else:
+        cached = True
+
+    save_output(article_id, parsed, cached=cached)
+    metrics.inc("items_total", status="cached" if cached else output_status(parsed))
+    yield {"type": "done", "status": output_status(parsed), "article_id": article_id, "llm_output": parsed,
+           "stopped_early": stopped_early, "cached": cached}
+
+
+def run_job(payload: dict) -> dict:
+    """JobQueue handler: the job record keeps a summary, the full output stays on disk."""
+    parsed = run_pipeline(payload["article_id"], payload["text"])
+    return {"output": f"/outputs/{payload['article_id']}", "parsed": "raw_output" not in parsed,
+            "status": output_status(parsed)}
 
-    out_dir = Path("processed")
-    out_dir.mkdir(exist_ok=True)
-    out_path = out_dir / f"{article_id}.json"
-    out_path.write_text(json.dumps(parsed, ensure_ascii=False, indent=2))
+
+JOBS = JobQueue(run_job)
+
+
+@app.post("/process")
+def process_article(payload: ArticleInput):
+    article_id = payload.article_id or str(uuid.uuid4())
+    parsed = run_pipeline(article_id, payload.text)
 
     return {
-        "status": "ok",
+        "status": output_status(parsed),      # ok | partial | raw: only "ok" is complete
         "article_id": article_id,
         "llm_output": parsed
     }
+
+
+@app.post("/process/stream")
+def process_article_stream(payload: ArticleInput, format: str = Query("ndjson", pattern="^(ndjson|sse)$")):
+    """Same as /process, streamed as NDJSON lines or server-sent events (?format=sse)."""
+    article_id = payload.article_id or str(uuid.uuid4())
+    events = stream_pipeline(article_id, payload.text)
+    if format == "sse":
+        body = (f"event: {e['type']}\ndata: {json.dumps(e, ensure_ascii=False)}\n\n" for e in events)
+        return StreamingResponse(body, media_type="text/event-stream")
+    body = (json.dumps(e, ensure_ascii=False) + "\n" for e in events)
+    return StreamingResponse(body, media_type="application/x-ndjson")
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse whose body generator still reads the request body. Under ASGI
+    spec < 2.4 (uvicorn) Starlette's disconnect listener would consume, and drop, the
+    request chunks; a client that goes away shows up as ClientDisconnect instead.
+    """
+
+    async def listen_for_disconnect(self, receive):
+        await anyio.sleep_forever()
+
+
+async def ndjson_lines(chunks):
+    """Lines of a streamed NDJSON body, as they arrive; blank lines are skipped."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+def validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, err['loc'])) or 'line'}: {err['msg']}" for err in e.errors())
+
+
+def run_batch_item(article_id: str, text: str) -> dict:
+    started = time.perf_counter()
+    try:
+        parsed = run_pipeline(article_id, text)
+    except Exception as e:
+        return {"article_id": article_id, "status": "error", "error": repr(e),
+                "seconds": round(time.perf_counter() - started, 3)}
+    return {"article_id": article_id, "status": output_status(parsed),
+            "llm_output": parsed, "seconds": round(time.perf_counter() - started, 3)}
+
+
+async def batch_results(lines, include_output: bool):
+    """
+    Schedule every ArticleInput line on BATCH_POOL and yield one result per line, in
+    completion order: {"line", "article_id", "status": ok | partial | raw | error | invalid, ...}.
+    At most BATCH_WINDOW lines are read ahead, so a slow model pushes back on the upload.
+    Ends with {"status": "end", "counts": {...}}.
+    """
+    loop = asyncio.get_running_loop()
+    running: dict[asyncio.Future, int] = {}
+    counts = {"ok": 0, "partial": 0, "raw": 0, "error": 0, "invalid": 0}
+    read, line_no = None, 0
+    try:
+        while True:
+            if read is None and lines is not None and len(running) < BATCH_WINDOW:
+                read = asyncio.ensure_future(anext(lines, None))
+            waiting = set(running) | ({read} if read else set())
+            if not waiting:
+                break
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+            if read in done:
+                line, read = read.result(), None
+                if line is None:
+                    lines = None
+                else:
+                    line_no += 1
+                    try:
+                        item = ArticleInput.model_validate_json(line)
+                    except ValidationError as e:
+                        counts["invalid"] += 1
+                        yield {"line": line_no, "status": "invalid", "error": validation_message(e)}
+                    else:
+                        article_id = item.article_id or str(uuid.uuid4())
+                        fut = loop.run_in_executor(BATCH_POOL, run_batch_item, article_id, item.text)
+                        running[fut] = line_no
+
+            for fut in done & set(running):
+                result = {"line": running.pop(fut), **fut.result()}
+                counts[result["status"]] += 1
+                if not include_output:
+                    result.pop("llm_output", None)
+                yield result
+    finally:
+        # client gone: articles not started yet are dropped, running ones still get stored
+        for fut in running:
+            fut.cancel()
+        if read is not None:
+            read.cancel()
+    yield {"status": "end", "counts": counts}
+
+
+@app.post("/process_batch")
+async def process_batch(request: Request, include_output: bool = True):
+    """
+    Many articles over one connection: the body is NDJSON, one ArticleInput per line,
+    read as it streams in; results stream back as NDJSON in completion order.
+    include_output=false leaves llm_output out (fetch it from GET /outputs/{article_id}).
+    """
+    results = batch_results(ndjson_lines(request.stream()), include_output)
+    body = (json.dumps(r, ensure_ascii=False) + "\n" async for r in results)
+    return DuplexStreamingResponse(body, media_type="application/x-ndjson")
+
+
+@app.post("/jobs", status_code=202)
+def submit_job(payload: ArticleInput):
+    """Queue an article and return immediately; poll GET /jobs/{id} for progress.
+    Queued jobs run shortest first (JOB_ORDER=sjf) by their token estimate."""
+    article_id = payload.article_id or str(uuid.uuid4())
+    try:
+        job = JOBS.submit({"article_id": article_id, "text": payload.text},
+                          priority=estimate_tokens(payload.text))
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    return {"job_id": job["id"], "article_id": article_id, "status": job["status"]}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+
+@app.get("/jobs")
+def job_stats():
+    return JOBS.stats()
+
+
+@app.get("/outputs/{article_id}")
+def get_output(article_id: str):
+    """The latest stored output for an article (what /process returned as llm_output)."""
+    parsed = STORE.get(article_id)
+    if parsed is None:
+        raise HTTPException(status_code=404, detail=f"No output for {article_id}")
+    return {"article_id": article_id, "llm_output": parsed}
+
+
+@app.get("/outputs")
+def output_stats():
+    return STORE.stats()
+
+
+@app.get("/backends")
+def backend_stats():
+    """Per-instance in-flight, latency and error stats (LLM_BACKEND=pool)."""
+    if hasattr(LLM, "stats"):
+        return {"backend": LLM.name, "instances": LLM.stats()}
+    return {"backend": LLM.name, "model": LLM.model}
+
+
+@app.get("/cache")
+def cache_stats():
+    return CACHE.summary() if CACHE else {"enabled": False}
+
+
+@app.get("/search")
+def search(q: str, level: str | None = None, k: int = Query(10, ge=1, le=100)):
+    """BM25 over the extracted problems; `level` keeps only entries with solutions for it."""
+    if level is not None and level not in LEVELS:
+        raise HTTPException(status_code=400, detail=f"level must be one of {', '.join(LEVELS)}")
+    return {"query": q, "level": level, "results": SEARCH.search(q, level, k)}
+
+
+@app.get("/similar")
+def similar(q: str, level: str | None = None, k: int = Query(10, ge=1, le=100)):
+    """Cosine nearest neighbours of a free-text question ("my loop goes into the net")."""
+    if level is not None and level not in LEVELS:
+        raise HTTPException(status_code=400, detail=f"level must be one of {', '.join(LEVELS)}")
+    return {"query": q, "level": level, "results": DENSE.search(q, level, k)}
+
+
+@app.get("/validation")
+def validation_stats():
+    """How often outputs needed a syntax repair or a field re-ask instead of a full rerun."""
+    return VALIDATION.summary()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Stage histograms, token and item counters in the Prometheus text format."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,390 @@
+import argparse
+import json
+import math
+import mmap
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+from pathlib import Path
+
+# BM25 search over the extracted problemes_solutions entries.
+#
+# One document = one entry of problemes_solutions (probleme, diagnostic, causes,
+# solutions per level, drills, pitfalls). The built index is a handful of flat files
+# that are memory-mapped at startup instead of parsed:
+#
+#   lexicon.json   term -> [postings offset, document frequency]
+#   postings.bin   uint32 pairs (doc id, term frequency), grouped by term
+#   doclen.bin     uint32 token count per document
+#   levels.bin     uint8 bit mask per document: which levels have solutions
+#   docs.jsonl     the stored entry returned in results; docoff.bin holds uint64 offsets
+#   articles.json  article_id -> document ids, for the entries that came from /process
+#   meta.json      document count, average length
+#
+# New results from /process go into an in-memory delta segment (also appended to
+# delta.jsonl so a restart replays them) and are searchable immediately; once the delta
+# holds DELTA_FLUSH_DOCS documents the two are merged into a fresh on-disk segment.
+# Re-processing an article_id replaces its entries: the old ones are left out of
+# results at once (they still count in the BM25 statistics) and dropped at the merge.
+
+# ========= CONFIG =========
+SEARCH_DIR = Path(os.environ.get("SEARCH_DIR", "processed/search_index"))
+DELTA_FLUSH_DOCS = 500
+K1, B = 1.2, 0.75
+LEVELS = ("debutant", "intermediaire", "avance")
+# =========================
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how i if in into is it its my of on or
+so that the their them then there these they this to too was we were what when where
+which while who will with you your not no do does can just than very
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def flatten(value) -> str:
+    """Model output is not always the documented shape; pull every string out of it."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return " ".join(f"{k} {flatten(v)}" for k, v in value.items())
+    if isinstance(value, list):
+        return " ".join(flatten(v) for v in value)
+    return "" if value is None else str(value)
+
+
+def documents_from_extraction(data: dict, article_id: str | None = None) -> list[dict]:
+    """problemes_solutions entries of one extraction -> searchable documents."""
+    meta = data.get("meta") if isinstance(data.get("meta"), dict) else {}
+    buckets = data.get("problemes_solutions")
+    if not isinstance(buckets, dict):
+        return []
+    docs = []
+    for slug, entries in buckets.items():
+        for entry in entries if isinstance(entries, list) else [entries]:
+            if not isinstance(entry, dict):
+                continue
+            sols = entry.get("solutions_progressives")
+            sols = sols if isinstance(sols, dict) else {}
+            docs.append({
+                "article_id": article_id,
+                "article_title": meta.get("article_title"),
+                "article_slug": meta.get("article_slug") or slug,
+                "source_url": entry.get("source_url") or meta.get("source_url"),
+                "probleme": entry.get("probleme"),
+                "diagnostic": entry.get("diagnostic"),
+                "causes_communes": entry.get("causes_communes") or [],
+                "solutions_progressives": {lvl: sols.get(lvl) or [] for lvl in LEVELS},
+                "erreurs_a_eviter": entry.get("erreurs_a_eviter") or [],
+                "exercices_complementaires": entry.get("exercices_complementaires") or [],
+            })
+    return docs
+
+
+def record_article_id(record: dict) -> str | None:
+    """article_id of a dataset record that came from the output store ("<store>#<id>")."""
+    return record["source_file"].partition("#")[2] or None
+
+
+def doc_text(doc: dict) -> str:
+    # the problem label counts twice: it is the best summary of what the entry is about
+    return " ".join([flatten(doc["probleme"])] * 2 + [
+        flatten(doc["article_title"]), flatten(doc["diagnostic"]), flatten(doc["causes_communes"]),
+        flatten(doc["solutions_progressives"]), flatten(doc["erreurs_a_eviter"]),
+        flatten(doc["exercices_complementaires"]),
+    ])
+
+
+def level_mask(doc: dict) -> int:
+    return sum(1 << i for i, lvl in enumerate(LEVELS) if doc["solutions_progressives"].get(lvl))
+
+
+def _term_counts(doc: dict) -> tuple[dict, int]:
+    counts = {}
+    tokens = tokenize(doc_text(doc))
+    for t in tokens:
+        counts[t] = counts.get(t, 0) + 1
+    return counts, len(tokens)
+
+
+def write_segment(docs, out_dir: Path):
+    """Write a complete on-disk segment from an iterable of documents (atomic dir swap)."""
+    tmp = out_dir.with_name(out_dir.name + ".building")
+    tmp.mkdir(parents=True, exist_ok=True)
+    postings: dict[str, list[int]] = {}
+    doclen, levels, docoff = array("I"), array("B"), array("Q")
+    articles: dict[str, list[int]] = {}
+
+    with (tmp / "docs.jsonl").open("wb") as f:
+        for doc_id, doc in enumerate(docs):
+            if doc.get("article_id"):
+                articles.setdefault(doc["article_id"], []).append(doc_id)
+            counts, length = _term_counts(doc)
+            for term, tf in counts.items():
+                postings.setdefault(term, []).extend((doc_id, min(tf, 0xFFFFFFFF)))
+            doclen.append(length)
+            levels.append(level_mask(doc))
+            docoff.append(f.tell())
+            f.write(json.dumps(doc, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    lexicon, flat = {}, array("I")
+    for term in sorted(postings):
+        pairs = postings[term]
+        lexicon[term] = [len(flat) // 2, len(pairs) // 2]
+        flat.extend(pairs)
+
+    for name, arr in (("postings.bin", flat), ("doclen.bin", doclen),
+                      ("levels.bin", levels), ("docoff.bin", docoff)):
+        with (tmp / name).open("wb") as f:
+            arr.tofile(f)
+    (tmp / "lexicon.json").write_text(json.dumps(lexicon), encoding="utf-8")
+    (tmp / "articles.json").write_text(json.dumps(articles, ensure_ascii=False), encoding="utf-8")
+    n = len(doclen)
+    (tmp / "meta.json").write_text(json.dumps({
+        "documents": n, "avgdl": (sum(doclen) / n) if n else 0.0, "built_at": time.time(),
+    }), encoding="utf-8")
+
+    old = out_dir.with_name(out_dir.name + ".old")
+    if out_dir.exists():
+        os.replace(out_dir, old)
+    os.replace(tmp, out_dir)
+    if old.exists():
+        for p in old.iterdir():
+            p.unlink()
+        old.rmdir()
+
+
+class _Mapped:
+    """A typed read-only view over a memory-mapped file (empty files allowed)."""
+
+    def __init__(self, path: Path, fmt: str):
+        self.file = path.open("rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if path.stat().st_size else None
+        self.view = memoryview(self.mm).cast(fmt) if self.mm else memoryview(array(fmt))
+
+    def close(self):
+        self.view.release()
+        if self.mm:
+            self.mm.close()
+        self.file.close()
+
+
+class SearchIndex:
+    def __init__(self, root: Path = SEARCH_DIR):
+        self.root = Path(root)
+        self.lock = threading.RLock()
+        self.delta_docs: list[dict] = []
+        self.delta_postings: dict[str, list[tuple[int, int]]] = {}
+        self.delta_len: list[int] = []
+        self.delta_articles: dict[str, list[int]] = {}
+        self.dead: set[int] = set()        # replaced documents: segment ids, delta ids offset by the segment size
+        self.maps: list[_Mapped] = []
+        self._open_segment()
+        self._replay_delta()
+
+    # ---- segment ----
+    def _open_segment(self):
+        for m in self.maps:
+            m.close()
+        self.maps = []
+        seg = self.root / "segment"
+        if not (seg / "meta.json").exists():
+            self.meta, self.lexicon, self.articles = {"documents": 0, "avgdl": 0.0}, {}, {}
+            self.postings = self.doclen = self.levels = self.docoff = memoryview(array("I"))
+            self.docs_mm = None
+            return
+        self.meta = json.loads((seg / "meta.json").read_text(encoding="utf-8"))
+        self.lexicon = json.loads((seg / "lexicon.json").read_text(encoding="utf-8"))
+        articles = seg / "articles.json"
+        self.articles = json.loads(articles.read_text(encoding="utf-8")) if articles.exists() else {}
+        maps = {name: _Mapped(seg / f"{name}.bin", fmt)
+                for name, fmt in (("postings", "I"), ("doclen", "I"), ("levels", "B"), ("docoff", "Q"))}
+        self.maps = list(maps.values())
+        self.postings = maps["postings"].view
+        self.doclen = maps["doclen"].view
+        self.levels = maps["levels"].view
+        self.docoff = maps["docoff"].view
+        docs = _Mapped(seg / "docs.jsonl", "B")
+        self.maps.append(docs)
+        self.docs_mm = docs.mm
+
+    def _segment_doc(self, doc_id: int) -> dict:
+        start = self.docoff[doc_id]
+        end = self.docs_mm.find(b"\n", start)
+        return json.loads(self.docs_mm[start:end])
+
+    def _all_docs(self):
+        n_seg = self.meta["documents"]
+        for doc_id in range(n_seg):
+            if doc_id not in self.dead:
+                yield self._segment_doc(doc_id)
+        for doc_id, doc in enumerate(self.delta_docs):
+            if n_seg + doc_id not in self.dead:
+                yield doc
+
+    # ---- delta ----
+    def _replay_delta(self):
+        path = self.root / "delta.jsonl"
+        if not path.exists():
+            return
+        for line in path.read_text(encoding="utf-8").splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if "replace" in entry:
+                self._drop(entry["replace"])
+            else:
+                self._add_delta(entry)
+
+    def _drop(self, article_id: str):
+        """Leave an article's current documents out of results (and out of the next merge)."""
+        n_seg = self.meta["documents"]
+        self.dead.update(self.articles.pop(article_id, []))
+        self.dead.update(n_seg + doc_id for doc_id in self.delta_articles.pop(article_id, []))
+
+    def _add_delta(self, doc: dict):
+        doc_id = len(self.delta_docs)
+        if doc.get("article_id"):
+            self.delta_articles.setdefault(doc["article_id"], []).append(doc_id)
+        counts, length = _term_counts(doc)
+        for term, tf in counts.items():
+            self.delta_postings.setdefault(term, []).append((doc_id, tf))
+        self.delta_docs.append(doc)
+        self.delta_len.append(length)
+
+    def add_extraction(self, data: dict, article_id: str | None = None) -> int:
+        """Index a freshly processed article, replacing what article_id had. Searchable immediately."""
+        docs = documents_from_extraction(data, article_id)
+        if not docs and not article_id:
+            return 0
+        with self.lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with (self.root / "delta.jsonl").open("a", encoding="utf-8") as f:
+                if article_id:
+                    f.write(json.dumps({"replace": article_id}, ensure_ascii=False) + "\n")
+                    self._drop(article_id)
+                for doc in docs:
+                    f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+                    self._add_delta(doc)
+            if len(self.delta_docs) >= DELTA_FLUSH_DOCS:
+                self.merge()
+        return len(docs)
+
+    def merge(self):
+        """Fold the delta into a new on-disk segment."""
+        with self.lock:
+            docs = list(self._all_docs())
+            for m in self.maps:
+                m.close()
+            self.maps = []
+            write_segment(docs, self.root / "segment")
+            (self.root / "delta.jsonl").unlink(missing_ok=True)
+            self.delta_docs, self.delta_postings, self.delta_len = [], {}, []
+            self.delta_articles, self.dead = {}, set()
+            self._open_segment()
+
+    # ---- query ----
+    def search(self, query: str, level: str | None = None, k: int = 10) -> list[dict]:
+        terms = set(tokenize(query))
+        bit = (1 << LEVELS.index(level)) if level else None
+        with self.lock:
+            n_seg = self.meta["documents"]
+            n = n_seg + len(self.delta_docs)
+            if not terms or not n:
+                return []
+            total_len = self.meta["avgdl"] * n_seg + sum(self.delta_len)
+            avgdl = total_len / n
+
+            scores: dict[int, float] = {}      # segment ids as-is, delta ids offset by n_seg
+            for term in terms:
+                seg = self.lexicon.get(term)
+                delta = self.delta_postings.get(term, [])
+                df = (seg[1] if seg else 0) + len(delta)
+                if not df:
+                    continue
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+                def add(doc_id, tf, dl):
+                    norm = tf * (K1 + 1) / (tf + K1 * (1 - B + B * dl / avgdl))
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+
+                if seg:
+                    off, count = seg
+                    pairs = self.postings[2 * off: 2 * (off + count)]
+                    for i in range(0, len(pairs), 2):
+                        doc_id = pairs[i]
+                        if bit is None or self.levels[doc_id] & bit:
+                            add(doc_id, pairs[i + 1], self.doclen[doc_id])
+                for doc_id, tf in delta:
+                    if bit is None or level_mask(self.delta_docs[doc_id]) & bit:
+                        add(n_seg + doc_id, tf, self.delta_len[doc_id])
+
+            # the same entry can also come from several sources (an output file and the
+            # store); keep its best-scoring copy
+            results, seen = [], set()
+            for doc_id, score in sorted(scores.items(), key=lambda kv: kv[1], reverse=True):
+                if len(results) == k:
+                    break
+                if doc_id in self.dead:
+                    continue
+                doc = self._segment_doc(doc_id) if doc_id < n_seg else self.delta_docs[doc_id - n_seg]
+                ident = (doc["source_url"], flatten(doc["probleme"]))
+                if ident in seen:
+                    continue
+                seen.add(ident)
+                if level:
+                    doc = dict(doc, solutions_progressives={level: doc["solutions_progressives"].get(level, [])})
+                results.append({"score": round(score, 4), **doc})
+            return results
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"segment_documents": self.meta["documents"], "delta_documents": len(self.delta_docs),
+                    "replaced_documents": len(self.dead), "terms": len(self.lexicon)}
+
+
+def build_from_dataset(root: Path = SEARCH_DIR):
+    """Full rebuild from the compiled dataset (dataset.py) -- recompiles it first."""
+    import dataset
+    dataset.build(verbose=False)
+    docs = (doc for record in dataset.iter_records()
+            for doc in documents_from_extraction(record["data"], record_article_id(record)))
+    root.mkdir(parents=True, exist_ok=True)
+    write_segment(docs, root / "segment")
+    (root / "delta.jsonl").unlink(missing_ok=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="BM25 index over extracted problems / solutions.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("build")
+    q = sub.add_parser("query")
+    q.add_argument("q")
+    q.add_argument("--level", choices=LEVELS)
+    q.add_argument("-k", type=int, default=5)
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        started = time.time()
+        build_from_dataset()
+        print(f"{SearchIndex().stats()} in {time.time() - started:.2f}s")
+        return
+
+    index = SearchIndex()
+    started = time.time()
+    hits = index.search(args.q, args.level, args.k)
+    for h in hits:
+        print(f"{h['score']:7.3f}  {h['probleme']}  <{h['source_url']}>")
+    print(f"{len(hits)} result(s) in {(time.time() - started) * 1000:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+# stub_llm_server.py
+# Minimal stand-in for `ollama serve` so main.py can be exercised without a real model.
+# Speaks just enough of the Ollama API: GET /api/tags and POST /api/generate
+# (stream true or false). The "generation" is a fixed-shape JSON object built from the
+# article header in the prompt, counted a few characters per token. --chatter appends
+# the kind of closing remark real models add after the JSON; a streaming client that
+# disconnects stops the generation, as with Ollama. --faults breaks that fraction of
+# answers the ways real models do (fences, trailing commas, a missing field...), and
+# field re-asks (REASK_PATH in the prompt) are answered with just the requested value.
+# --prefill-delay charges for evaluating the prompt (system + prompt), minus the longest
+# prefix already held by one of --slots KV cache slots, like llama.cpp's prompt cache.
+#
+#   python3 stub_llm_server.py --port 11434 --token-delay 0.002 --prefill-delay 0.0005
+#   LLM_BACKEND=http-only OLLAMA_URL=http://127.0.0.1:11434 uvicorn main:app ...
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN_CHARS = 4     # rough chars per token, used both to split output and to count input
+CHATTER = ("\n\nThis JSON captures every problem the article discusses, with progressive "
+           "solutions for each level. Let me know if you would like me to add more drills, "
+           "translate the fields, or adjust the structure in any way!")
+
+
+def fake_extraction(prompt: str) -> str:
+    """A schema-shaped answer that echoes the last article header in the prompt."""
+    def header(key):
+        found = re.findall(rf"^{key}:\s*(.*)$", prompt, flags=re.M)
+        return found[-1].strip() if found else "unknown"
+
+    title = header("title")
+    slug = re.sub(r"[^a-z0-9]+", "_", title.lower()).strip("_")[:48] or "unknown"
+    url = header("source_url")
+    obj = {
+        "meta": {
+            "article_title": title,
+            "article_slug": slug,
+            "source_url": url,
+            "date_accessed": header("date_accessed"),
+        },
+        "terminologie_extrait": [],
+        "problemes_solutions": {
+            slug: [{
+                "probleme": title,
+                "diagnostic": "Not specified by source.",
+                "causes_communes": [],
+                "solutions_progressives": {"debutant": [], "intermediaire": [], "avance": []},
+                "exercices_complementaires": [],
+                "metriques_progression": ["Not specified by source."],
+                "erreurs_a_eviter": [],
+                "source_url": url,
+            }]
+        },
+    }
+    return json.dumps(obj, ensure_ascii=False, indent=2)
+
+
+def reask_answer(prompt: str, dotted: str) -> str:
+    """The requested piece of fake_extraction; unknown slugs / indices map to the first one."""
+    value = json.loads(fake_extraction(prompt))
+    for part in dotted.split("."):
+        if isinstance(value, dict):
+            value = value[part] if part in value else next(iter(value.values()))
+        elif isinstance(value, list):
+            value = value[int(part)] if part.isdigit() and int(part) < len(value) else value[0]
+    return json.dumps(value, ensure_ascii=False)
+
+
+def break_answer(text: str, rng: random.Random) -> str:
+    """One of the usual ways a model answer goes wrong."""
+    obj = json.loads(text)
+    entry = next(iter(obj["problemes_solutions"].values()))[0]
+    fault = rng.choice(["fence", "trailing_comma", "comment", "missing_field", "text_for_list"])
+    if fault == "fence":
+        return "Here is the JSON:\n```json\n" + text + "\n```"
+    if fault == "trailing_comma":
+        return text.replace("\n  }\n}", ",\n  }\n}", 1)
+    if fault == "comment":
+        return text.replace('"terminologie_extrait": [],', '"terminologie_extrait": [], // none in this article', 1)
+    if fault == "missing_field":
+        del entry["probleme"]
+    else:
+        entry["causes_communes"] = "Not specified by source."
+    return json.dumps(obj, ensure_ascii=False, indent=2)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    token_delay = 0.0       # seconds per generated token
+    chatter = False         # append CHATTER after the JSON object
+    faults = 0.0            # fraction of answers broken by break_answer()
+    rng = random.Random(0)
+    prefill_delay = 0.0     # seconds per evaluated prompt token
+    slots = 1               # cached prompt prefixes (0 = no prompt cache)
+    slot_lock = threading.Lock()
+    slot_cache: list[str] = []      # most recently used first
+    generated_tokens = 0    # across all requests, to see what early stopping saves
+
+    def prefill(self, sequence: str) -> tuple[int, int]:
+        """(tokens evaluated, tokens reused) for this prompt; sleeps for the evaluated part."""
+        total = len(sequence) // TOKEN_CHARS
+        cached = 0
+        if self.slots:
+            with self.slot_lock:
+                best = max(range(len(self.slot_cache)), default=None,
+                           key=lambda i: len(os.path.commonprefix([self.slot_cache[i], sequence])))
+                if best is not None:
+                    cached = len(os.path.commonprefix([self.slot_cache[best], sequence])) // TOKEN_CHARS
+                if best is not None and cached:
+                    self.slot_cache.pop(best)
+                self.slot_cache.insert(0, sequence)
+                del self.slot_cache[self.slots:]
+        time.sleep((total - cached) * self.prefill_delay)
+        return total - cached, cached
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _json(self, obj, status=200):
+        data = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._json({"models": [{"name": "llama3:latest"}]})
+        else:
+            self._json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self._json({"error": "not found"}, 404)
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        prompt = body.get("prompt", "")
+        model = body.get("model", "llama3")
+        # the chat template puts the system prompt first
+        sequence = f"{body['system']}\n{prompt}" if body.get("system") else prompt
+        started = time.time()
+        evaluated, reused = self.prefill(sequence) if prompt else (0, 0)
+        prefill_ns = int((time.time() - started) * 1e9)
+
+        reask = re.search(r"^REASK_PATH: (\S+)$", prompt, flags=re.M)
+        if reask:
+            text = reask_answer(prompt, reask.group(1))
+        else:
+            text = fake_extraction(sequence) if prompt else ""
+            if text and self.rng.random() < self.faults:
+                text = break_answer(text, self.rng)
+        if text and self.chatter:
+            text += CHATTER
+        limit = (body.get("options") or {}).get("num_predict")
+        tokens = [text[i:i + TOKEN_CHARS] for i in range(0, len(text), TOKEN_CHARS)]
+        if isinstance(limit, int) and limit >= 0:
+            tokens = tokens[:limit]
+        final = {"model": model, "done": True, "prompt_eval_count": evaluated,
+                 "prompt_eval_duration": prefill_ns, "prompt_cached_count": reused}
+
+        if body.get("stream", True) is False:
+            time.sleep(len(tokens) * self.token_delay)
+            type(self).generated_tokens += len(tokens)
+            self._json({**final, "response": "".join(tokens), "eval_count": len(tokens),
+                        "eval_duration": int(len(tokens) * self.token_delay * 1e9)})
+            return
+
+        # NDJSON, one token per line; no Content-Length, the body ends when we close
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        sent = 0
+        try:
+            for tok in tokens:
+                time.sleep(self.token_delay)
+                self.wfile.write(json.dumps({"model": model, "response": tok, "done": False}).encode() + b"\n")
+                self.wfile.flush()
+                sent += 1
+            self.wfile.write(json.dumps({**final, "response": "", "eval_count": sent,
+                                         "eval_duration": int(sent * self.token_delay * 1e9)}).encode() + b"\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass                # client hung up: stop generating
+        finally:
+            type(self).generated_tokens += sent
+
+
+def serve(host: str = "127.0.0.1", port: int = 11434, **settings) -> ThreadingHTTPServer:
+    """settings: token_delay, chatter, faults, prefill_delay, slots (StubHandler attributes)."""
+    unknown = set(settings) - {"token_delay", "chatter", "faults", "prefill_delay", "slots"}
+    if unknown:
+        raise TypeError(f"unknown stub settings: {', '.join(sorted(unknown))}")
+    handler = type("Handler", (StubHandler,), {**settings, "rng": random.Random(0), "slot_cache": [],
+                                               "slot_lock": threading.Lock(), "generated_tokens": 0})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11434)
+    ap.add_argument("--token-delay", type=float, default=0.0, help="seconds per generated token")
+    ap.add_argument("--chatter", action="store_true", help="add a closing remark after the JSON")
+    ap.add_argument("--faults", type=float, default=0.0, help="fraction of answers to break (0-1)")
+    ap.add_argument("--prefill-delay", type=float, default=0.0, help="seconds per evaluated prompt token")
+    ap.add_argument("--slots", type=int, default=1, help="prompt-cache slots (0 disables prefix reuse)")
+    args = ap.parse_args()
+
+    server = serve(args.host, args.port, token_delay=args.token_delay, chatter=args.chatter,
+                   faults=args.faults, prefill_delay=args.prefill_delay, slots=args.slots)
+    print(f"Stub LLM server on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
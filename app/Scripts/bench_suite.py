@@ -0,0 +1,304 @@
+# bench_suite.py
+# Offline benchmarks: no live site and no ollama binary needed, so runs are comparable.
+#
+#   scrapers  extract_article / collect_posts_from_index / the index link collectors on
+#             the saved pages in fixtures/ (served by an offline HttpCache seeded in a
+#             temp dir, so the whole fetch_text -> parse -> extract path runs)
+#   dump      batch_process.load_articles on a large synthetic ===ARTICLE=== dump
+#   process   POST /process latency and throughput at several client concurrencies,
+#             main.py under uvicorn against stub_llm_server with a per-token delay
+#
+# Results go to a JSON file; --baseline OLD.json prints the change of every metric and
+# flags the ones that got worse by more than --tolerance.
+#
+#   python app/Scripts/bench_suite.py --json bench.json
+#   python app/Scripts/bench_suite.py --only scrapers,dump --baseline bench.json
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+SCRIPTS = Path(__file__).resolve().parent
+sys.path[:0] = [str(SCRIPTS / "Scrapers"), str(SCRIPTS / "Text Processor")]
+
+# ========= CONFIG =========
+FIXTURES = SCRIPTS / "fixtures"         # pages/*.html + pages.json (url -> file)
+PROMPT_PATH = Path("app/prompts/article_to_json_prompt.txt")
+SECTIONS = ("scrapers", "dump", "process")
+SCRAPER_REPEAT = 20                     # passes over the fixture pages
+DUMP_ARTICLES = 20000
+DUMP_WORDS = 350                        # mean body length of a synthetic article
+DUMP_REPEAT = 3
+PROCESS_REQUESTS = 40                   # per concurrency level
+PROCESS_CONCURRENCY = (1, 4, 8)
+TOKEN_DELAY = 0.002                     # stub seconds per generated token (~500 tok/s)
+TOLERANCE = 0.10                        # --baseline: flag changes worse than 10%
+# =========================
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# ---- scrapers ----
+def seed_fixtures(cache_root: Path) -> dict[str, str]:
+    from http_cache import HttpCache
+
+    manifest = json.loads((FIXTURES / "pages.json").read_text(encoding="utf-8"))
+    cache = HttpCache(cache_root)
+    for url, name in manifest.items():
+        cache.seed(url, (FIXTURES / "pages" / name).read_bytes())
+    return manifest
+
+
+def bench_scrapers(args, workdir: Path) -> dict:
+    import crawl_engine
+    import pingskills_scrape_many as pingskills
+    import TableTennisCoaching_articles_scraper as ttc_articles
+    import TableTennisCoaching_tip_of_the_day_scraper as ttc_tips
+
+    manifest = seed_fixtures(workdir / "http_cache")
+    crawl_engine.configure_parser(args.parser)
+    crawl_engine.configure_cache(root=str(workdir / "http_cache"), offline=True)
+    urls = list(manifest)
+
+    def calls(prefix):
+        return [u for u in urls if manifest[u].startswith(prefix)]
+
+    tasks = {
+        "ttc_articles.extract_article": (
+            ttc_articles.extract_article, calls("ttc_article_"), lambda r: len(r["text"])),
+        "ttc_articles.collect_links_between_headers": (
+            lambda u: ttc_articles.collect_links_between_headers(
+                u, ttc_articles.START_HEADER, ttc_articles.STOP_HEADER),
+            calls("ttc_articles_index"), len),
+        "ttc_tips.collect_posts_from_index": (
+            ttc_tips.collect_posts_from_index,
+            sorted(int(u.rsplit("=", 1)[1]) for u in calls("ttc_tips_page_")), len),
+        "pingskills.get_links": (
+            lambda u: pingskills.get_links(u, pingskills.POST_LINKS_CSS), calls("pingskills_blog_index"), len),
+        "pingskills.extract_article": (
+            pingskills.extract_article, calls("pingskills_post_"), lambda r: len(r["text"])),
+    }
+
+    results = {}
+    for name, (fn, inputs, size) in tasks.items():
+        items = sum(size(fn(x)) for x in inputs)      # warm-up, and the output size to check
+        started = time.perf_counter()
+        for _ in range(args.scraper_repeat):
+            for x in inputs:
+                fn(x)
+        elapsed = time.perf_counter() - started
+        n = len(inputs) * args.scraper_repeat
+        results[name] = {"calls": n, "calls_per_sec": round(n / elapsed, 1),
+                         "mean_ms": round(elapsed / n * 1000, 3), "output_size": items}
+        print(f"  {name:<44} {n / elapsed:>9.1f}/s {elapsed / n * 1000:>8.2f} ms  (size {items})")
+    return {"parser": crawl_engine.PARSER, "tasks": results}
+
+
+# ---- dump ----
+def synthetic_dump(path: Path, count: int, words: int, seed: int = 0) -> int:
+    """===ARTICLE=== blocks with bare \\r line endings, like the TTC dump."""
+    rng = random.Random(seed)
+    vocab = ("the ball racket serve receive loop topspin backspin forehand backhand footwork "
+             "rally opponent table net spin contact stroke rhythm practice drill coach player "
+             "match point tactics angle wrist elbow stance recovery timing pressure").split()
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for i in range(count):
+            body, n = [], max(20, int(rng.gauss(words, words / 3)))
+            while n > 0:
+                k = min(n, rng.randint(8, 30))
+                body.append(" ".join(rng.choice(vocab) for _ in range(k)).capitalize() + ".")
+                n -= k
+            f.write(f"===ARTICLE===\rsource_url: https://example.com/node/{i}\rtitle: Article {i}\r"
+                    f"date_accessed: 2024-01-01\rTEXT:\r" + "\r".join(body) + "\r\r")
+    return path.stat().st_size
+
+
+def bench_dump(args, workdir: Path) -> dict:
+    from batch_process import load_articles
+
+    path = workdir / "synthetic_dump.txt"
+    size = synthetic_dump(path, args.dump_articles, DUMP_WORDS)
+    times = []
+    for _ in range(args.dump_repeat):
+        started = time.perf_counter()
+        articles = load_articles(path)
+        times.append(time.perf_counter() - started)
+    if len(articles) != args.dump_articles:
+        raise RuntimeError(f"load_articles returned {len(articles)} of {args.dump_articles} articles")
+    best = min(times)
+    print(f"  load_articles: {len(articles)} articles, {size / 1e6:.1f} MB in {best:.3f}s "
+          f"({len(articles) / best:.0f} articles/s)")
+    return {"articles": len(articles), "bytes": size, "best_seconds": round(best, 4),
+            "articles_per_sec": round(len(articles) / best, 1), "mb_per_sec": round(size / 1e6 / best, 2)}
+
+
+# ---- process ----
+def bench_process(args, workdir: Path) -> dict:
+    import requests
+    import uvicorn
+    from requests.adapters import HTTPAdapter
+    import stub_llm_server
+
+    stub = stub_llm_server.serve(port=0, token_delay=args.token_delay)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    # main.py reads the prompt and writes processed/ relative to the cwd
+    (workdir / PROMPT_PATH.parent).mkdir(parents=True, exist_ok=True)
+    shutil.copy(SCRIPTS.parent.parent / PROMPT_PATH, workdir / PROMPT_PATH)
+    os.chdir(workdir)
+    os.environ.update(OLLAMA_URL=f"http://127.0.0.1:{stub.server_address[1]}", LLM_BACKEND="http-only",
+                      LLM_CACHE="0", METRICS_TRACE="")
+    import main
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=0, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/process"
+
+    synthetic_dump(workdir / "process_dump.txt", args.process_requests, 250, seed=1)
+    from batch_process import load_articles
+    texts = load_articles(workdir / "process_dump.txt")
+
+    results = {}
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_maxsize=max(args.concurrency)))
+    try:
+        for c in args.concurrency:
+            def one(i):
+                started = time.perf_counter()
+                r = session.post(url, json={"article_id": f"bench-{c}-{i}", "text": texts[i]}, timeout=300)
+                return time.perf_counter() - started, r.status_code == 200
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=c) as pool:
+                done = list(pool.map(one, range(len(texts))))
+            elapsed = time.perf_counter() - started
+            latencies = [t * 1000 for t, _ in done]
+            results[f"c{c}"] = {
+                "requests": len(done), "errors": sum(not ok for _, ok in done),
+                "requests_per_sec": round(len(done) / elapsed, 2),
+                "p50_ms": round(statistics.median(latencies), 1),
+                "p95_ms": round(percentile(latencies, 0.95), 1),
+                "max_ms": round(max(latencies), 1),
+            }
+            r = results[f"c{c}"]
+            print(f"  concurrency {c:>2}: {r['requests_per_sec']:>7.2f} req/s  p50 {r['p50_ms']:>7.1f} ms  "
+                  f"p95 {r['p95_ms']:>7.1f} ms  errors {r['errors']}")
+    finally:
+        server.should_exit = True
+        stub.shutdown()
+    return {"token_delay": args.token_delay, "levels": results}
+
+
+# ---- report ----
+def flatten(obj, prefix: str = "") -> dict[str, float]:
+    out = {}
+    for key, value in obj.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            out.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[name] = value
+    return out
+
+
+def higher_is_better(metric: str) -> bool | None:
+    if metric.endswith(("_per_sec",)):
+        return True
+    if metric.endswith(("_ms", "_seconds", "errors")):
+        return False
+    return None         # sizes and counts: shown only when they change
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> int:
+    now, before = flatten(current["results"]), flatten(baseline["results"])
+    worse = 0
+    print(f"\nvs baseline {baseline.get('created', '?')} ({baseline.get('git', '?')}):")
+    for metric in sorted(now.keys() & before.keys()):
+        a, b = before[metric], now[metric]
+        direction = higher_is_better(metric)
+        if direction is None:
+            if a != b:
+                print(f"  {metric:<60} {a} -> {b}  (output changed)")
+            continue
+        change = (b - a) / a if a else 0.0
+        regressed = change < -tolerance if direction else change > tolerance
+        worse += regressed
+        print(f"  {metric:<60} {a:>10} -> {b:>10}  {change:+7.1%}{'  WORSE' if regressed else ''}")
+    return worse
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPTS,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline performance benchmarks (fixtures + stub model).")
+    ap.add_argument("--only", default=",".join(SECTIONS), help=f"comma list of {', '.join(SECTIONS)}")
+    ap.add_argument("--json", type=Path, help="write the results here")
+    ap.add_argument("--baseline", type=Path, help="earlier --json output to compare against")
+    ap.add_argument("--tolerance", type=float, default=TOLERANCE)
+    ap.add_argument("--parser", default="html.parser", help="BeautifulSoup tree builder for the scrapers")
+    ap.add_argument("--scraper-repeat", type=int, default=SCRAPER_REPEAT)
+    ap.add_argument("--dump-articles", type=int, default=DUMP_ARTICLES)
+    ap.add_argument("--dump-repeat", type=int, default=DUMP_REPEAT)
+    ap.add_argument("--process-requests", type=int, default=PROCESS_REQUESTS)
+    ap.add_argument("--concurrency", type=lambda v: [int(x) for x in v.split(",")],
+                    default=list(PROCESS_CONCURRENCY))
+    ap.add_argument("--token-delay", type=float, default=TOKEN_DELAY)
+    args = ap.parse_args()
+
+    sections = [s for s in args.only.split(",") if s]
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        sys.exit(f"unknown section(s): {', '.join(sorted(unknown))}")
+    json_path = args.json.resolve() if args.json else None      # process chdirs
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline else None
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": git_revision(), "python": platform.python_version(), "machine": platform.machine(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "baseline")},
+        "results": {},
+    }
+    runners = {"scrapers": bench_scrapers, "dump": bench_dump, "process": bench_process}
+    with tempfile.TemporaryDirectory(prefix="discoach-bench-") as tmp:
+        cwd = os.getcwd()
+        try:
+            for section in sections:
+                print(f"[{section}]")
+                report["results"][section] = runners[section](args, Path(tmp))
+        finally:
+            os.chdir(cwd)
+
+    if json_path:
+        json_path.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"\nresults written to {json_path}")
+    if baseline:
+        worse = compare(report, baseline, args.tolerance)
+        print(f"{worse} metric(s) worse than the baseline by more than {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# metrics.py
+# Stage timing and counters shared by the scrapers and the Text Processor.
+# - histograms of seconds per stage (fetch, parse, llm, write...), Prometheus-style buckets
+# - plain counters (bytes fetched, tokens in / out, articles by status)
+# - render_prometheus() for GET /metrics, summary_table() for the end of a CLI run
+# - an optional JSONL trace with one line per item (article / page) and its stage times
+#
+# Both folders are run as script directories, so importers add app/Scripts to sys.path:
+#   sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# ========= CONFIG =========
+PREFIX = "discoach_"
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+HELP = {
+    "stage_seconds": "Time spent per pipeline stage.",
+    "bytes_fetched_total": "Response bytes downloaded over the network.",
+    "bytes_cached_total": "Page bytes served from the HTTP cache instead of the network.",
+    "llm_tokens_total": "Model tokens, direction=in (prompt evaluated) or out (generated).",
+    "items_total": "Items (pages, articles) finished, by status.",
+    "chunks_total": "Chunks long articles were split into for extraction.",
+}
+# =========================
+
+_lock = threading.Lock()
+_histograms: dict[tuple, list] = {}     # (name, labels) -> [bucket counts..., +Inf count, sum]
+_counters: dict[tuple, float] = {}
+_trace_file = None
+_current = ContextVar("metrics_trace", default=None)
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name: str, value: float, **labels):
+    key = _key(name, labels)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                h[i] += 1
+        h[len(BUCKETS)] += 1
+        h[-1] += value
+
+
+def inc(name: str, value: float = 1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+@contextmanager
+def timer(stage: str):
+    """Time a block into stage_seconds{stage=...} and into the current trace, if any."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        observe("stage_seconds", elapsed, stage=stage)
+        record = _current.get()
+        if record is not None:
+            with _lock:     # chunks of one article add to the same record from several threads
+                record["stages"][stage] = round(record["stages"].get(stage, 0.0) + elapsed, 6)
+
+
+def annotate(**fields):
+    """
+    Attach extra fields (token counts, sizes...) to the current trace line. Numbers add
+    up, so an article that needed a re-ask reports the tokens of both calls.
+    """
+    record = _current.get()
+    if record is None:
+        return
+    with _lock:
+        for name, value in fields.items():
+            if isinstance(value, (int, float)) and isinstance(record.get(name), (int, float)):
+                value += record[name]
+            record[name] = value
+
+
+@contextmanager
+def trace(item_id: str):
+    """One trace line per item, written when the block exits (only if a trace file is set)."""
+    if _trace_file is None:
+        yield
+        return
+    record = {"id": item_id, "started": round(time.time(), 3), "stages": {}}
+    previous = _current.get()
+    _current.set(record)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record["error"] = repr(e)
+        raise
+    finally:
+        _current.set(previous)
+        record["total_seconds"] = round(time.perf_counter() - started, 6)
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with _lock:
+            _trace_file.write(line)
+            _trace_file.flush()
+
+
+def configure_trace(path: str | None):
+    global _trace_file
+    with _lock:
+        if _trace_file is not None:
+            _trace_file.close()
+        _trace_file = open(path, "a", encoding="utf-8") if path else None
+
+
+def _labels(labels: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels] + ([extra] if extra else [])
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render_prometheus() -> str:
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+    out, seen = [], set()
+
+    def header(name: str, kind: str):
+        if name not in seen:
+            seen.add(name)
+            out.append(f"# HELP {PREFIX}{name} {HELP.get(name, name)}")
+            out.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    for (name, labels), h in sorted(histograms.items()):
+        header(name, "histogram")
+        for bound, count in zip(BUCKETS, h):
+            le = 'le="%g"' % bound
+            out.append(f"{PREFIX}{name}_bucket{_labels(labels, le)} {count}")
+        inf = 'le="+Inf"'
+        out.append(f"{PREFIX}{name}_bucket{_labels(labels, inf)} {h[len(BUCKETS)]}")
+        out.append(f"{PREFIX}{name}_sum{_labels(labels)} {h[-1]:.6f}")
+        out.append(f"{PREFIX}{name}_count{_labels(labels)} {h[len(BUCKETS)]}")
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        out.append(f"{PREFIX}{name}{_labels(labels)} {value:g}")
+    return "\n".join(out) + "\n"
+
+
+def _quantile(h: list, q: float) -> float:
+    """Upper bound of the bucket holding quantile q (what a histogram can tell)."""
+    total = h[len(BUCKETS)]
+    for bound, count in zip(BUCKETS, h):
+        if count >= q * total:
+            return bound
+    return float("inf")
+
+
+def summary_table() -> str:
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+    if not histograms and not counters:
+        return ""
+    lines = [f"{'stage':<14} {'count':>7} {'total s':>9} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8}"]
+    for (name, labels), h in sorted(histograms.items(), key=lambda kv: -kv[1][-1]):
+        count, total = h[len(BUCKETS)], h[-1]
+        label = dict(labels).get("stage", name)
+        lines.append(f"{label:<14} {count:>7} {total:>9.2f} {total / count * 1000:>9.1f} "
+                     f"{_quantile(h, 0.5) * 1000:>8g} {_quantile(h, 0.95) * 1000:>8g}")
+    for (name, labels), value in sorted(counters.items()):
+        tag = ",".join(f"{k}={v}" for k, v in labels)
+        lines.append(f"{name}{'{' + tag + '}' if tag else ''}: {value:g}")
+    return "\n".join(lines)
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
@@ -0,0 +1,307 @@
+# shard_store.py
+# Append-only record store shared by main.py and the scrapers: compact JSONL shards
+# instead of one pretty-printed file per article or a dump rewritten on every run.
+#
+#   <root>/shard-000001.jsonl        finalized shards, never modified again
+#   <root>/shard-000001.idx.json     their id -> [offset, length, crc] index
+#   <root>/shard-000002.jsonl.open   the shard being appended to
+#   <root>/LOCK                      held by the one process writing the store
+#
+# A line is {"id": ..., "ts": ..., "data": {...}}; the newest line for an id wins.
+# Appends are buffered and written + fsynced in batches (FSYNC_RECORDS or
+# FSYNC_SECONDS, whichever comes first). At ROTATE_BYTES the open shard is finalized:
+# fsync, index sidecar written atomically, then renamed .open -> .jsonl. After a crash
+# the open shard is scanned again and a torn last line cut off, so at most the last
+# unsynced batch is lost and no reader ever sees a half-written record.
+#
+#   python shard_store.py stats processed/store
+#   python shard_store.py get processed/store article-0042
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:         # Windows: no advisory lock, one writer by convention
+    fcntl = None
+
+# ========= CONFIG =========
+ROTATE_BYTES = 64 * 1024 * 1024
+FSYNC_RECORDS = 64          # buffered appends written + fsynced together...
+FSYNC_SECONDS = 1.0         # ...or after this long, whichever comes first
+# =========================
+
+
+class StoreLocked(Exception):
+    """Another process is already writing this store."""
+
+
+def _crc(data) -> int:
+    return zlib.crc32(json.dumps(data, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+
+
+def _fsync_dir(path: Path):
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _lines(path: Path):
+    """(offset, length, record) of every complete line; stops at a torn or corrupt tail."""
+    offset = 0
+    with open(path, "rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                return
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                return
+            yield offset, len(raw), record
+            offset += len(raw)
+
+
+class ShardStore:
+    def __init__(self, root, rotate_bytes: int = ROTATE_BYTES, fsync_records: int = FSYNC_RECORDS,
+                 fsync_seconds: float = FSYNC_SECONDS, readonly: bool = False):
+        self.root = Path(root)
+        self.rotate_bytes = rotate_bytes
+        self.fsync_records = fsync_records
+        self.fsync_seconds = fsync_seconds
+        self.readonly = readonly
+        self.lock = threading.RLock()
+        self.index: dict[str, tuple[int, int, int, int]] = {}   # id -> (shard, offset, length, crc)
+        self.finalized: list[int] = []
+        self.open_no: int | None = None     # shard number of the .open file, if any
+        self.end = 0                        # its size, buffered bytes included
+        self.file = None
+        self.buffer: list[bytes] = []
+        self.unsynced = False               # written to the OS but not fsynced yet
+        self.lock_file = None
+        self.stop = threading.Event()
+        self.flusher = None
+        self._load()
+
+    # ---- paths ----
+    def _path(self, no: int, open_: bool = False) -> Path:
+        return self.root / f"shard-{no:06d}.jsonl{'.open' if open_ else ''}"
+
+    def _sidecar(self, no: int) -> Path:
+        return self.root / f"shard-{no:06d}.idx.json"
+
+    def _shard_path(self, no: int) -> Path:
+        return self._path(no, open_=(no == self.open_no))
+
+    # ---- startup ----
+    def _load(self):
+        if not self.root.exists():
+            return
+        for path in sorted(self.root.glob("shard-*.jsonl")):
+            no = int(path.name[6:12])
+            try:
+                entries = json.loads(self._sidecar(no).read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                entries = {r["id"]: [off, ln, _crc(r["data"])] for off, ln, r in _lines(path)}
+            for id_, (off, ln, crc) in entries.items():
+                self.index[id_] = (no, off, ln, crc)
+            self.finalized.append(no)
+
+        for path in sorted(self.root.glob("shard-*.jsonl.open")):
+            no = int(path.name[6:12])
+            self.open_no, self.end = no, 0
+            for off, ln, r in _lines(path):
+                self.index[r["id"]] = (no, off, ln, _crc(r["data"]))
+                self.end = off + ln
+            if not self.readonly and path.stat().st_size > self.end:
+                with open(path, "r+b") as f:       # torn tail from a crash mid-write
+                    f.truncate(self.end)
+
+    def _next_no(self) -> int:
+        return max(self.finalized + [self.open_no or 0], default=0) + 1
+
+    # ---- writing ----
+    def _ensure_writer(self):
+        if self.readonly:
+            raise RuntimeError(f"{self.root} was opened read-only")
+        if self.lock_file is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            self.lock_file = open(self.root / "LOCK", "a")
+            if fcntl is not None:
+                try:
+                    fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    self.lock_file.close()
+                    self.lock_file = None
+                    raise StoreLocked(f"{self.root} is being written by another process")
+            if self.fsync_seconds:
+                self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                self.flusher.start()
+        if self.file is None:
+            if self.open_no is None:
+                self.open_no, self.end = self._next_no(), 0
+            self.file = open(self._path(self.open_no, open_=True), "ab")
+
+    def append(self, id_: str, data, skip_unchanged: bool = False) -> bool:
+        """Add a record; with skip_unchanged, an id whose latest data is identical is left alone."""
+        crc = _crc(data)
+        line = json.dumps({"id": id_, "ts": round(time.time(), 3), "data": data},
+                          ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        with self.lock:
+            seen = self.index.get(id_)
+            if skip_unchanged and seen and seen[3] == crc:
+                return False
+            self._ensure_writer()
+            self.index[id_] = (self.open_no, self.end, len(line), crc)
+            self.buffer.append(line)
+            self.end += len(line)
+            if len(self.buffer) >= self.fsync_records:
+                self._flush(sync=True)
+            if self.end >= self.rotate_bytes:
+                self._finalize()
+            return True
+
+    def _flush(self, sync: bool):
+        if self.buffer:
+            self.file.write(b"".join(self.buffer))
+            self.buffer.clear()
+            self.file.flush()
+            self.unsynced = True
+        if sync and self.unsynced:
+            os.fsync(self.file.fileno())
+            self.unsynced = False
+
+    def _flush_loop(self):
+        while not self.stop.wait(self.fsync_seconds):
+            with self.lock:
+                if self.file is not None:
+                    self._flush(sync=True)
+
+    def _finalize(self):
+        """Seal the open shard: fsync, write its index, rename it to .jsonl."""
+        if self.open_no is None:
+            return
+        self._ensure_writer()       # also takes the lock when nothing was appended yet
+        self._flush(sync=True)
+        self.file.close()
+        self.file = None
+        no = self.open_no
+        entries = {id_: [off, ln, crc] for id_, (s, off, ln, crc) in self.index.items() if s == no}
+        tmp = self._sidecar(no).with_suffix(".tmp")
+        tmp.write_text(json.dumps(entries, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self._sidecar(no))
+        os.replace(self._path(no, open_=True), self._path(no))
+        _fsync_dir(self.root)
+        self.finalized.append(no)
+        self.open_no, self.end = None, 0
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self._flush(sync=True)
+
+    def close(self, finalize: bool = False):
+        self.stop.set()
+        if self.flusher is not None:
+            self.flusher.join()
+            self.flusher = None
+        with self.lock:
+            if finalize:
+                self._finalize()
+            elif self.file is not None:
+                self._flush(sync=True)
+                self.file.close()
+                self.file = None
+            if self.lock_file is not None:
+                self.lock_file.close()      # releases the flock
+                self.lock_file = None
+        self.stop.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---- reading ----
+    def get(self, id_: str):
+        """Latest data stored for id_, or None."""
+        with self.lock:
+            entry = self.index.get(id_)
+            if entry is None:
+                return None
+            no, offset, length, _ = entry
+            if no == self.open_no and self.file is not None:
+                self._flush(sync=False)     # the record may still be in the buffer
+            with open(self._shard_path(no), "rb") as f:     # under the lock: no rename mid-read
+                f.seek(offset)
+                return json.loads(f.read(length))["data"]
+
+    def iter_latest(self):
+        """(id, data) of the newest copy of every id, in the order they were stored."""
+        with self.lock:
+            if self.file is not None:
+                self._flush(sync=False)
+            shards = [(no, self._shard_path(no)) for no in self.finalized]
+            if self.open_no is not None:
+                shards.append((self.open_no, self._path(self.open_no, open_=True)))
+            index = dict(self.index)
+        for no, path in shards:
+            if not path.exists():
+                path = self._path(no)       # finalized since the list was taken
+            for offset, _, record in _lines(path):
+                entry = index.get(record["id"])
+                if entry and entry[0] == no and entry[1] == offset:
+                    yield record["id"], record["data"]
+
+    def ids(self) -> list[str]:
+        """Every id, in the order each was first stored."""
+        with self.lock:
+            return list(self.index)
+
+    def __contains__(self, id_: str) -> bool:
+        return id_ in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def stats(self) -> dict:
+        with self.lock:
+            paths = [self._path(no) for no in self.finalized]
+            if self.open_no is not None:
+                paths.append(self._path(self.open_no, open_=True))
+            return {"root": str(self.root), "records": len(self.index), "finalized_shards": len(self.finalized),
+                    "open_shard_bytes": self.end,
+                    "bytes": sum(p.stat().st_size for p in paths if p.exists()) + sum(map(len, self.buffer))}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect a JSONL shard store.")
+    ap.add_argument("command", choices=("stats", "get", "export"))
+    ap.add_argument("root", type=Path)
+    ap.add_argument("id", nargs="?")
+    args = ap.parse_args()
+
+    store = ShardStore(args.root, readonly=True)
+    if args.command == "stats":
+        print(json.dumps(store.stats(), indent=2))
+    elif args.command == "get":
+        data = store.get(args.id or "")
+        if data is None:
+            sys.exit(f"{args.id!r} is not in {args.root}")
+        print(json.dumps(data, ensure_ascii=False, indent=2))
+    else:
+        for id_, data in store.iter_latest():
+            print(json.dumps({"id": id_, "data": data}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()